@@ -0,0 +1,134 @@
+# benchmarks/bench_cycles.py
+"""End-to-end cycle benchmark against the local fake marketplace and Telegram server.
+
+Usage:
+    python -m benchmarks.bench_cycles --sizes 10 1000 50000 --repeat 3
+    python -m benchmarks.bench_cycles --sizes 1000 --latency 0.05 --error-rate 0.01
+
+Redis comes from ``--redis-url`` (a scratch database: it is flushed before every cycle) or,
+when omitted, from ``fakeredis`` (``pip install fakeredis lupa``).
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, List
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from benchmarks.fake_server import FakeMarketplaceServer, FaultProfile
+from src.api.labels import LabelStore
+from src.api.ozon_client import OzonAPIClient
+from src.api.services import OrderService
+from src.api.yandex_client import YandexAPIClient
+from src.bot.sender import TelegramSender
+from src.bot.tasks import send_daily_plan
+from src.db.redis_db import RedisDB
+from src.utils.logging import logger
+
+CHAT_ID = "-100123456"
+
+def _redis_client(url: str):
+    if url:
+        import redis
+        return redis.Redis.from_url(url, decode_responses=True)
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("Install fakeredis (pip install fakeredis lupa) or pass --redis-url")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+class Harness:
+    """Wires a fresh OrderService to the fake server for every measured cycle."""
+
+    def __init__(self, server: FakeMarketplaceServer, redis_client, telegram_rate: float, label_dir: str):
+        self.server = server
+        self.redis_client = redis_client
+        self.telegram_rate = telegram_rate
+        self.label_dir = label_dir
+
+    def build(self):
+        base = self.server.base_url
+        self.redis_client.flushdb()
+        db = RedisDB(client=self.redis_client)
+        clients = {
+            "yandex": YandexAPIClient("token", f"{base}/yandex", "1", "2"),
+            "ozon": OzonAPIClient("key", "client", f"{base}/ozon"),
+        }
+        service = OrderService(clients, db)
+        # Лимиты Telegram в проде защищают от flood control; здесь измеряем сам бот
+        service.sender = TelegramSender(global_rate=self.telegram_rate, chat_rate=self.telegram_rate,
+                                        chat_burst=self.telegram_rate)
+        service.labels = LabelStore(db, directory=self.label_dir)
+        bot = Bot(token="123456:BENCH", session=AiohttpSession(api=TelegramAPIServer.from_base(f"{base}/telegram")))
+        return bot, service
+
+    async def cycle(self, job: Callable[[Bot, OrderService], Awaitable[None]]) -> float:
+        bot, service = self.build()
+        try:
+            started = time.perf_counter()
+            await job(bot, service)
+            return time.perf_counter() - started
+        finally:
+            await service.sender.close()
+            for client in service.clients.values():
+                await client.close()
+            await bot.session.close()
+
+JOBS: Dict[str, Callable[[Bot, OrderService], Awaitable[None]]] = {
+    "check_new_orders": lambda bot, service: service.check_new_orders(bot, CHAT_ID),
+    "check_overdue_orders": lambda bot, service: service.check_overdue_orders(bot, CHAT_ID),
+    "send_daily_plan": lambda bot, service: send_daily_plan(bot, service, CHAT_ID),
+}
+
+async def run(args: argparse.Namespace) -> None:
+    logger.setLevel(args.log_level)
+    faults = FaultProfile(args.latency, args.jitter, args.error_rate, args.throttle_rate)
+    redis_client = _redis_client(args.redis_url)
+    print(f"{'job':<22}{'orders':>8}{'orders/s':>12}{'p50, s':>10}{'p99, s':>10}{'peak MiB':>10}{'requests':>10}")
+    for size in args.sizes:
+        server = FakeMarketplaceServer(size, faults, seed=args.seed)
+        await server.start()
+        try:
+            with tempfile.TemporaryDirectory() as label_dir:
+                harness = Harness(server, redis_client, args.telegram_rate, label_dir)
+                for name in args.jobs:
+                    job = JOBS[name]
+                    server.requests.clear()
+                    durations = [await harness.cycle(job) for _ in range(args.repeat)]
+                    requests = sum(server.requests.values()) // args.repeat
+                    # Пиковую память меряем отдельным прогоном: tracemalloc заметно замедляет код
+                    tracemalloc.start()
+                    await harness.cycle(job)
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    # Каждая платформа отдаёт size заказов в каждом статусе
+                    throughput = 2 * size / statistics.median(durations)
+                    print(f"{name:<22}{size:>8}{throughput:>12.1f}{statistics.median(durations):>10.3f}"
+                          f"{_percentile(durations, 0.99):>10.3f}{peak / 2 ** 20:>10.1f}{requests:>10}")
+        finally:
+            await server.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000], help="orders per status and platform")
+    parser.add_argument("--jobs", nargs="+", choices=sorted(JOBS), default=list(JOBS))
+    parser.add_argument("--repeat", type=int, default=3, help="measured cycles per job and size")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency spread as a fraction of --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 5xx responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument("--telegram-rate", type=float, default=10000.0, help="Telegram calls per second allowed")
+    parser.add_argument("--redis-url", default="", help="scratch Redis database, flushed before every cycle")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="ERROR", help="bot log level during the run")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/bench_parsers.py
+"""Order parser microbenchmark on synthetic Yandex and Ozon payloads.
+
+Usage:
+    python -m benchmarks.bench_parsers --orders 50000 --repeat 5
+
+Reports parsed orders per second (median of ``--repeat`` runs) and the memory retained by the
+parsed list for the full ``parse`` and the partial ``parse_summary`` of every platform.
+"""
+import argparse
+import gc
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+from benchmarks.fake_server import _ozon_posting, _yandex_order
+from src.api.parsers import get_parser
+
+def _payloads(orders: int) -> Dict[str, List[Dict]]:
+    shipment = datetime.utcnow() + timedelta(days=1)
+    return {
+        "yandex": [_yandex_order(order_id, "STARTED", shipment.strftime("%d-%m-%Y")) for order_id in range(1, orders + 1)],
+        "ozon": [_ozon_posting(order_id, "awaiting_packaging", shipment.strftime("%Y-%m-%dT%H:%M:%SZ"))
+                 for order_id in range(1, orders + 1)],
+    }
+
+def _measure(parse: Callable[[Dict], object], payloads: List[Dict], repeat: int):
+    durations = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        [parse(order_data) for order_data in payloads]
+        durations.append(time.perf_counter() - started)
+    # Удерживаемую память меряем отдельным прогоном: tracemalloc заметно замедляет код
+    gc.collect()
+    tracemalloc.start()
+    parsed = [parse(order_data) for order_data in payloads]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del parsed
+    return len(payloads) / statistics.median(durations), retained
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=50000, help="synthetic orders per platform")
+    parser.add_argument("--repeat", type=int, default=5, help="measured runs per parser")
+    args = parser.parse_args()
+    print(f"{'platform':<10}{'mode':<10}{'orders/s':>14}{'retained MiB':>14}{'bytes/order':>13}")
+    for platform, payloads in _payloads(args.orders).items():
+        order_parser = get_parser(platform)
+        for mode, parse in (("full", order_parser.parse), ("summary", order_parser.parse_summary)):
+            throughput, retained = _measure(parse, payloads, args.repeat)
+            print(f"{platform:<10}{mode:<10}{throughput:>14.0f}{retained / 2 ** 20:>14.1f}{retained / len(payloads):>13.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# benchmarks/fake_server.py
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from aiohttp import web
+
+LABEL_PDF = b"%PDF-1.4\n" + b"0" * 2048 + b"\n%%EOF"
+
+@dataclass
+class FaultProfile:
+    """How the fake marketplace and Telegram endpoints misbehave."""
+    latency: float = 0.0  # Средняя задержка ответа, секунды
+    jitter: float = 0.0  # Разброс задержки, доля от latency
+    error_rate: float = 0.0  # Доля ответов 5xx
+    throttle_rate: float = 0.0  # Доля ответов 429
+    retry_after: int = 1  # retry_after в ответах 429 Telegram
+
+def _yandex_order(order_id: int, substatus: str, shipment_date: str) -> Dict:
+    return {
+        "id": order_id,
+        "status": "PROCESSING",
+        "substatus": substatus,
+        "itemsTotal": 1500.0 + order_id % 7 * 100,
+        "items": [
+            {"id": order_id * 10 + n, "shopSku": f"SKU-{(order_id + n) % 500}", "offerName": f"Товар {n}", "count": 1 + n}
+            for n in range(2)
+        ],
+        "delivery": {
+            "address": {"country": "Россия", "postcode": "620000", "city": "Екатеринбург",
+                        "street": "Ленина", "house": str(order_id % 100), "block": ""},
+            "shipments": [{"shipmentDate": shipment_date}],
+        },
+    }
+
+def _ozon_posting(order_id: int, status: str, shipment_date: str) -> Dict:
+    return {
+        "posting_number": f"{order_id}-0001-1",
+        "status": status,
+        "price": str(1500 + order_id % 7 * 100),
+        "shipment_date": shipment_date,
+        "products": [{"sku": 100000 + order_id % 500, "name": "Товар", "quantity": 1}],
+        "delivery": {"address": {"city": "Екатеринбург", "address_tail": "ул. Ленина", "zip_code": "620000"}},
+    }
+
+class FakeMarketplaceServer:
+    """Local stand-in for the Yandex Partner API, the Ozon Seller API and the Telegram Bot API.
+
+    Serves ``orders`` orders in every status the bot polls, with cursor/offset pagination,
+    and injects latency, 429 and 5xx responses according to ``faults``. Paths are prefixed
+    with ``/yandex``, ``/ozon`` and ``/telegram`` so one server backs all three clients.
+    """
+
+    def __init__(self, orders: int, faults: Optional[FaultProfile] = None, seed: int = 42):
+        self.faults = faults or FaultProfile()
+        self.random = random.Random(seed)
+        self.requests: Dict[str, int] = {}
+        self._message_id = 0
+        now = datetime.utcnow()
+        upcoming = (now + timedelta(days=1)).strftime("%d-%m-%Y")
+        overdue = (now - timedelta(days=3)).strftime("%d-%m-%Y")
+        ozon_upcoming = (now + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        ozon_overdue = (now - timedelta(days=3)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        ids = range(1, orders + 1)
+        self.yandex_orders = {
+            "STARTED": [_yandex_order(order_id, "STARTED", upcoming) for order_id in ids],
+            "READY_TO_SHIP": [_yandex_order(orders + order_id, "READY_TO_SHIP", overdue) for order_id in ids],
+        }
+        self.ozon_postings = {
+            "awaiting_packaging": [_ozon_posting(order_id, "awaiting_packaging", ozon_upcoming) for order_id in ids],
+            "awaiting_deliver": [_ozon_posting(orders + order_id, "awaiting_deliver", ozon_overdue) for order_id in ids],
+        }
+        self.shipments = [
+            {"id": n, "orderIds": [order["id"] for order in self.yandex_orders["READY_TO_SHIP"][n:n + 100]],
+             "warehouseTo": {"address": f"ПВЗ №{n // 100 + 1}"}}
+            for n in range(0, orders, 100)
+        ]
+        self.app = web.Application(middlewares=[self._faults_middleware])
+        self.app.router.add_get("/yandex/campaigns/{campaign_id}/orders", self.yandex_orders_list)
+        self.app.router.add_post("/yandex/businesses/{business_id}/offer-mappings", self.yandex_offer_mappings)
+        self.app.router.add_get("/yandex/campaigns/{campaign_id}/orders/{order_id}/delivery/labels", self.label)
+        self.app.router.add_put("/yandex/campaigns/{campaign_id}/first-mile/shipments", self.yandex_shipments)
+        self.app.router.add_post("/ozon/v3/posting/fbs/list", self.ozon_postings_list)
+        self.app.router.add_post("/ozon/v2/posting/fbs/package-label", self.label)
+        self.app.router.add_post("/telegram/bot{token}/{method}", self.telegram)
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    @web.middleware
+    async def _faults_middleware(self, request: web.Request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        self.requests[route] = self.requests.get(route, 0) + 1
+        faults = self.faults
+        if faults.latency:
+            spread = faults.latency * faults.jitter
+            await asyncio.sleep(max(0.0, self.random.uniform(faults.latency - spread, faults.latency + spread)))
+        roll = self.random.random()
+        telegram = request.path.startswith("/telegram/")
+        if roll < faults.throttle_rate:
+            if telegram:
+                return web.json_response({
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {faults.retry_after}",
+                    "parameters": {"retry_after": faults.retry_after},
+                }, status=429)
+            return web.json_response({"status": "ERROR", "errors": [{"code": "TOO_MANY_REQUESTS"}]}, status=429)
+        if roll < faults.throttle_rate + faults.error_rate:
+            if telegram:
+                return web.json_response({"ok": False, "error_code": 500, "description": "Internal Server Error"}, status=500)
+            return web.json_response({"status": "ERROR", "errors": [{"code": "INTERNAL_ERROR"}]}, status=500)
+        return await handler(request)
+
+    @staticmethod
+    def _page(items: List[Dict], start: int, limit: int):
+        end = start + limit
+        return items[start:end], (str(end) if end < len(items) else None)
+
+    async def yandex_orders_list(self, request: web.Request) -> web.Response:
+        orders = self.yandex_orders.get(request.query.get("substatus", ""), [])
+        page, next_token = self._page(orders, int(request.query.get("page_token", 0)), int(request.query.get("limit", 50)))
+        paging = {"nextPageToken": next_token} if next_token else {}
+        return web.json_response({"orders": page, "paging": paging})
+
+    async def yandex_offer_mappings(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        mappings = [
+            {"offer": {"offerId": offer_id},
+             "mapping": {"marketSku": 10 ** 9 + index, "marketModelId": 10 ** 6 + index}}
+            for index, offer_id in enumerate(payload.get("offerIds", []))
+        ]
+        return web.json_response({"status": "OK", "result": {"offerMappings": mappings}})
+
+    async def yandex_shipments(self, request: web.Request) -> web.Response:
+        page, next_token = self._page(self.shipments, int(request.query.get("page_token", 0)), 50)
+        paging = {"nextPageToken": next_token} if next_token else {}
+        return web.json_response({"status": "OK", "result": {"shipments": page, "paging": paging}})
+
+    async def ozon_postings_list(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        postings = self.ozon_postings.get(payload.get("filter", {}).get("status", ""), [])
+        offset, limit = payload.get("offset", 0), payload.get("limit", 50)
+        page = postings[offset:offset + limit]
+        return web.json_response({"result": {"postings": page, "has_next": offset + limit < len(postings)}})
+
+    async def label(self, request: web.Request) -> web.Response:
+        return web.Response(body=LABEL_PDF, content_type="application/pdf")
+
+    async def telegram(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        form = await request.post()
+        if method == "pinchatmessage":
+            return web.json_response({"ok": True, "result": True})
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(form.get("chat_id", 0)), "type": "group", "title": "benchmark"},
+        }
+        if method == "senddocument":
+            message["document"] = {"file_id": f"file-{self._message_id}", "file_unique_id": f"u{self._message_id}"}
+            message["caption"] = form.get("caption", "")
+        else:
+            message["text"] = form.get("text", "")
+        return web.Response(text=json.dumps({"ok": True, "result": message}), content_type="application/json")
@@ -1,36 +1,299 @@
 # src/api/base_client.py
+import asyncio
+import contextlib
+import contextvars
+import os
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import aiofiles
+import aiohttp
+from src.config.settings import settings
+from src.utils import jsonlib
+from src.utils.metrics import API_REQUEST_SECONDS
+
+# Счётчик запросов текущей задачи; задачи, порождённые через gather, наследуют его вместе с контекстом
+_job_requests: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("job_requests", default=None)
+
+@contextlib.contextmanager
+def count_requests() -> Iterator[List[int]]:
+    """Count the HTTP requests the current task sends inside the block.
+
+    Yields a one-item list whose value grows with every request, so concurrent jobs on the
+    same client are counted separately.
+    """
+    counter = [0]
+    token = _job_requests.set(counter)
+    try:
+        yield counter
+    finally:
+        _job_requests.reset(token)
+
+class APIResponse:
+    """Fully read HTTP response returned by marketplace clients.
+
+    Mirrors the small subset of the ``requests.Response`` interface the clients rely on,
+    so the body is read inside the connection context and the connection can go back to the pool.
+    """
+
+    _NOT_DECODED = object()
+
+    def __init__(self, status_code: int, content: bytes, url: str = ""):
+        self.status_code = status_code
+        self.content = content
+        self.url = url
+        self._json = self._NOT_DECODED
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        """Decode the body once (with orjson when installed); later calls return the same object."""
+        if self._json is self._NOT_DECODED:
+            self._json = jsonlib.loads(self.content)
+        return self._json
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise MarketplaceAPIError(f"HTTP {self.status_code} for url: {self.url}", response=self)
+
+class MarketplaceAPIError(Exception):
+    """Raised when a marketplace API request fails.
+
+    ``response`` is set for HTTP error statuses and is ``None`` for transport errors and timeouts.
+    """
+
+    def __init__(self, message: str, response: Optional[APIResponse] = None):
+        super().__init__(message)
+        self.response = response
+
+class SessionPool:
+    """Keep-alive HTTP sessions shared by the clients of every tenant, one per marketplace.
+
+    Sessions are created lazily inside the running event loop and closed by ``close``.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+
+    def get(self, platform: str) -> aiohttp.ClientSession:
+        session = self._sessions.get(platform)
+        if session is None or session.closed:
+            session = self._sessions[platform] = MarketplaceClient.create_session()
+        return session
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
 
 class MarketplaceClient(ABC):
-    """Abstract base class for marketplace API clients."""
+    """Abstract base class for asynchronous marketplace API clients.
+
+    Each client owns (or is given) a pooled keep-alive ``aiohttp.ClientSession``, so the
+    TCP/TLS connection setup is paid once per marketplace instead of once per request.
+    Clients of several tenants share the sessions of a ``SessionPool``; ``concurrency`` then caps
+    the requests one client keeps in flight, so a large tenant cannot take the whole pool.
+    """
+
+    platform: str = ""
+
+    def __init__(self, base_url: str, session: Optional[aiohttp.ClientSession] = None,
+                 session_pool: Optional[SessionPool] = None, concurrency: Optional[int] = None):
+        self.base_url = base_url
+        self._session = session
+        self._owns_session = session is None and session_pool is None
+        self._session_pool = session_pool
+        self._slots = asyncio.Semaphore(concurrency) if concurrency else None
+
+    @staticmethod
+    def create_session(pool_size: Optional[int] = None, timeout: Optional[float] = None,
+                       connect_timeout: Optional[float] = None) -> aiohttp.ClientSession:
+        """Create a pooled keep-alive HTTP session using the configured limits."""
+        connector = aiohttp.TCPConnector(
+            limit=pool_size or settings.HTTP_POOL_SIZE,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT
+        )
+        client_timeout = aiohttp.ClientTimeout(
+            total=timeout or settings.HTTP_TIMEOUT,
+            connect=connect_timeout or settings.HTTP_CONNECT_TIMEOUT
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=client_timeout)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Return the HTTP session, creating it lazily inside the running event loop."""
+        if self._session_pool is not None:
+            return self._session_pool.get(self.platform)
+        if self._session is None or self._session.closed:
+            self._session = self.create_session()
+            self._owns_session = True
+        return self._session
+
+    def _slot(self):
+        """Hold one of the client's request slots, if its concurrency is capped."""
+        return self._slots if self._slots is not None else contextlib.nullcontext()
+
+    def _count_request(self) -> None:
+        counter = _job_requests.get()
+        if counter is not None:
+            counter[0] += 1
+
+    def _observe(self, endpoint: str, status: Any, started: float) -> None:
+        API_REQUEST_SECONDS.labels(self.platform, endpoint, str(status)).observe(time.perf_counter() - started)
+
+    async def _request(self, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                       endpoint: str = "other", **kwargs) -> APIResponse:
+        """Send a request through the pooled session and read the whole body.
+
+        The latency is recorded in ``marketplace_request_seconds`` under ``endpoint``.
+
+        Raises:
+            MarketplaceAPIError: On transport errors and timeouts.
+        """
+        url = f"{self.base_url}{path}"
+        self._count_request()
+        started = time.perf_counter()
+        try:
+            async with self._slot(), self.session.request(method, url, headers=headers, **kwargs) as response:
+                content = await response.read()
+                self._observe(endpoint, response.status, started)
+                return APIResponse(response.status, content, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._observe(endpoint, "error", started)
+            raise MarketplaceAPIError(f"{method} {url} failed: {e!r}") from e
+
+    async def _download(self, method: str, path: str, dest: str, headers: Optional[Dict[str, str]] = None,
+                        endpoint: str = "other", **kwargs) -> APIResponse:
+        """Stream a successful response body into ``dest`` without holding it in memory.
+
+        The body is written to a temporary file which replaces ``dest`` only when complete.
+        For non-200 responses nothing is written and the (small) error body is returned.
+
+        Raises:
+            MarketplaceAPIError: On transport errors and timeouts.
+        """
+        url = f"{self.base_url}{path}"
+        tmp_path = f"{dest}.part"
+        self._count_request()
+        started = time.perf_counter()
+        try:
+            async with self._slot(), self.session.request(method, url, headers=headers, **kwargs) as response:
+                if response.status != 200:
+                    content = await response.read()
+                    self._observe(endpoint, response.status, started)
+                    return APIResponse(response.status, content, url)
+                async with aiofiles.open(tmp_path, "wb") as file:
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        await file.write(chunk)
+            os.replace(tmp_path, dest)
+            self._observe(endpoint, 200, started)
+            return APIResponse(200, b"", url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._observe(endpoint, "error", started)
+            raise MarketplaceAPIError(f"{method} {url} failed: {e!r}") from e
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    async def _paginate(fetch_page: Callable[[Any], Awaitable[Tuple[List[Dict], Any]]],
+                        cursor: Any = None) -> AsyncIterator[List[Dict]]:
+        """Yield pages returned by ``fetch_page`` until it reports no next cursor.
+
+        The next page is requested before the current one is yielded, so consumers process
+        page N while page N+1 is already in flight.
+
+        Args:
+            fetch_page: Coroutine function taking a cursor and returning ``(items, next_cursor)``.
+            cursor: Cursor of the first page.
+        """
+        next_page = asyncio.ensure_future(fetch_page(cursor))
+        try:
+            while next_page is not None:
+                items, cursor = await next_page
+                next_page = asyncio.ensure_future(fetch_page(cursor)) if cursor is not None else None
+                yield items
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+                if next_page.done() and not next_page.cancelled():
+                    next_page.exception()  # помечаем ошибку предзагрузки как обработанную
+
+    async def close(self) -> None:
+        """Close the HTTP session if it was created by this client."""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
 
     @abstractmethod
-    def get_orders(self, status: str, substatus: str) -> List[Dict]:
-        """Fetch orders by status and substatus."""
+    def iter_order_pages(self, status: str, substatus: Optional[str] = None, updated_since: Optional[datetime] = None,
+                         summary: bool = False) -> AsyncIterator[List[Dict]]:
+        """Stream orders by status and substatus page by page, walking every page.
+
+        When ``updated_since`` is given, only orders changed after that moment are requested.
+        With ``summary`` the client may leave out response blocks that only a full parse reads.
+        """
         pass
 
+    async def get_orders(self, status: str, substatus: Optional[str] = None,
+                         updated_since: Optional[datetime] = None, summary: bool = False) -> AsyncIterator[Dict]:
+        """Stream all orders by status and substatus across every page."""
+        async for page in self.iter_order_pages(status, substatus, updated_since, summary):
+            for order in page:
+                yield order
+
     @abstractmethod
-    def get_market_sku(self, shop_skus: List[str]) -> Dict[str, Dict[str, str]]:
+    async def get_market_sku(self, shop_skus: List[str]) -> Dict[str, Dict[str, str]]:
         """Fetch market SKU and model ID for shop SKUs."""
         pass
 
     @abstractmethod
-    def get_label(self, order_id: str) -> Optional[bytes]:
+    async def get_label(self, order_id: str) -> Optional[bytes]:
         """Fetch PDF label for an order."""
         pass
 
     @abstractmethod
-    def get_pickup_point_address(self, order_id: str) -> str:
+    async def download_label(self, order_id: str, dest: str) -> bool:
+        """Stream the PDF label for an order into ``dest``; return False if it is unavailable."""
+        pass
+
+    @abstractmethod
+    async def get_pickup_point_address(self, order_id: str) -> str:
         """Fetch pickup point address for an order."""
         pass
 
     @abstractmethod
-    def set_order_status(self, order_id: str, status: str, substatus: str, items: List[Dict]) -> Dict:
+    async def set_order_status(self, order_id: str, status: str, substatus: str, items: List[Dict]) -> Dict:
         """Update order status."""
         pass
 
+    async def set_orders_status(self, order_ids: List[str], status: str,
+                                substatus: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """Move several orders to ``status`` at once.
+
+        Falls back to ``set_order_status`` calls, at most ``NOTIFY_CONCURRENCY`` in flight;
+        clients with a batch endpoint override it.
+
+        Returns:
+            Mapping of order ID to ``None`` on success or the error message.
+        """
+        semaphore = asyncio.Semaphore(settings.NOTIFY_CONCURRENCY)
+
+        async def update(order_id: str) -> Optional[str]:
+            async with semaphore:
+                try:
+                    await self.set_order_status(order_id, status, substatus, [])
+                    return None
+                except MarketplaceAPIError as e:
+                    return str(e)
+
+        results = await asyncio.gather(*(update(order_id) for order_id in order_ids))
+        return dict(zip(order_ids, results))
+
     @abstractmethod
-    def get_order_info(self, order_id: str) -> Dict:
+    async def get_order_info(self, order_id: str) -> Dict:
         """Fetch detailed order information."""
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,78 @@
+# src/api/cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+from src.api.base_client import MarketplaceClient
+from src.config.settings import settings
+from src.db.redis_db import RedisDB
+from src.utils.metrics import CACHE_REQUESTS_TOTAL
+
+class TTLCache:
+    """Small in-process LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SkuMappingCache:
+    """Two-tier cache of shop SKU -> marketSku/marketModelId mappings.
+
+    Lookups go to the in-process LRU first, then to the per-SKU Redis keys shared by all replicas;
+    the remaining misses are resolved with a single ``get_market_sku`` call. SKUs without
+    a mapping are cached too, so unmapped offers are not requested again until the TTL expires.
+    """
+
+    def __init__(self, db: RedisDB, ttl: float = settings.SKU_CACHE_TTL, maxsize: int = settings.SKU_CACHE_MAXSIZE):
+        self.db = db
+        self.ttl = ttl
+        self.local = TTLCache(maxsize, ttl)
+
+    async def get_mappings(self, platform: str, client: MarketplaceClient, shop_skus: List[str]) -> Dict[str, Dict[str, str]]:
+        """Return mappings for ``shop_skus``; SKUs without a mapping are left out."""
+        found: Dict[str, Dict[str, str]] = {}
+        misses = []
+        for sku in dict.fromkeys(shop_skus):
+            mapping = self.local.get((platform, sku))
+            if mapping is None:
+                misses.append(sku)
+            else:
+                found[sku] = mapping
+        CACHE_REQUESTS_TOTAL.labels("sku_local", "hit").inc(len(found))
+        CACHE_REQUESTS_TOTAL.labels("sku_local", "miss").inc(len(misses))
+        if misses:
+            shared = self.db.load_sku_mappings(platform, misses)
+            CACHE_REQUESTS_TOTAL.labels("sku_redis", "hit").inc(len(shared))
+            CACHE_REQUESTS_TOTAL.labels("sku_redis", "miss").inc(len(misses) - len(shared))
+            for sku, mapping in shared.items():
+                self.local.set((platform, sku), mapping)
+                found[sku] = mapping
+            misses = [sku for sku in misses if sku not in shared]
+        if misses:
+            fetched = await client.get_market_sku(misses)
+            resolved = {sku: fetched.get(sku, {}) for sku in misses}
+            self.db.save_sku_mappings(platform, resolved, self.ttl)
+            for sku, mapping in resolved.items():
+                self.local.set((platform, sku), mapping)
+                found[sku] = mapping
+        return {sku: mapping for sku, mapping in found.items() if mapping}
@@ -0,0 +1,132 @@
+# src/api/carriages.py
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from aiogram import Bot
+from aiogram.types import BufferedInputFile
+from src.api.base_client import MarketplaceAPIError
+from src.api.ozon_client import OzonAPIClient
+from src.bot.sender import TelegramSender
+from src.config.settings import settings
+from src.db.redis_db import RedisDB
+from src.utils.logging import logger
+
+def _order_list(order_ids: List[str], limit: int = 30) -> str:
+    """Comma-separated order IDs, shortened to fit a Telegram caption."""
+    text = ", ".join(order_ids[:limit])
+    return text if len(order_ids) <= limit else f"{text} и ещё {len(order_ids) - limit}"
+
+class CarriageBatcher:
+    """Collects Ozon postings marked ready into one carriage per delivery method and day.
+
+    Ready postings are queued in Redis under ``{delivery_method_id}:{YYYY-MM-DD}``. A batch is
+    turned into a carriage once it has been open for ``window`` seconds or when the shipment is
+    closed explicitly; the carriage is created, approved and its act PDF is sent once.
+    """
+
+    platform = "ozon"
+
+    def __init__(self, db: RedisDB, sender: TelegramSender, window: float = settings.CARRIAGE_BATCH_WINDOW):
+        self.db = db
+        self.sender = sender
+        self.window = window
+
+    @staticmethod
+    def group_for(delivery_method_id: int, departure: Optional[datetime] = None) -> str:
+        return f"{delivery_method_id}:{(departure or datetime.now()).strftime('%Y-%m-%d')}"
+
+    def add(self, order_id: str, delivery_method_id: int) -> bool:
+        """Queue a ready posting for today's carriage of its delivery method."""
+        group = self.group_for(delivery_method_id)
+        if not self.db.add_to_carriage_batch(self.platform, group, order_id):
+            return False
+        logger.info("[ozon] Order #%s queued for carriage batch %s", order_id, group)
+        return True
+
+    def due_groups(self, now: Optional[float] = None) -> List[str]:
+        """Batches that have been open for at least ``window`` seconds."""
+        if not self.window:
+            return []
+        now = time.time() if now is None else now
+        return [group for group, opened_at in self.db.load_carriage_batches(self.platform).items()
+                if now - opened_at >= self.window]
+
+    async def flush(self, bot: Bot, chat_id: str, client: OzonAPIClient,
+                    groups: Optional[Iterable[str]] = None) -> int:
+        """Turn batches into carriages; all open batches unless ``groups`` is given.
+
+        A batch whose carriage could not be finished is put back and retried after
+        ``CARRIAGE_RETRY_DELAY`` seconds, doubling per attempt; a carriage already created for it
+        is resumed rather than created again. After ``CARRIAGE_MAX_ATTEMPTS`` failures the batch
+        is dead-lettered and the chat is asked to handle it manually.
+
+        Returns:
+            Number of carriages created.
+        """
+        created = 0
+        for group in (self.db.load_carriage_batches(self.platform) if groups is None else groups):
+            order_ids = self.db.take_carriage_batch(self.platform, group)
+            if not order_ids:
+                continue
+            state = self.db.load_carriage_state(self.platform, group)
+            try:
+                await self._create_carriage(bot, chat_id, client, group, order_ids, state)
+                self.db.clear_carriage_state(self.platform, group)
+                created += 1
+            except MarketplaceAPIError as e:
+                await self._handle_failure(bot, chat_id, group, order_ids, int(state.get("attempts", 0)) + 1, e)
+        return created
+
+    async def _handle_failure(self, bot: Bot, chat_id: str, group: str, order_ids: List[str], attempts: int,
+                              error: MarketplaceAPIError) -> None:
+        logger.error("[ozon] Failed to create/approve carriage for batch %s (attempt %s): %s", group, attempts, error)
+        if attempts >= settings.CARRIAGE_MAX_ATTEMPTS:
+            self.db.dead_letter_carriage_batch(self.platform, group, order_ids, str(error))
+            text = (f"❌ *Отгрузка для {_order_list(order_ids)} не сформирована после {attempts} попыток: {str(error)}*\n"
+                    f"Сформируйте её вручную в личном кабинете Ozon")
+        else:
+            self.db.save_carriage_state(self.platform, group, attempts=attempts)
+            retry_at = time.time() + settings.CARRIAGE_RETRY_DELAY * 2 ** (attempts - 1)
+            # Пачка становится «готовой» через window после opened_at, поэтому сдвигаем его к моменту повтора
+            self.db.restore_carriage_batch(self.platform, group, order_ids, retry_at - self.window)
+            if attempts > 1:
+                return  # О повторных ошибках не пишем в чат, чтобы не спамить
+            text = f"⚠️ *Ошибка при создании/подтверждении отгрузки для {_order_list(order_ids)}: {str(error)}*"
+        await self.sender.call(chat_id, bot.send_message, chat_id, text, parse_mode="Markdown")
+
+    async def _create_carriage(self, bot: Bot, chat_id: str, client: OzonAPIClient, group: str,
+                               order_ids: List[str], state: Dict[str, str]) -> None:
+        delivery_method_id, _ = group.split(":")
+        carriage_id = int(state["carriage_id"]) if state.get("carriage_id") else None
+        if carriage_id is None:
+            # Пачка за прошедший день (после повторов или простоя) тоже уходит с текущим временем:
+            # отгрузку с датой в прошлом Ozon отклоняет
+            departure_date = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            carriage_id = await client.create_carriage(delivery_method_id=int(delivery_method_id), departure_date=departure_date)
+            # Запоминаем отгрузку сразу: при ошибке дальше повтор продолжит с подтверждения
+            self.db.save_carriage_state(self.platform, group, carriage_id=carriage_id)
+            logger.info("[ozon] Created carriage with ID %s for delivery_method_id %s", carriage_id, delivery_method_id)
+        if not state.get("approved"):
+            await client.approve_carriage(carriage_id, containers_count=1)
+            self.db.save_carriage_state(self.platform, group, approved=1)
+            logger.info("[ozon] Approved carriage with ID %s for %s orders", carriage_id, len(order_ids))
+
+        label_file = await client.get_carriage_label(carriage_id)
+        if label_file:
+            pdf_input = BufferedInputFile(label_file, filename=f"carriage_{carriage_id}.pdf")
+            await self.sender.call(
+                chat_id, bot.send_document,
+                chat_id,
+                document=pdf_input,
+                caption=f"📤 *Отгрузка #{carriage_id} сформирована для Ozon*\nВключает заказы: {_order_list(order_ids)}",
+                parse_mode="Markdown",
+                disable_notification=False
+            )
+            logger.info("[ozon] Sent carriage label for carriage #%s to chat", carriage_id)
+        else:
+            await self.sender.call(
+                chat_id, bot.send_message,
+                chat_id,
+                f"⚠️ *Не удалось получить этикетку для отгрузки #{carriage_id}*",
+                parse_mode="Markdown"
+            )
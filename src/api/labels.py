@@ -0,0 +1,128 @@
+# src/api/labels.py
+import asyncio
+import os
+import re
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from aiogram.types import FSInputFile, Message
+from src.api.base_client import MarketplaceClient
+from src.config.settings import settings
+from src.db.redis_db import RedisDB
+from src.utils.logging import logger
+from src.utils.metrics import CACHE_REQUESTS_TOTAL
+
+class _LabelIndex:
+    """Sizes of the labels in one directory in LRU order, shared by the stores of all tenants."""
+
+    def __init__(self):
+        self.sizes: "OrderedDict[Path, int]" = OrderedDict()
+        self.total = 0
+        self.serving: Counter = Counter()  # Сколько уведомлений сейчас отправляют этот файл
+        self.loaded = False
+
+    def add(self, path: Path, size: int) -> None:
+        self.total += size - self.sizes.pop(path, 0)
+        self.sizes[path] = size
+
+    def remove(self, path: Path) -> None:
+        self.total -= self.sizes.pop(path, 0)
+
+_indexes: Dict[Path, _LabelIndex] = {}
+
+class LabelStore:
+    """On-disk store of order PDF labels with size-based LRU eviction.
+
+    Labels are streamed from the marketplace straight to disk and from disk to Telegram.
+    Once Telegram has accepted a label, its ``file_id`` is kept in Redis and reused for
+    re-sends, so they cost neither a marketplace call nor an upload.
+    """
+
+    def __init__(self, db: RedisDB, directory: str = settings.LABEL_CACHE_DIR,
+                 max_bytes: int = settings.LABEL_CACHE_MAX_BYTES):
+        self.db = db
+        self.directory = Path(directory).resolve()
+        self.max_bytes = max_bytes
+        self.index = _indexes.setdefault(self.directory, _LabelIndex())
+
+    def path_for(self, platform: str, order_id: str) -> Path:
+        safe_id = re.sub(r"[^0-9A-Za-z_-]", "_", str(order_id))
+        return self.directory / platform / f"label_{safe_id}.pdf"
+
+    async def get_document(self, platform: str, client: MarketplaceClient,
+                           order_id: str) -> Optional[Union[str, FSInputFile]]:
+        """Return a Telegram ``file_id`` or a streamed file for the order label, None if unavailable.
+
+        A returned file is not evicted until it is passed to ``release``.
+        """
+        file_id = self.db.load_label_file_id(order_id, platform)
+        if file_id:
+            CACHE_REQUESTS_TOTAL.labels("label", "file_id").inc()
+            return file_id
+        await self._load_index()
+        path = self.path_for(platform, order_id)
+        if path.exists():
+            CACHE_REQUESTS_TOTAL.labels("label", "hit").inc()
+            os.utime(path)  # mtime задаёт порядок LRU после перезапуска
+            self.index.add(path, self.index.sizes.get(path) or path.stat().st_size)
+        else:
+            CACHE_REQUESTS_TOTAL.labels("label", "miss").inc()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if not await client.download_label(order_id, str(path)):
+                return None
+            self.index.add(path, path.stat().st_size)
+        self.index.serving[path] += 1
+        self.evict()
+        return FSInputFile(path, filename=f"label_{order_id}.pdf")
+
+    def release(self, document: Optional[Union[str, FSInputFile]]) -> None:
+        """Allow a file returned by ``get_document`` to be evicted again once it has been sent."""
+        if isinstance(document, FSInputFile):
+            path = Path(document.path)
+            self.index.serving[path] -= 1
+            if self.index.serving[path] <= 0:
+                del self.index.serving[path]
+
+    def remember_upload(self, platform: str, order_id: str, message: Message) -> None:
+        """Remember the ``file_id`` Telegram assigned to an uploaded label."""
+        if message.document:
+            self.db.save_label_file_id(order_id, platform, message.document.file_id)
+
+    async def _load_index(self) -> None:
+        """Index the labels already on disk, once per directory, off the event loop."""
+        if self.index.loaded:
+            return
+        self.index.loaded = True
+        scanned = await asyncio.to_thread(self._scan)
+        # Найденные файлы старше всего, что успели скачать во время сканирования
+        for _, size, path in sorted(scanned, reverse=True):
+            if path not in self.index.sizes:
+                self.index.add(path, size)
+                self.index.sizes.move_to_end(path, last=False)
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        files = []
+        for path in self.directory.glob("*/*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def evict(self) -> None:
+        """Delete least recently used labels until the store fits into ``max_bytes``.
+
+        Files that are being sent are skipped. Sizes come from the in-memory index, so
+        eviction never rescans the directory.
+        """
+        if self.index.total <= self.max_bytes:
+            return
+        for path in list(self.index.sizes):
+            if self.index.total <= self.max_bytes:
+                break
+            if self.index.serving[path]:
+                continue
+            path.unlink(missing_ok=True)
+            self.index.remove(path)
+        logger.info("Label store evicted down to %s bytes", self.index.total)
@@ -1,7 +1,7 @@
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 
-@dataclass
+@dataclass(slots=True)
 class Item:
     """Модель товара в заказе."""
     shop_sku: str
@@ -9,7 +9,7 @@ class Item:
     count: int
     id: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class Address:
     """Модель адреса доставки."""
     country: str = ""
@@ -19,13 +19,13 @@ class Address:
     house: str = ""
     block: str = ""
 
-@dataclass
+@dataclass(slots=True)
 class Delivery:
     """Модель данных доставки."""
     address: Address
     shipment_date: str
 
-@dataclass
+@dataclass(slots=True)
 class Order:
     """Модель заказа."""
     id: str
@@ -33,4 +33,17 @@ class Order:
     delivery: Delivery
     items_total: float
     status: str = ""
-    substatus: str = ""
\ No newline at end of file
+    substatus: str = ""
+    delivery_method_id: Optional[int] = None
+
+    @property
+    def shipment_date(self) -> str:
+        return self.delivery.shipment_date
+
+@dataclass(slots=True)
+class OrderSummary:
+    """Лёгкая модель заказа: только поля для проверки просрочки и ежедневного плана."""
+    id: str
+    shipment_date: str
+    status: str = ""
+    substatus: str = ""
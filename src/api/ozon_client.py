@@ -1,90 +1,136 @@
 # src/api/ozon_client.py
-from datetime import datetime, timedelta
-import requests
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import aiohttp
 from tenacity import retry, stop_after_attempt, wait_exponential
-from src.api.base_client import MarketplaceClient
-from src.utils.logging import logger
+from src.api.base_client import MarketplaceClient, SessionPool
+from src.config.settings import settings
+from src.utils.logging import log_extra, logger
+from src.utils.metrics import count_retry
 
 class OzonAPIClient(MarketplaceClient):
     """Client for interacting with Ozon Seller API."""
 
-    def __init__(self, api_key: str, client_id: str, base_url: str = "https://api-seller.ozon.ru"):
+    platform = "ozon"
+    # Дополнительные блоки ответа v3/posting/fbs/list: парсеры читают только поля самого отправления,
+    # поэтому analytics_data, barcodes и financial_data не запрашиваем; translit лишь включает
+    # транслитерацию адреса и не добавляет блоков в ответ
+    ORDER_LIST_WITH = {"translit": True}
+    SUMMARY_LIST_WITH: Dict[str, bool] = {}  # parse_summary хватает полей самого отправления
+
+    def __init__(self, api_key: str, client_id: str, base_url: str = "https://api-seller.ozon.ru",
+                 session: Optional[aiohttp.ClientSession] = None, session_pool: Optional[SessionPool] = None,
+                 concurrency: Optional[int] = None):
+        super().__init__(base_url, session, session_pool, concurrency)
         self.api_key = api_key
         self.client_id = client_id
-        self.base_url = base_url
         self.headers = {
             "Api-Key": api_key,
             "Client-Id": client_id,
             "Content-Type": "application/json"
         }
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def get_orders(self, status: str, substatus: str = None) -> List[Dict]:
+    def iter_order_pages(self, status: str, substatus: str = None, updated_since: Optional[datetime] = None,
+                         summary: bool = False) -> AsyncIterator[List[Dict]]:
+        """Stream postings created during the last 7 days with the given status, one page at a time.
+
+        When ``updated_since`` is given, only postings whose status changed after it are requested.
+        With ``summary`` no optional response blocks are requested.
+        """
         since = (datetime.today() - timedelta(days=7)).strftime("%Y-%m-%dT%H:%M:%SZ")
         to = datetime.today().strftime("%Y-%m-%dT%H:%M:%SZ")
+        filter_ = {"since": since, "to": to, "status": status}
+        if updated_since:
+            filter_["last_changed_status_date"] = {
+                "from": updated_since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "to": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            }
+        with_ = self.SUMMARY_LIST_WITH if summary else self.ORDER_LIST_WITH
+        return self._paginate(lambda offset: self._get_orders_page(filter_, offset, with_), cursor=0)
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def _get_orders_page(self, filter_: Dict, offset: int,
+                               with_: Optional[Dict[str, bool]] = None) -> Tuple[List[Dict], Optional[int]]:
+        """Fetch one page of postings and return it with the offset of the next page."""
         payload = {
             "dir": "ASC",
-            "filter": {
-                "since": since,
-                "to": to,
-                "status": status
-            },
-            "limit": 100,
-            "offset": 0,
-            "with": {
-                "analytics_data": True,
-                "barcodes": True,
-                "financial_data": True,
-                "translit": True
-            }
+            "filter": filter_,
+            "limit": settings.OZON_ORDERS_PAGE_SIZE,
+            "offset": offset,
+            "with": self.ORDER_LIST_WITH if with_ is None else with_
         }
-        logger.debug(f"[ozon] Sending request to {self.base_url}/v3/posting/fbs/list with payload: {payload}")
-        response = requests.post(
-            f"{self.base_url}/v3/posting/fbs/list",
+        logger.debug("[ozon] Sending request to %s/v3/posting/fbs/list with payload: %s", self.base_url, payload)
+        response = await self._request(
+            "POST", "/v3/posting/fbs/list",
+            endpoint="get_orders",
             headers=self.headers,
             json=payload
         )
         response.raise_for_status()
-        logger.debug(f"[ozon] Response: {response.json()}")
-        return response.json().get("result", {}).get("postings", [])
+        result = response.json().get("result", {})
+        postings = result.get("postings", [])
+        logger.debug("[ozon] Response: %s postings, has_next=%s", len(postings), result.get('has_next'))
+        next_offset = offset + len(postings) if result.get("has_next") and postings else None
+        return postings, next_offset
 
-    def get_market_sku(self, shop_skus: List[str]) -> Dict[str, Dict[str, str]]:
+    async def get_market_sku(self, shop_skus: List[str]) -> Dict[str, Dict[str, str]]:
         return {sku: {"marketSku": sku, "marketModelId": sku} for sku in shop_skus}
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def get_label(self, order_id: str) -> Optional[bytes]:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def get_label(self, order_id: str) -> Optional[bytes]:
         payload = {"posting_number": [order_id]}
-        logger.debug(f"[ozon] Sending request to {self.base_url}/v2/posting/fbs/package-label with payload: {payload}")
-        response = requests.post(
-            f"{self.base_url}/v2/posting/fbs/package-label",
+        logger.debug("[ozon] Sending request to %s/v2/posting/fbs/package-label with payload: %s", self.base_url, payload)
+        response = await self._request(
+            "POST", "/v2/posting/fbs/package-label",
+            endpoint="labels",
             headers=self.headers,
             json=payload
         )
         if response.status_code == 200:
             return response.content
-        logger.error(f"[ozon] Failed to fetch label for order #{order_id}: HTTP {response.status_code} - {response.text}")
+        logger.error("[ozon] Failed to fetch label for order #%s: HTTP %s - %s", order_id, response.status_code, response.text, extra=log_extra(self.platform, order_id))
         return None
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def get_carriage_label(self, carriage_id: int) -> Optional[bytes]:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def download_label(self, order_id: str, dest: str) -> bool:
+        payload = {"posting_number": [order_id]}
+        logger.debug("[ozon] Downloading %s/v2/posting/fbs/package-label with payload: %s", self.base_url, payload)
+        response = await self._download(
+            "POST", "/v2/posting/fbs/package-label", dest,
+            endpoint="labels",
+            headers=self.headers,
+            json=payload
+        )
+        if response.status_code == 200:
+            return True
+        logger.error("[ozon] Failed to fetch label for order #%s: HTTP %s - %s", order_id, response.status_code, response.text, extra=log_extra(self.platform, order_id))
+        return False
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def get_carriage_label(self, carriage_id: int) -> Optional[bytes]:
         payload = {"carriage_id": carriage_id}
-        logger.debug(f"[ozon] Sending request to {self.base_url}/v2/posting/fbs/digital/act/get-pdf with payload: {payload}")
-        response = requests.post(
-            f"{self.base_url}/v2/posting/fbs/digital/act/get-pdf",
+        logger.debug("[ozon] Sending request to %s/v2/posting/fbs/digital/act/get-pdf with payload: %s", self.base_url, payload)
+        response = await self._request(
+            "POST", "/v2/posting/fbs/digital/act/get-pdf",
+            endpoint="carriage_label",
             headers=self.headers,
             json=payload
         )
         if response.status_code == 200:
             return response.content
-        logger.error(f"[ozon] Failed to fetch carriage label for carriage #{carriage_id}: HTTP {response.status_code} - {response.text}")
+        logger.error("[ozon] Failed to fetch carriage label for carriage #%s: HTTP %s - %s", carriage_id, response.status_code, response.text)
         return None
 
-    def get_pickup_point_address(self, order_id: str) -> str:
+    async def get_pickup_point_address(self, order_id: str) -> str:
         payload = {"posting_number": order_id}
-        logger.debug(f"[ozon] Sending request to {self.base_url}/v2/posting/fbs/get with payload: {payload}")
-        response = requests.post(
-            f"{self.base_url}/v2/posting/fbs/get",
+        logger.debug("[ozon] Sending request to %s/v2/posting/fbs/get with payload: %s", self.base_url, payload)
+        response = await self._request(
+            "POST", "/v2/posting/fbs/get",
+            endpoint="get_order",
             headers=self.headers,
             json=payload
         )
@@ -93,65 +139,73 @@ class OzonAPIClient(MarketplaceClient):
             delivery = data.get("delivery", {})
             address = delivery.get("address", {})
             return f"{address.get('city', '')}, {address.get('address_tail', '')}"
-        logger.warning(f"[ozon] Pickup point address for order #{order_id} not found: HTTP {response.status_code} - {response.text}")
+        logger.warning("[ozon] Pickup point address for order #%s not found: HTTP %s - %s", order_id, response.status_code, response.text, extra=log_extra(self.platform, order_id))
         return "Pickup point address not found"
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def set_order_status(self, order_id: str, status: str, substatus: str, items: List[Dict]) -> Dict:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def set_order_status(self, order_id: str, status: str, substatus: str, items: List[Dict]) -> Dict:
         payload = {
             "posting_number": order_id,
             "status": status
         }
-        logger.debug(f"[ozon] Sending request to {self.base_url}/v2/posting/fbs/status with payload: {payload}")
-        response = requests.post(
-            f"{self.base_url}/v2/posting/fbs/status",
+        logger.debug("[ozon] Sending request to %s/v2/posting/fbs/status with payload: %s", self.base_url, payload)
+        response = await self._request(
+            "POST", "/v2/posting/fbs/status",
+            endpoint="status",
             headers=self.headers,
             json=payload
         )
         response.raise_for_status()
         return response.json()
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def get_order_info(self, order_id: str) -> Dict:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def get_order_info(self, order_id: str) -> Dict:
         payload = {"posting_number": order_id}
-        logger.debug(f"[ozon] Sending request to {self.base_url}/v2/posting/fbs/get with payload: {payload}")
-        response = requests.post(
-            f"{self.base_url}/v2/posting/fbs/get",
+        logger.debug("[ozon] Sending request to %s/v2/posting/fbs/get with payload: %s", self.base_url, payload)
+        response = await self._request(
+            "POST", "/v2/posting/fbs/get",
+            endpoint="get_order",
             headers=self.headers,
             json=payload
         )
         response.raise_for_status()
         return response.json().get("result", {})
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def create_carriage(self, delivery_method_id: int, departure_date: str) -> int:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def create_carriage(self, delivery_method_id: int, departure_date: str) -> int:
         payload = {
             "delivery_method_id": delivery_method_id,
             "departure_date": departure_date
         }
-        logger.debug(f"[ozon] Creating carriage with payload: {payload}")
-        response = requests.post(
-            f"{self.base_url}/v1/carriage/create",
+        logger.debug("[ozon] Creating carriage with payload: %s", payload)
+        response = await self._request(
+            "POST", "/v1/carriage/create",
+            endpoint="carriage_create",
             headers=self.headers,
             json=payload
         )
         if response.status_code != 200:
-            logger.error(f"[ozon] Failed to create carriage: HTTP {response.status_code} - {response.text}")
+            logger.error("[ozon] Failed to create carriage: HTTP %s - %s", response.status_code, response.text)
             response.raise_for_status()
         return response.json()["carriage_id"]
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def approve_carriage(self, carriage_id: int, containers_count: int = None) -> Dict:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def approve_carriage(self, carriage_id: int, containers_count: int = None) -> Dict:
         payload = {"carriage_id": carriage_id}
         if containers_count is not None:
             payload["containers_count"] = containers_count
-        logger.debug(f"[ozon] Approving carriage with payload: {payload}")
-        response = requests.post(
-            f"{self.base_url}/v1/carriage/approve",
+        logger.debug("[ozon] Approving carriage with payload: %s", payload)
+        response = await self._request(
+            "POST", "/v1/carriage/approve",
+            endpoint="carriage_approve",
             headers=self.headers,
             json=payload
         )
         if response.status_code != 200:
-            logger.error(f"[ozon] Failed to approve carriage #{carriage_id}: HTTP {response.status_code} - {response.text}")
+            logger.error("[ozon] Failed to approve carriage #%s: HTTP %s - %s", carriage_id, response.status_code, response.text)
             response.raise_for_status()
         return response.json()
\ No newline at end of file
@@ -1,23 +1,39 @@
 # src/api/parsers.py
+from dataclasses import fields
 from typing import Dict
-from src.api.models import Order, Item, Address, Delivery
+from src.api.models import Order, OrderSummary, Item, Address, Delivery
 
 class OrderParser:
     """Base class for parsing marketplace order data."""
     def parse(self, order_data: Dict) -> Order:
         raise NotImplementedError("Subclasses must implement parse method")
 
+    def parse_summary(self, order_data: Dict) -> OrderSummary:
+        """Parse only the ID, shipment date and status, skipping items and address."""
+        raise NotImplementedError("Subclasses must implement parse_summary method")
+
 class YandexOrderParser(OrderParser):
     """Parser for Yandex Market order data."""
+    ADDRESS_FIELDS = tuple(field.name for field in fields(Address))  # План полей адреса считаем один раз
+
+    @staticmethod
+    def _shipment_date(delivery: Dict) -> str:
+        return delivery.get("shipments", [{}])[0].get("shipmentDate", "Not specified")
+
     def parse(self, order_data: Dict) -> Order:
-        address = Address(**{k: order_data["delivery"].get("address", {}).get(k, "") for k in Address.__annotations__})
-        shipment_date = order_data["delivery"].get("shipments", [{}])[0].get("shipmentDate", "Not specified")
-        items = [Item(shop_sku=item["shopSku"], offer_name=item["offerName"], count=item["count"], id=item.get("id")) 
-                 for item in order_data["items"]]
+        delivery = order_data["delivery"]
+        address_data = delivery.get("address", {})
+        address = Address(*[address_data.get(name, "") for name in self.ADDRESS_FIELDS])
+        items = [Item(item["shopSku"], item["offerName"], item["count"], item.get("id")) for item in order_data["items"]]
         return Order(
-            id=str(order_data["id"]), items=items, delivery=Delivery(address=address, shipment_date=shipment_date),
-            items_total=order_data.get("itemsTotal", 0.0), status=order_data.get("status", ""),
-            substatus=order_data.get("substatus", "")
+            str(order_data["id"]), items, Delivery(address, self._shipment_date(delivery)),
+            order_data.get("itemsTotal", 0.0), order_data.get("status", ""), order_data.get("substatus", "")
+        )
+
+    def parse_summary(self, order_data: Dict) -> OrderSummary:
+        return OrderSummary(
+            str(order_data["id"]), self._shipment_date(order_data["delivery"]),
+            order_data.get("status", ""), order_data.get("substatus", "")
         )
 
 class OzonOrderParser(OrderParser):
@@ -25,17 +41,23 @@ class OzonOrderParser(OrderParser):
     def parse(self, order_data: Dict) -> Order:
         address_data = order_data.get("delivery", {}).get("address", {})
         address = Address(
+            postcode=address_data.get("zip_code", ""),
             city=address_data.get("city", ""),
-            street=address_data.get("address_tail", ""),
-            postcode=address_data.get("zip_code", "")
+            street=address_data.get("address_tail", "")
         )
-        shipment_date = order_data.get("shipment_date", "Not specified")
-        items = [Item(shop_sku=str(item["sku"]), offer_name=item["name"], count=item["quantity"], id=item.get("posting_number")) 
+        items = [Item(str(item["sku"]), item["name"], item["quantity"], item.get("posting_number"))
                  for item in order_data.get("products", [])]
         return Order(
-            id=str(order_data["posting_number"]), items=items, delivery=Delivery(address=address, shipment_date=shipment_date),
-            items_total=float(order_data.get("price", "0")), status=order_data.get("status", ""),
-            substatus=""
+            str(order_data["posting_number"]), items,
+            Delivery(address, order_data.get("shipment_date", "Not specified")),
+            float(order_data.get("price", "0")), order_data.get("status", ""),
+            "", order_data.get("delivery_method", {}).get("id")
+        )
+
+    def parse_summary(self, order_data: Dict) -> OrderSummary:
+        return OrderSummary(
+            str(order_data["posting_number"]), order_data.get("shipment_date", "Not specified"),
+            order_data.get("status", "")
         )
 
 # Фабрика парсеров
@@ -49,4 +71,4 @@ def get_parser(platform: str) -> OrderParser:
     parser = PARSERS.get(platform)
     if not parser:
         raise ValueError(f"Unsupported platform: {platform}")
-    return parser
\ No newline at end of file
+    return parser
@@ -1,17 +1,27 @@
 # src/api/services.py
-from datetime import datetime
-from typing import Dict, List
+import asyncio
+import contextlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Union
 from aiogram import Bot
-from aiogram.types import BufferedInputFile, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import InputFile, InlineKeyboardMarkup, InlineKeyboardButton
 from urllib.parse import quote
-import requests
 from babel.support import Translations
 from src.api.models import Order
-from src.api.base_client import MarketplaceClient
+from src.api.base_client import MarketplaceClient, MarketplaceAPIError
+from src.api.cache import SkuMappingCache
+from src.api.carriages import CarriageBatcher
+from src.api.labels import LabelStore
 from src.api.parsers import get_parser
+from src.api.snapshots import OrderSnapshotStore
+from src.bot.sender import TelegramSender
 from src.config.settings import settings
-from src.db.redis_db import RedisDB
-from src.utils.logging import logger
+from src.config.tenants import DEFAULT_TENANT_ID, Tenant, default_tenant
+from src.db.redis_db import ORDER_CONSUMER_GROUP, RedisDB
+from src.utils import jsonlib
+from src.utils.logging import log_extra, logger
 from prometheus_client import Counter
 
 # Prometheus metrics
@@ -19,6 +29,30 @@ NEW_ORDERS_TOTAL = Counter('new_orders_total', 'Total number of new orders proce
 OVERDUE_ORDERS_TOTAL = Counter('overdue_orders_total', 'Total number of overdue orders notified')
 API_ERRORS_TOTAL = Counter('api_errors_total', 'Total number of API errors')
 
+@dataclass
+class Notification:
+    """Prepared Telegram notification for a new order."""
+    order_id: str
+    message: str
+    keyboard: InlineKeyboardMarkup
+    document: Optional[Union[str, InputFile]] = None  # file_id уже загруженной этикетки или файл
+
+@dataclass
+class BulkReadyResult:
+    """Outcome of moving a platform's orders to READY_TO_SHIP in bulk."""
+    updated: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)  # ID заказа -> текст ошибки
+    error: Optional[str] = None  # Не удалось получить список заказов платформы
+
+@lru_cache(maxsize=None)
+def load_translations(locale: str) -> Translations:
+    """Compiled translations for ``locale``, loaded once per process."""
+    return Translations.load('locale', [locale])
+
+def _order_sort_key(order: Order):
+    """Sort numeric order IDs numerically and everything else lexicographically."""
+    return (0, int(order.id), "") if order.id.isdigit() else (1, 0, order.id)
+
 class OrderService:
     """Service for managing marketplace orders and sending notifications via Telegram.
 
@@ -26,16 +60,32 @@ class OrderService:
     track their status, and notify users about new or overdue orders.
     """
 
-    def __init__(self, clients: Dict[str, MarketplaceClient], db: RedisDB):
+    def __init__(self, clients: Dict[str, MarketplaceClient], db: RedisDB, tenant: Optional[Tenant] = None,
+                 sender: Optional[TelegramSender] = None):
         """Initialize the OrderService with marketplace clients and Redis database.
 
         Args:
             clients: Dictionary mapping platform names (e.g., "yandex", "ozon") to their API clients.
             db: Redis database instance for storing sent order IDs and overdue notifications.
+            tenant: Store served by this service; the store configured in the environment by default.
+            sender: Telegram sender shared between tenants; a new one by default.
         """
         self.clients = clients
+        self.tenant = tenant or default_tenant()
         self.db = db
-        self.translations = Translations.load('locale', [settings.LOCALE])
+        self.translations = load_translations(settings.LOCALE)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.sku_cache = SkuMappingCache(db)
+        self.labels = LabelStore(db)
+        self.snapshots = OrderSnapshotStore()
+        self.sender = sender or TelegramSender()
+        self.carriages = CarriageBatcher(db, self.sender)
+
+    def ready_callback_data(self, order_id: str, platform: str) -> str:
+        """Callback data of the "ready to ship" button; the default tenant keeps the old format."""
+        if self.tenant.id == DEFAULT_TENANT_ID:
+            return f"ready_{order_id}_{platform}"
+        return f"ready_{order_id}_{platform}_{self.tenant.id}"
 
     def get_parser(self, platform: str):
         """Get the appropriate parser for the platform."""
@@ -45,7 +95,12 @@ class OrderService:
         """Translate a message using the current locale."""
         return self.translations.gettext(message)
 
-    async def check_new_orders(self, bot: Bot, chat_id: str) -> None:
+    def _selected_clients(self, platforms: Optional[List[str]]) -> Dict[str, MarketplaceClient]:
+        if platforms is None:
+            return self.clients
+        return {platform: client for platform, client in self.clients.items() if platform in platforms}
+
+    async def check_new_orders(self, bot: Bot, chat_id: str, platforms: Optional[List[str]] = None) -> int:
         """"Check for new orders in 'awaiting_packaging' status and send notifications.
 
         Iterates over enabled marketplace clients, fetches orders with the appropriate status
@@ -55,39 +110,239 @@ class OrderService:
         Args:
             bot: Telegram Bot instance for sending messages.
             chat_id: Telegram chat ID where notifications are sent.
+            platforms: Platforms to check; all enabled platforms by default.
+
+        Returns:
+            Number of new orders notified.
         """
-        for platform, client in self.clients.items():
+        notified = 0
+        for platform, client in self._selected_clients(platforms).items():
             try:
                 status = "PROCESSING" if platform == "yandex" else "awaiting_packaging"
                 substatus = "STARTED" if platform == "yandex" else None
-                logger.debug(f"[{platform}] Attempting to fetch orders with status={status}, substatus={substatus}")
-                orders = client.get_orders(status, substatus)
-                sent_orders = self.db.load_sent_orders(platform)
-                logger.info(f"[{platform}] Found {len(orders)} orders in new status")
+                logger.debug("[%s] Attempting to fetch orders with status=%s, substatus=%s", platform, status, substatus)
+                sync_started = datetime.now(timezone.utc)
+                updated_since = self._delta_sync_since(platform, sync_started)
                 parser = get_parser(platform)
-                for order_data in orders:
-                    order_id = str(order_data["id" if platform == "yandex" else "posting_number"])
-                    if order_id not in sent_orders:
-                        order = parser.parse(order_data)
-                        await self.notify_order(bot, chat_id, order, platform, client)
-                        self.db.save_sent_order(order_id, platform)
-                        NEW_ORDERS_TOTAL.inc()
-            except requests.exceptions.RequestException as e:
+                id_field = "id" if platform == "yandex" else "posting_number"
+                found = 0
+                failed = 0
+                # Следующая страница загружается, пока уведомляем о заказах текущей
+                async for orders in client.iter_order_pages(status, substatus, updated_since):
+                    found += len(orders)
+                    if settings.ORDER_STREAM_ENABLED:
+                        # Уведомления отправляют обработчики очереди событий
+                        failed += self._publish_new_orders(orders, platform, id_field)
+                        continue
+                    unsent = self.db.filter_unsent_orders([str(order_data[id_field]) for order_data in orders], platform)
+                    claimed = self.db.claim_orders(unsent, platform, settings.INSTANCE_ID, settings.CLAIM_LEASE_SECONDS)
+                    try:
+                        # Повторная проверка после захвата: другая реплика могла успеть отправить заказ
+                        to_notify = set(self.db.filter_unsent_orders(claimed, platform))
+                        # Разбираем только заказы, о которых будем уведомлять
+                        new_orders = [
+                            parser.parse(order_data) for order_data in orders
+                            if str(order_data[id_field]) in to_notify
+                        ]
+                        async with self._holding_claims(to_notify, platform):
+                            page_failed = await self.notify_orders(bot, chat_id, new_orders, platform, client)
+                        failed += page_failed
+                        notified += len(new_orders) - page_failed
+                    finally:
+                        self.db.release_orders(claimed, platform, settings.INSTANCE_ID)
+                sync_mode = "delta" if updated_since else "full"
+                logger.info("[%s] Found %s orders in new status (%s sync)", platform, found, sync_mode)
+                # Если часть заказов не удалось обработать, отметку не сдвигаем, чтобы забрать их снова
+                if settings.DELTA_SYNC_ENABLED and not failed:
+                    self.db.save_sync_state(platform, sync_started.timestamp(), full_sync=updated_since is None)
+            except MarketplaceAPIError as e:
                 if hasattr(e, 'response') and e.response is not None:
-                    logger.error(f"[{platform}] Error checking new orders: HTTP {e.response.status_code} - {e.response.text}")
+                    logger.error("[%s] Error checking new orders: HTTP %s - %s", platform, e.response.status_code, e.response.text)
                 else:
-                    logger.error(f"[{platform}] Error checking new orders (no response): {str(e)}")
+                    logger.error("[%s] Error checking new orders (no response): %s", platform, e)
                 API_ERRORS_TOTAL.inc()
             except Exception as e:
-                logger.error(f"[{platform}] Unexpected error checking new orders: {str(e)}")
+                logger.error("[%s] Unexpected error checking new orders: %s", platform, e)
                 API_ERRORS_TOTAL.inc()
+        return notified
+
+    @contextlib.asynccontextmanager
+    async def _holding_claims(self, order_ids: Iterable[str], platform: str) -> AsyncIterator[None]:
+        """Renew the claims on the orders not yet sent every third of the lease while the block runs.
+
+        Sending a large page through the Telegram rate limit can take longer than
+        ``CLAIM_LEASE_SECONDS``; without renewal another replica could claim and re-send its orders.
+        """
+        order_ids = list(order_ids)
+
+        async def renew() -> None:
+            while True:
+                await asyncio.sleep(settings.CLAIM_LEASE_SECONDS / 3)
+                pending = self.db.filter_unsent_orders(order_ids, platform)
+                renewed = self.db.renew_order_claims(pending, platform, settings.INSTANCE_ID, settings.CLAIM_LEASE_SECONDS)
+                if len(renewed) < len(pending):
+                    logger.warning("[%s] Lost claims on %s orders while notifying", platform, len(pending) - len(renewed))
+
+        renewer = asyncio.create_task(renew())
+        try:
+            yield
+        finally:
+            renewer.cancel()
+
+    def _publish_new_orders(self, orders: List[Dict], platform: str, id_field: str) -> int:
+        """Publish orders that are neither notified nor queued yet to the order event stream.
+
+        Returns:
+            Number of orders that could not be published.
+        """
+        unsent = self.db.filter_unsent_orders([str(order_data[id_field]) for order_data in orders], platform)
+        to_publish = set(self.db.filter_unqueued_orders(unsent, platform))
+        events = [
+            (str(order_data[id_field]), jsonlib.dumps(order_data)) for order_data in orders
+            if str(order_data[id_field]) in to_publish
+        ]
+        if not self.db.publish_order_events(platform, events):
+            return len(events)
+        if events:
+            logger.info("[%s] Published %s new orders to the order event stream", platform, len(events))
+        return 0
+
+    async def consume_order_events(self, bot: Bot, chat_id: str, consumer: str = settings.INSTANCE_ID,
+                                   group: str = ORDER_CONSUMER_GROUP) -> int:
+        """Notify about one batch of order events from the stream.
+
+        Events left unacknowledged longer than ``ORDER_STREAM_CLAIM_IDLE`` (e.g. by a crashed
+        worker) are taken over first. An event is acknowledged once its order is saved as sent;
+        a failed one stays pending and is retried until ``ORDER_STREAM_MAX_DELIVERIES``, after which
+        it is moved to the dead-letter stream.
+
+        The consumer group must already exist (see ``RedisDB.ensure_order_consumer_group``).
+
+        Returns:
+            Number of events handled in this batch.
+        """
+        entries = self.db.claim_stale_order_events(group, consumer, settings.ORDER_STREAM_CLAIM_IDLE, settings.ORDER_STREAM_BATCH)
+        if len(entries) < settings.ORDER_STREAM_BATCH:
+            fresh = self.db.read_order_events(group, consumer, settings.ORDER_STREAM_BATCH - len(entries))
+            entries += [(entry_id, fields, 1) for entry_id, fields in fresh]
+        by_platform: Dict[str, List] = {}
+        for entry in entries:
+            by_platform.setdefault(entry[1].get("platform"), []).append(entry)
+
+        for platform, platform_entries in by_platform.items():
+            client = self.clients.get(platform)
+            if client is None:
+                for entry_id, fields, _ in platform_entries:
+                    self.db.dead_letter_order_event(group, entry_id, fields, f"Platform {platform} is not enabled")
+                continue
+            parser = get_parser(platform)
+            unsent = set(self.db.filter_unsent_orders([fields["order_id"] for _, fields, _ in platform_entries], platform))
+            orders: Dict[str, Order] = {}
+            dead = set()
+            for entry_id, fields, _ in platform_entries:
+                if fields["order_id"] not in unsent or fields["order_id"] in orders:
+                    continue
+                try:
+                    orders[fields["order_id"]] = parser.parse(jsonlib.loads(fields["payload"]))
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.error("[%s] Malformed order event %s: %s", platform, entry_id, e)
+                    self.db.dead_letter_order_event(group, entry_id, fields, f"Malformed payload: {str(e)}")
+                    dead.add(entry_id)
+            await self.notify_orders(bot, chat_id, list(orders.values()), platform, client)
+            still_unsent = set(self.db.filter_unsent_orders(list(orders), platform))
+            acked = []
+            for entry_id, fields, deliveries in platform_entries:
+                if entry_id in dead:
+                    continue
+                if fields["order_id"] not in still_unsent:
+                    acked.append(entry_id)
+                elif deliveries >= settings.ORDER_STREAM_MAX_DELIVERIES:
+                    logger.error("[%s] Order #%s failed %s times, moving to dead letters", platform, fields['order_id'], deliveries, extra=log_extra(platform, fields['order_id']))
+                    self.db.dead_letter_order_event(group, entry_id, fields, "Too many failed deliveries")
+            self.db.ack_order_events(group, acked)
+        return len(entries)
+
+    def _delta_sync_since(self, platform: str, now: datetime) -> Optional[datetime]:
+        """Return the moment to request changed orders from, or ``None`` for a full reconciliation.
+
+        A full listing is requested when delta sync is disabled, no high-water mark is stored yet,
+        or the last full reconciliation is older than ``FULL_SYNC_INTERVAL``.
+        """
+        if not settings.DELTA_SYNC_ENABLED:
+            return None
+        state = self.db.load_sync_state(platform)
+        watermark = state.get("watermark")
+        last_full_sync = state.get("last_full_sync")
+        if watermark is None or last_full_sync is None or now.timestamp() - last_full_sync >= settings.FULL_SYNC_INTERVAL:
+            return None
+        return datetime.fromtimestamp(watermark - settings.SYNC_OVERLAP, tz=timezone.utc)
+
+    async def notify_orders(self, bot: Bot, chat_id: str, orders: List[Order], platform: str,
+                            client: MarketplaceClient) -> int:
+        """Notify about a batch of new orders using a bounded-concurrency pipeline.
+
+        SKU mappings and labels are fetched for up to ``NOTIFY_CONCURRENCY`` orders of the platform
+        at once, while notifications are sent strictly in order-id order as soon as the next
+        order is prepared. Each order is saved as sent right after its notification was delivered,
+        so a crash in the middle of a page does not notify the delivered orders again.
+
+        Args:
+            bot: Telegram Bot instance.
+            chat_id: Telegram chat ID.
+            orders: Parsed orders that have not been notified yet.
+            platform: Platform name ("yandex" or "ozon").
+            client: Marketplace API client instance.
+
+        Returns:
+            Number of orders that could not be prepared or delivered and will be retried on the next cycle.
+        """
+        if not orders:
+            return 0
+        orders = sorted(orders, key=_order_sort_key)
+        semaphore = self._semaphores.setdefault(platform, asyncio.Semaphore(settings.NOTIFY_CONCURRENCY))
+        try:
+            # Все промахи кэша по партии заказов разрешаются одним пакетным запросом
+            sku_mapping = await self.sku_cache.get_mappings(
+                platform, client, [item.shop_sku for order in orders for item in order.items]
+            )
+        except MarketplaceAPIError as e:
+            logger.error("[%s] Error fetching SKU mappings: %s", platform, e)
+            API_ERRORS_TOTAL.inc()
+            return len(orders)
+
+        async def prepare(order: Order) -> Notification:
+            async with semaphore:
+                return await self.prepare_notification(order, platform, client, sku_mapping)
+
+        tasks = [asyncio.create_task(prepare(order)) for order in orders]
+        failed = 0
+        handled = 0
+        try:
+            for order, task in zip(orders, tasks):
+                handled += 1
+                try:
+                    notification = await task
+                except MarketplaceAPIError as e:
+                    logger.error("[%s] Error preparing notification for order #%s: %s", platform, order.id, e, extra=log_extra(platform, order.id))
+                    API_ERRORS_TOTAL.inc()
+                    failed += 1
+                    continue
+                if await self.send_notification(bot, chat_id, notification, platform):
+                    self.db.save_sent_order(order.id, platform)
+                    NEW_ORDERS_TOTAL.inc()
+                else:
+                    failed += 1
+        finally:
+            for task in tasks[handled:]:
+                # Уже подготовленные, но не отправленные уведомления отпускают свои этикетки
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    self.labels.release(task.result().document)
+                task.cancel()
+        return failed
 
     async def notify_order(self, bot: Bot, chat_id: str, order: Order, platform: str, client: MarketplaceClient) -> None:
         """Send a Telegram notification for a new order, including a PDF label if available.
 
-        Constructs a detailed message with order items, delivery address, and shipment deadline.
-        Attaches a PDF label if provided by the marketplace API and pins the message in the chat.
-
         Args:
             bot: Telegram Bot instance.
             chat_id: Telegram chat ID.
@@ -95,8 +350,30 @@ class OrderService:
             platform: Platform name ("yandex" or "ozon").
             client: Marketplace API client instance.
         """
-        shop_skus = [item.shop_sku for item in order.items]
-        market_sku_mapping = client.get_market_sku(shop_skus)
+        notification = await self.prepare_notification(order, platform, client)
+        await self.send_notification(bot, chat_id, notification, platform)
+
+    async def prepare_notification(self, order: Order, platform: str, client: MarketplaceClient,
+                                   market_sku_mapping: Optional[Dict[str, Dict[str, str]]] = None) -> Notification:
+        """Build the notification for a new order.
+
+        Constructs a detailed message with order items, delivery address, and shipment deadline.
+        SKU mappings come from the mapping cache unless already resolved for the whole batch.
+
+        Args:
+            order: Parsed Order object containing order details.
+            platform: Platform name ("yandex" or "ozon").
+            client: Marketplace API client instance.
+            market_sku_mapping: Pre-resolved SKU mappings for the batch this order belongs to.
+
+        Returns:
+            Notification ready to be sent to Telegram.
+        """
+        if market_sku_mapping is None:
+            market_sku_mapping = await self.sku_cache.get_mappings(
+                platform, client, [item.shop_sku for item in order.items]
+            )
+        label_document = await self.labels.get_document(platform, client, order.id)
         items_text = []
         market_url = settings.YANDEX_MARKET_URL if platform == "yandex" else settings.OZON_MARKET_URL
         for item in order.items:
@@ -123,46 +400,65 @@ class OrderService:
             f"⏰ *{self._translate('shipment_deadline')}* {order.delivery.shipment_date}"
             f"{gift_notice}"
         )
-        label_file = client.get_label(order.id)
-        pdf_input = BufferedInputFile(label_file, filename=f"label_{order.id}.pdf") if label_file else None
-        if not pdf_input:
+        if not label_document:
             message += f"\n\n⚠️ {self._translate('label_error')}"
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=self._translate("ready_to_ship"), callback_data=f"ready_{order.id}_{platform}")]
+            [InlineKeyboardButton(text=self._translate("ready_to_ship"), callback_data=self.ready_callback_data(order.id, platform))]
         ])
+        return Notification(order_id=order.id, message=message, document=label_document, keyboard=keyboard)
+
+    async def send_notification(self, bot: Bot, chat_id: str, notification: Notification, platform: str) -> bool:
+        """Send a prepared notification through the outbound queue and pin it in the chat.
+
+        Returns:
+            True once Telegram confirmed delivery of the message; a failed pin does not undo that.
+        """
         try:
-            if pdf_input:
-                sent_message = await bot.send_document(
-                    chat_id, document=pdf_input, caption=message, parse_mode="Markdown",
-                    reply_markup=keyboard, disable_notification=False
+            if notification.document:
+                sent_message = await self.sender.call(
+                    chat_id, bot.send_document,
+                    chat_id, document=notification.document, caption=notification.message, parse_mode="Markdown",
+                    reply_markup=notification.keyboard, disable_notification=False
                 )
+                if not isinstance(notification.document, str):
+                    self.labels.remember_upload(platform, notification.order_id, sent_message)
             else:
-                sent_message = await bot.send_message(
-                    chat_id, message, parse_mode="Markdown", reply_markup=keyboard,
+                sent_message = await self.sender.call(
+                    chat_id, bot.send_message,
+                    chat_id, notification.message, parse_mode="Markdown", reply_markup=notification.keyboard,
                     disable_notification=False, disable_web_page_preview=True
                 )
-            await bot.pin_chat_message(chat_id, sent_message.message_id, disable_notification=False)
-            logger.info(f"[{platform}] Notification for order #{order.id} sent and pinned")
         except Exception as e:
-            logger.error(f"[{platform}] Error sending notification for order #{order.id}: {str(e)}")
+            logger.error("[%s] Error sending notification for order #%s: %s", platform, notification.order_id, e, extra=log_extra(platform, notification.order_id))
+            return False
+        finally:
+            self.labels.release(notification.document)
+        try:
+            await self.sender.call(chat_id, bot.pin_chat_message, chat_id, sent_message.message_id, disable_notification=False)
+            logger.info("[%s] Notification for order #%s sent and pinned", platform, notification.order_id, extra=log_extra(platform, notification.order_id))
+        except Exception as e:
+            logger.error("[%s] Notification for order #%s sent but not pinned: %s", platform, notification.order_id, e, extra=log_extra(platform, notification.order_id))
+        return True
 
-    async def check_overdue_orders(self, bot: Bot, chat_id: str) -> None:
-        """Check for overdue orders and send notifications."""
-        for platform, client in self.clients.items():
+    async def check_overdue_orders(self, bot: Bot, chat_id: str, platforms: Optional[List[str]] = None) -> int:
+        """Check for overdue orders and send notifications.
+
+        Returns:
+            Number of overdue notifications sent.
+        """
+        notified = 0
+        for platform, client in self._selected_clients(platforms).items():
             try:
                 status = "PROCESSING" if platform == "yandex" else "awaiting_deliver"
                 substatus = "READY_TO_SHIP" if platform == "yandex" else None
-                logger.debug(f"[{platform}] Attempting to fetch overdue orders with status={status}, substatus={substatus}")
-                orders = client.get_orders(status, substatus)
-                overdue_notified = self.db.load_overdue_notified(platform)
-                logger.info(f"[{platform}] Found {len(orders)} orders in overdue status")
-                parser = get_parser(platform)
+                logger.debug("[%s] Attempting to fetch overdue orders with status=%s, substatus=%s", platform, status, substatus)
                 current_date = datetime.now()
-                for order_data in orders:
-                    order = parser.parse(order_data)
+                orders = await self.snapshots.get(platform, client, status, substatus, summary=True)
+                overdue_orders = []
+                for order in orders:
                     try:
                         # Пробуем разные форматы даты
-                        shipment_date_str = order.delivery.shipment_date
+                        shipment_date_str = order.shipment_date
                         for date_format in ["%Y-%m-%dT%H:%M:%SZ", "%d-%m-%Y"]:  # Добавляем DD-MM-YYYY
                             try:
                                 shipment_date = datetime.strptime(shipment_date_str, date_format)
@@ -171,37 +467,93 @@ class OrderService:
                                 continue
                         else:
                             raise ValueError(f"Unknown date format: {shipment_date_str}")
-                        
-                        if (current_date - shipment_date).days >= 1 and order.id not in overdue_notified:
-                            message = (
-                                f"⚠️ *{self._translate('order_overdue')} #{order.id} ({platform})*\n"
-                                f"⏰ {self._translate('shipment_deadline')}: {order.delivery.shipment_date}\n"
-                                f"{self._translate('status')}: {status}"
-                            )
-                            await bot.send_message(chat_id, message, parse_mode="Markdown", disable_notification=False)
-                            logger.warning(f"[{platform}] Sent overdue notification for order #{order.id}")
-                            self.db.save_overdue_notified(order.id, platform)
-                            OVERDUE_ORDERS_TOTAL.inc()
+
+                        if (current_date - shipment_date).days >= 1:
+                            overdue_orders.append(order)
                     except ValueError as ve:
-                        logger.error(f"[{platform}] Invalid shipment date format for order #{order.id}: {shipment_date_str} - {str(ve)}")
-            except requests.exceptions.RequestException as e:
+                        logger.error("[%s] Invalid shipment date format for order #%s: %s - %s", platform, order.id, shipment_date_str, ve, extra=log_extra(platform, order.id))
+                unnotified = set(self.db.filter_overdue_unnotified([order.id for order in overdue_orders], platform))
+                for order in overdue_orders:
+                    if order.id not in unnotified:
+                        continue
+                    message = (
+                        f"⚠️ *{self._translate('order_overdue')} #{order.id} ({platform})*\n"
+                        f"⏰ {self._translate('shipment_deadline')}: {order.shipment_date}\n"
+                        f"{self._translate('status')}: {status}"
+                    )
+                    await self.sender.call(chat_id, bot.send_message, chat_id, message, parse_mode="Markdown", disable_notification=False)
+                    logger.warning("[%s] Sent overdue notification for order #%s", platform, order.id, extra=log_extra(platform, order.id))
+                    self.db.save_overdue_notified(order.id, platform)
+                    OVERDUE_ORDERS_TOTAL.inc()
+                    notified += 1
+                logger.info("[%s] Found %s orders in overdue status", platform, len(orders))
+            except MarketplaceAPIError as e:
                 if hasattr(e, 'response') and e.response is not None:
-                    logger.error(f"[{platform}] Error checking overdue orders: HTTP {e.response.status_code} - {e.response.text}")
+                    logger.error("[%s] Error checking overdue orders: HTTP %s - %s", platform, e.response.status_code, e.response.text)
                 else:
-                    logger.error(f"[{platform}] Error checking overdue orders (no response): {str(e)}")
+                    logger.error("[%s] Error checking overdue orders (no response): %s", platform, e)
                 API_ERRORS_TOTAL.inc()
             except Exception as e:
-                logger.error(f"[{platform}] Unexpected error checking overdue orders: {str(e)}")
+                logger.error("[%s] Unexpected error checking overdue orders: %s", platform, e)
                 API_ERRORS_TOTAL.inc()
+        return notified
+
+    async def set_orders_ready(self, platforms: Optional[List[str]] = None,
+                               order_ids: Optional[List[str]] = None) -> Dict[str, BulkReadyResult]:
+        """Move all eligible orders, or only ``order_ids``, to READY_TO_SHIP (awaiting_deliver for Ozon).
+
+        Eligible orders come from one fresh listing of the packaging status instead of a
+        ``get_order_info`` call per order. Statuses are changed through the client's bulk update
+        and ready Ozon postings are queued for their carriage batch.
+
+        Args:
+            platforms: Platforms to process; all enabled platforms by default.
+            order_ids: Orders to process; every order awaiting packaging by default.
+
+        Returns:
+            Per-platform results; selected orders that are not awaiting packaging appear in none of them.
+        """
+        clients = self._selected_clients(platforms)
+        results = {platform: BulkReadyResult() for platform in clients}
+        eligible: Dict[str, Dict[str, Order]] = {}
+        for platform, client in clients.items():
+            status = "PROCESSING" if platform == "yandex" else "awaiting_packaging"
+            substatus = "STARTED" if platform == "yandex" else None
+            try:
+                orders = await self.snapshots.get(platform, client, status, substatus, max_age=0)
+                eligible[platform] = {order.id: order for order in orders}
+            except MarketplaceAPIError as e:
+                logger.error("[%s] Error fetching orders for bulk ready: %s", platform, e)
+                API_ERRORS_TOTAL.inc()
+                results[platform].error = str(e)
+        for platform, orders in eligible.items():
+            result = results[platform]
+            to_update = [order.id for order in sorted(orders.values(), key=_order_sort_key)] if order_ids is None else [order_id for order_id in order_ids if order_id in orders]
+            if not to_update:
+                continue
+            new_status = "PROCESSING" if platform == "yandex" else "awaiting_deliver"
+            new_substatus = "READY_TO_SHIP" if platform == "yandex" else None
+            errors = await clients[platform].set_orders_status(to_update, new_status, new_substatus)
+            self.snapshots.invalidate(platform)
+            for order_id in to_update:
+                error = errors.get(order_id)
+                if error is None and platform == "ozon" and not self.carriages.add(order_id, orders[order_id].delivery_method_id):
+                    error = "Failed to queue order for carriage"
+                if error is None:
+                    result.updated.append(order_id)
+                else:
+                    result.failed[order_id] = error
+            logger.info("[%s] Bulk ready: %s updated, %s failed", platform, len(result.updated), len(result.failed))
+        return results
 
     async def set_order_status_ready(self, bot: Bot, chat_id: str, order_id: str, platform: str) -> Dict:
-        """Set an order status to READY_TO_SHIP (or equivalent) and create carriage for Ozon."""
+        """Set an order status to READY_TO_SHIP (or equivalent); Ozon orders are queued for a batched carriage."""
         client = self.clients.get(platform)
         if not client:
             return {"status": "ERROR", "errors": [{"code": "INVALID_PLATFORM", "message": f"Platform {platform} not supported"}]}
 
         try:
-            order_data = client.get_order_info(order_id)
+            order_data = await client.get_order_info(order_id)
             if not order_data:
                 return {"status": "ERROR", "errors": [{"code": "FETCH_ERROR", "message": "Failed to fetch order data"}]}
 
@@ -220,49 +572,24 @@ class OrderService:
             items = [{"id": item["id"], "count": item["count"]} for item in order_data.get("items", [])] if platform == "yandex" else []
             status = "PROCESSING" if platform == "yandex" else "awaiting_deliver"
             substatus = "READY_TO_SHIP" if platform == "yandex" else None
-            client.set_order_status(order_id, status, substatus, items)
-            logger.info(f"[{platform}] Order #{order_id} status set to {status}")
+            await client.set_order_status(order_id, status, substatus, items)
+            self.snapshots.invalidate(platform)
+            logger.info("[%s] Order #%s status set to %s", platform, order_id, status, extra=log_extra(platform, order_id))
 
             if platform == "ozon":
-                try:
-                    delivery_method_id = order_data["delivery_method"]["id"]
-                    departure_date = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
-                    carriage_id = client.create_carriage(delivery_method_id=delivery_method_id, departure_date=departure_date)
-                    logger.info(f"[ozon] Created carriage with ID {carriage_id} for delivery_method_id {delivery_method_id}")
-                    client.approve_carriage(carriage_id, containers_count=1)
-                    logger.info(f"[ozon] Approved carriage with ID {carriage_id}")
-
-                    label_file = client.get_carriage_label(carriage_id)
-                    if label_file:
-                        pdf_input = BufferedInputFile(label_file, filename=f"carriage_{carriage_id}.pdf")
-                        await bot.send_document(
-                            chat_id,
-                            document=pdf_input,
-                            caption=f"📤 *Отгрузка #{carriage_id} сформирована для Ozon*\nВключает заказ: {order_id}",
-                            parse_mode="Markdown",
-                            disable_notification=False
-                        )
-                        logger.info(f"[ozon] Sent carriage label for carriage #{carriage_id} to chat")
-                    else:
-                        await bot.send_message(
-                            chat_id,
-                            f"⚠️ *Не удалось получить этикетку для отгрузки #{carriage_id}*",
-                            parse_mode="Markdown"
-                        )
-                except requests.exceptions.HTTPError as e:
-                    logger.error(f"[ozon] Failed to create/approve carriage for order #{order_id}: {str(e)}")
-                    await bot.send_message(chat_id, f"⚠️ *Ошибка при создании/подтверждении отгрузки для #{order_id}: {str(e)}*", parse_mode="Markdown")
-                    return {"status": "ERROR", "errors": [{"code": "CARRIAGE_ERROR", "message": str(e)}]}
+                # Отгрузка оформляется одной на способ доставки и день, а не на каждый заказ
+                if not self.carriages.add(order_id, order_data["delivery_method"]["id"]):
+                    return {"status": "ERROR", "errors": [{"code": "CARRIAGE_ERROR", "message": "Failed to queue order for carriage"}]}
 
             return {"status": "SUCCESS"}
-        except requests.exceptions.RequestException as e:
+        except MarketplaceAPIError as e:
             if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"[{platform}] Error setting order status for #{order_id}: HTTP {e.response.status_code} - {e.response.text}")
+                logger.error("[%s] Error setting order status for #%s: HTTP %s - %s", platform, order_id, e.response.status_code, e.response.text, extra=log_extra(platform, order_id))
             else:
-                logger.error(f"[{platform}] Error setting order status for #{order_id} (no response): {str(e)}")
+                logger.error("[%s] Error setting order status for #%s (no response): %s", platform, order_id, e, extra=log_extra(platform, order_id))
             API_ERRORS_TOTAL.inc()
             return {"status": "ERROR", "errors": [{"code": "HTTP_ERROR", "message": f"HTTP error: {str(e)}"}]}
         except Exception as e:
-            logger.error(f"[{platform}] Error setting order status for #{order_id}: {str(e)}")
+            logger.error("[%s] Error setting order status for #%s: %s", platform, order_id, e, extra=log_extra(platform, order_id))
             API_ERRORS_TOTAL.inc()
             return {"status": "ERROR", "errors": [{"code": "INTERNAL_ERROR", "message": str(e)}]}
\ No newline at end of file
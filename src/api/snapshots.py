@@ -0,0 +1,86 @@
+# src/api/snapshots.py
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from src.api.base_client import MarketplaceClient
+from src.api.models import Order, OrderSummary
+from src.api.parsers import get_parser
+from src.config.settings import settings
+from src.utils.logging import logger
+from src.utils.metrics import CACHE_REQUESTS_TOTAL
+
+SnapshotKey = Tuple[str, str, Optional[str], bool]  # (платформа, статус, подстатус, только сводки)
+
+@dataclass
+class OrderSnapshot:
+    """Parsed orders of one platform in one status, as listed at ``fetched_at``."""
+    orders: Sequence[Union[Order, OrderSummary]]
+    fetched_at: float  # time.monotonic() момента загрузки
+
+class OrderSnapshotStore:
+    """Shared per-cycle snapshots of order listings keyed by platform, status and substatus.
+
+    A listing is fetched and parsed once and then served to every job that asks for the same
+    status within ``ttl`` seconds. Concurrent requests for a stale snapshot wait for a single
+    refresh instead of each walking the pages again.
+
+    Jobs that only need IDs and shipment dates ask for ``summary=True``: they are served from a
+    fresh full snapshot when there is one, and otherwise from a snapshot of ``OrderSummary``
+    objects parsed without items and addresses.
+    """
+
+    def __init__(self, ttl: float = settings.ORDER_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._snapshots: Dict[SnapshotKey, OrderSnapshot] = {}
+        self._locks: Dict[SnapshotKey, asyncio.Lock] = {}
+
+    def _fresh(self, keys: List[SnapshotKey], max_age: float) -> Optional[OrderSnapshot]:
+        for key in keys:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and time.monotonic() - snapshot.fetched_at < max_age:
+                return snapshot
+        return None
+
+    async def get(self, platform: str, client: MarketplaceClient, status: str, substatus: Optional[str] = None,
+                  max_age: Optional[float] = None, summary: bool = False) -> Sequence[Union[Order, OrderSummary]]:
+        """Return parsed orders in the given status, refreshing the snapshot if it is stale.
+
+        With ``summary=True`` the result may hold ``OrderSummary`` objects, which only have
+        ``id``, ``shipment_date``, ``status`` and ``substatus``.
+
+        Raises:
+            MarketplaceAPIError: If the listing has to be refreshed and a page request fails.
+        """
+        key = (platform, status, substatus, summary)
+        keys = [(platform, status, substatus, False), key] if summary else [key]
+        max_age = self.ttl if max_age is None else max_age
+        snapshot = self._fresh(keys, max_age)
+        if snapshot is None:
+            async with self._locks.setdefault(key, asyncio.Lock()):
+                # Пока ждали блокировку, снимок мог обновить другой job
+                snapshot = self._fresh(keys, max_age)
+                if snapshot is None:
+                    CACHE_REQUESTS_TOTAL.labels("order_snapshot", "miss").inc()
+                    fetched_at = time.monotonic()
+                    parser = get_parser(platform)
+                    parse = parser.parse_summary if summary else parser.parse
+                    orders = [parse(order_data) async for order_data in client.get_orders(status, substatus, summary=summary)]
+                    snapshot = OrderSnapshot(orders, fetched_at)
+                    self._snapshots[key] = snapshot
+                    logger.debug("[%s] Refreshed %s/%s snapshot: %s orders", platform, status, substatus, len(orders))
+                    return snapshot.orders
+        CACHE_REQUESTS_TOTAL.labels("order_snapshot", "hit").inc()
+        return snapshot.orders
+
+    def put(self, platform: str, status: str, substatus: Optional[str], orders: List[Order],
+            fetched_at: Optional[float] = None) -> OrderSnapshot:
+        """Store a complete listing obtained elsewhere, e.g. by a full new-orders sync."""
+        snapshot = OrderSnapshot(orders, time.monotonic() if fetched_at is None else fetched_at)
+        self._snapshots[(platform, status, substatus, False)] = snapshot
+        return snapshot
+
+    def invalidate(self, platform: str) -> None:
+        """Drop every snapshot of a platform after its orders changed status."""
+        for key in [key for key in self._snapshots if key[0] == platform]:
+            del self._snapshots[key]
@@ -0,0 +1,41 @@
+# src/api/tenants.py
+from typing import Dict, List, Optional
+from src.api.base_client import MarketplaceClient, SessionPool
+from src.api.ozon_client import OzonAPIClient
+from src.api.services import OrderService
+from src.api.yandex_client import YandexAPIClient
+from src.bot.sender import TelegramSender
+from src.config.settings import settings
+from src.config.tenants import Tenant
+from src.db.redis_db import RedisDB
+
+def build_clients(tenant: Tenant, pool: Optional[SessionPool] = None,
+                  concurrency: Optional[int] = None) -> Dict[str, MarketplaceClient]:
+    """Create the marketplace clients of a tenant on the shared HTTP sessions of ``pool``."""
+    clients = {}
+    if tenant.yandex:
+        clients["yandex"] = YandexAPIClient(
+            tenant.yandex.api_token, settings.YANDEX_API_URL, tenant.yandex.campaign_id, tenant.yandex.business_id,
+            session_pool=pool, concurrency=concurrency
+        )
+    if tenant.ozon:
+        clients["ozon"] = OzonAPIClient(
+            tenant.ozon.api_key, tenant.ozon.client_id, settings.OZON_API_URL,
+            session_pool=pool, concurrency=concurrency
+        )
+    return clients
+
+def build_order_services(tenants: List[Tenant], db: RedisDB, sender: Optional[TelegramSender] = None,
+                         pool: Optional[SessionPool] = None) -> Dict[str, OrderService]:
+    """Create one OrderService per tenant, keyed by tenant ID.
+
+    Services share the Redis connection (each through its own key namespace), the Telegram
+    sender and the HTTP sessions. With several tenants every client may keep at most
+    ``TENANT_HTTP_CONCURRENCY`` requests in flight, so one busy store cannot starve the others.
+    """
+    sender = sender or TelegramSender()
+    concurrency = settings.TENANT_HTTP_CONCURRENCY if len(tenants) > 1 else None
+    return {
+        tenant.id: OrderService(build_clients(tenant, pool, concurrency), db.for_tenant(tenant.namespace), tenant, sender)
+        for tenant in tenants
+    }
@@ -1,10 +1,14 @@
 # src/api/yandex_client.py
+import asyncio
+import time
 from datetime import datetime, timedelta
-import requests
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import aiohttp
 from tenacity import retry, stop_after_attempt, wait_exponential
-from src.api.base_client import MarketplaceClient
-from src.utils.logging import logger
+from src.api.base_client import MarketplaceClient, MarketplaceAPIError, SessionPool
+from src.config.settings import settings
+from src.utils.logging import log_extra, logger
+from src.utils.metrics import CACHE_REQUESTS_TOTAL, count_retry
 
 class YandexAPIClient(MarketplaceClient):
     """Client for interacting with the Yandex Market API.
@@ -12,9 +16,14 @@ class YandexAPIClient(MarketplaceClient):
     Provides methods to fetch orders, labels, and update order statuses for a specific campaign.
     """
 
-    def __init__(self, api_token: str, base_url: str, campaign_id: str, business_id: str):
+    platform = "yandex"
+    STATUS_UPDATE_BATCH_SIZE = 30  # Лимит заказов в одном запросе orders/status-update
+
+    def __init__(self, api_token: str, base_url: str, campaign_id: str, business_id: str,
+                 session: Optional[aiohttp.ClientSession] = None, session_pool: Optional[SessionPool] = None,
+                 concurrency: Optional[int] = None):
+        super().__init__(base_url, session, session_pool, concurrency)
         self.api_token = api_token
-        self.base_url = base_url
         self.campaign_id = campaign_id
         self.business_id = business_id
         self.headers = {
@@ -22,33 +31,67 @@ class YandexAPIClient(MarketplaceClient):
             "Accept": "application/json",
             "Content-Type": "application/json"
         }
+        self._shipments_index: Dict[str, str] = {}
+        self._shipments_index_built_at = float("-inf")
+        self._shipments_lock = asyncio.Lock()
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def get_orders(self, status: str, substatus: str) -> List[Dict]:
-        """Fetch orders from Yandex Market by status and substatus.
+    def iter_order_pages(self, status: str, substatus: Optional[str] = None, updated_since: Optional[datetime] = None,
+                         summary: bool = False) -> AsyncIterator[List[Dict]]:
+        """Stream orders from Yandex Market by status and substatus, one page at a time.
 
         Args:
             status: Order status (e.g., "PROCESSING").
             substatus: Order substatus (e.g., "STARTED").
+            updated_since: If set, only orders updated after this moment are returned.
+            summary: Ignored: the orders listing has no optional response blocks.
 
         Returns:
-            List of order dictionaries as returned by the API.
+            Async iterator over pages of order dictionaries as returned by the API.
 
         Raises:
-            requests.exceptions.RequestException: If the API request fails after retries.
+            MarketplaceAPIError: If a page request fails after retries.
         """
-        response = requests.get(
-            f"{self.base_url}/campaigns/{self.campaign_id}/orders?status={status}&substatus={substatus}",
-            headers=self.headers
+        updated_at_from = updated_since.isoformat(timespec="seconds") if updated_since else None
+        return self._paginate(lambda page_token: self._get_orders_page(status, substatus, page_token, updated_at_from))
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def _get_orders_page(self, status: str, substatus: Optional[str], page_token: Optional[str] = None,
+                               updated_at_from: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Fetch one page of orders and return it with the token of the next page."""
+        params = {"status": status, "limit": settings.YANDEX_ORDERS_PAGE_SIZE}
+        if substatus:
+            params["substatus"] = substatus
+        if updated_at_from:
+            params["updatedAtFrom"] = updated_at_from
+        if page_token:
+            params["page_token"] = page_token
+        response = await self._request(
+            "GET", f"/campaigns/{self.campaign_id}/orders",
+            endpoint="get_orders",
+            headers=self.headers,
+            params=params
         )
         response.raise_for_status()
-        return response.json().get("orders", [])
+        data = response.json()
+        return data.get("orders", []), data.get("paging", {}).get("nextPageToken")
+
+    async def get_market_sku(self, shop_skus: List[str]) -> Dict[str, Dict[str, str]]:
+        """Fetch market SKU and model ID for shop SKUs, split into chunks of the API limit."""
+        size = settings.OFFER_MAPPINGS_BATCH_SIZE
+        chunks = [shop_skus[i:i + size] for i in range(0, len(shop_skus), size)]
+        sku_mapping = {}
+        for chunk_mapping in await asyncio.gather(*(self._get_market_sku_chunk(chunk) for chunk in chunks)):
+            sku_mapping.update(chunk_mapping)
+        return sku_mapping
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def get_market_sku(self, shop_skus: List[str]) -> Dict[str, Dict[str, str]]:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def _get_market_sku_chunk(self, shop_skus: List[str]) -> Dict[str, Dict[str, str]]:
         payload = {"offerIds": shop_skus}
-        response = requests.post(
-            f"{self.base_url}/businesses/{self.business_id}/offer-mappings",
+        response = await self._request(
+            "POST", f"/businesses/{self.business_id}/offer-mappings",
+            endpoint="offer-mappings",
             headers=self.headers,
             json=payload
         )
@@ -63,53 +106,149 @@ class YandexAPIClient(MarketplaceClient):
                 sku_mapping[shop_sku] = {"marketSku": str(market_sku), "marketModelId": str(market_model_id)}
         return sku_mapping
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def get_label(self, order_id: str) -> Optional[bytes]:
-        response = requests.get(
-            f"{self.base_url}/campaigns/{self.campaign_id}/orders/{order_id}/delivery/labels",
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def get_label(self, order_id: str) -> Optional[bytes]:
+        response = await self._request(
+            "GET", f"/campaigns/{self.campaign_id}/orders/{order_id}/delivery/labels",
+            endpoint="labels",
             headers={"Api-Key": self.api_token},
             params={"format": "A9"}
         )
         if response.status_code == 200:
             return response.content
-        logger.error(f"Failed to fetch label for order #{order_id}: {response.status_code}")
+        logger.error("Failed to fetch label for order #%s: %s", order_id, response.status_code, extra=log_extra(self.platform, order_id))
         return None
 
-    def get_pickup_point_address(self, order_id: str) -> str:
-        today=datetime.today() - timedelta(days=1)
-        tommorow = datetime.today() + timedelta(days=1)
-        payload = {"dateFrom": today.strftime("%Y-%m-%d"),
-                   "dateTo": tommorow.strftime("%Y-%m-%d")}
-        response = requests.put(
-            f"{self.base_url}/campaigns/{self.campaign_id}/first-mile/shipments",
-            headers=self.headers,
-            json=payload
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def download_label(self, order_id: str, dest: str) -> bool:
+        response = await self._download(
+            "GET", f"/campaigns/{self.campaign_id}/orders/{order_id}/delivery/labels", dest,
+            endpoint="labels",
+            headers={"Api-Key": self.api_token},
+            params={"format": "A9"}
         )
         if response.status_code == 200:
-            shipments = response.json()["result"].get("shipments", [])
-            if shipments:
-                for shipment in shipments:
-                    if int(order_id) in shipment["orderIds"]:
-                        return str(shipment["warehouseTo"]["address"])
-        logger.warning(f"Pickup point address for order #{order_id} not found")
+            return True
+        logger.error("Failed to fetch label for order #%s: %s", order_id, response.status_code, extra=log_extra(self.platform, order_id))
+        return False
+
+    async def get_pickup_point_address(self, order_id: str) -> str:
+        """Look up the first-mile warehouse address for an order.
+
+        Uses an orderId -> address index built from one shipments listing. The index is rebuilt
+        when it is older than ``SHIPMENTS_INDEX_TTL`` or when the order is missing from it, but
+        at most once per ``SHIPMENTS_INDEX_MIN_REFRESH`` seconds.
+        """
+        order_id = str(order_id)
+        age = time.monotonic() - self._shipments_index_built_at
+        if age >= settings.SHIPMENTS_INDEX_TTL or (
+                order_id not in self._shipments_index and age >= settings.SHIPMENTS_INDEX_MIN_REFRESH):
+            await self._refresh_shipments_index(self._shipments_index_built_at)
+        address = self._shipments_index.get(order_id)
+        CACHE_REQUESTS_TOTAL.labels("shipments_index", "hit" if address is not None else "miss").inc()
+        if address is not None:
+            return address
+        logger.warning("Pickup point address for order #%s not found", order_id, extra=log_extra(self.platform, order_id))
         return "Pickup point address not found"
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def set_order_status(self, order_id: str, status: str, substatus: str, items: List[Dict]) -> Dict:
+    async def _refresh_shipments_index(self, seen_built_at: float) -> None:
+        """Rebuild the shipments index unless another coroutine already did it while we waited."""
+        async with self._shipments_lock:
+            if self._shipments_index_built_at != seen_built_at:
+                return
+            today=datetime.today() - timedelta(days=1)
+            tommorow = datetime.today() + timedelta(days=1)
+            payload = {"dateFrom": today.strftime("%Y-%m-%d"),
+                       "dateTo": tommorow.strftime("%Y-%m-%d")}
+            index = {}
+            try:
+                async for shipments in self._paginate(lambda page_token: self._get_shipments_page(payload, page_token)):
+                    for shipment in shipments:
+                        address = str(shipment["warehouseTo"]["address"])
+                        for shipment_order_id in shipment.get("orderIds", []):
+                            index[str(shipment_order_id)] = address
+            except MarketplaceAPIError as e:
+                logger.error("Failed to fetch first-mile shipments: %s", e)
+            else:
+                self._shipments_index = index
+            # Даже после ошибки не повторяем запрос чаще, чем раз в SHIPMENTS_INDEX_MIN_REFRESH
+            self._shipments_index_built_at = time.monotonic()
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def _get_shipments_page(self, payload: Dict, page_token: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Fetch one page of first-mile shipments and return it with the token of the next page."""
+        params = {"page_token": page_token} if page_token else None
+        response = await self._request(
+            "PUT", f"/campaigns/{self.campaign_id}/first-mile/shipments",
+            endpoint="shipments",
+            headers=self.headers,
+            json=payload,
+            params=params
+        )
+        response.raise_for_status()
+        result = response.json().get("result", {})
+        return result.get("shipments", []), result.get("paging", {}).get("nextPageToken")
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def set_order_status(self, order_id: str, status: str, substatus: str, items: List[Dict]) -> Dict:
         payload = {"order": {"status": status, "substatus": substatus, "items": items}}
-        response = requests.put(
-            f"{self.base_url}/campaigns/{self.campaign_id}/orders/{order_id}/status",
+        response = await self._request(
+            "PUT", f"/campaigns/{self.campaign_id}/orders/{order_id}/status",
+            endpoint="status",
             headers=self.headers,
             json=payload
         )
         response.raise_for_status()
         return response.json()
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def get_order_info(self, order_id: str) -> Dict:
-        response = requests.get(
-            f"{self.base_url}/campaigns/{self.campaign_id}/orders/{order_id}",
+    async def set_orders_status(self, order_ids: List[str], status: str,
+                                substatus: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """Move orders to ``status`` through the batch endpoint, ``STATUS_UPDATE_BATCH_SIZE`` orders per call."""
+        size = self.STATUS_UPDATE_BATCH_SIZE
+        chunks = [order_ids[i:i + size] for i in range(0, len(order_ids), size)]
+        results: Dict[str, Optional[str]] = {}
+
+        async def update(chunk: List[str]) -> None:
+            try:
+                results.update(await self._set_orders_status_chunk(chunk, status, substatus))
+            except MarketplaceAPIError as e:
+                results.update({order_id: str(e) for order_id in chunk})
+
+        await asyncio.gather(*(update(chunk) for chunk in chunks))
+        return {order_id: results.get(order_id, "No result returned") for order_id in order_ids}
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def _set_orders_status_chunk(self, order_ids: List[str], status: str,
+                                       substatus: Optional[str]) -> Dict[str, Optional[str]]:
+        order = {"status": status}
+        if substatus:
+            order["substatus"] = substatus
+        payload = {"orders": [{"id": int(order_id), **order} for order_id in order_ids]}
+        response = await self._request(
+            "POST", f"/campaigns/{self.campaign_id}/orders/status-update",
+            endpoint="status_batch",
+            headers=self.headers,
+            json=payload
+        )
+        response.raise_for_status()
+        results = {}
+        for result in response.json().get("result", {}).get("orders", []):
+            error = None if result.get("updateStatus") == "OK" else result.get("errorDetails") or "Status update failed"
+            results[str(result["id"])] = error
+        return results
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
+           before_sleep=count_retry, reraise=True)
+    async def get_order_info(self, order_id: str) -> Dict:
+        response = await self._request(
+            "GET", f"/campaigns/{self.campaign_id}/orders/{order_id}",
+            endpoint="get_order",
             headers=self.headers
         )
         response.raise_for_status()
-        return response.json().get("order", {})
\ No newline at end of file
+        return response.json().get("order", {})
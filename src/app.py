@@ -0,0 +1,85 @@
+# src/app.py
+from functools import cached_property
+from typing import Dict, Optional
+from babel.support import Translations
+from src.api.base_client import SessionPool
+from src.api.services import OrderService, load_translations
+from src.api.tenants import build_order_services
+from src.bot.jobs import JobQueue
+from src.bot.leader import LeaderElector
+from src.bot.scheduler import PollScheduler
+from src.bot.sender import TelegramSender
+from src.config.settings import settings
+from src.config.tenants import load_tenants
+from src.db.redis_db import RedisDB
+
+class AppContainer:
+    """Process-wide objects shared by the background tasks and the Telegram handlers.
+
+    Everything is built lazily on first access, so importing the bot costs nothing and a
+    ``ROLE=bot`` process never creates what only the pollers use. Handlers receive the
+    container as ``container`` from the Dispatcher's workflow data; ``close`` releases
+    whatever was created.
+    """
+
+    @cached_property
+    def db(self) -> RedisDB:
+        return RedisDB(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB)
+
+    @cached_property
+    def sessions(self) -> SessionPool:
+        return SessionPool()
+
+    @cached_property
+    def sender(self) -> TelegramSender:
+        return TelegramSender()
+
+    @cached_property
+    def order_services(self) -> Dict[str, OrderService]:
+        """One OrderService per tenant, keyed by tenant ID."""
+        return build_order_services(load_tenants(), self.db, self.sender, self.sessions)
+
+    @cached_property
+    def jobs(self) -> JobQueue:
+        return JobQueue()
+
+    @cached_property
+    def elector(self) -> LeaderElector:
+        return LeaderElector(self.db)
+
+    @cached_property
+    def scheduler(self) -> PollScheduler:
+        return PollScheduler()
+
+    @property
+    def translations(self) -> Translations:
+        return load_translations(settings.LOCALE)
+
+    def service_for_chat(self, chat_id: int) -> Optional[OrderService]:
+        """Order service of the tenant whose notifications go to ``chat_id``, or None for any other chat.
+
+        Even a single-store deployment only answers in its own chat, so strangers who add the bot
+        cannot act on the store's orders.
+        """
+        for service in self.order_services.values():
+            if service.tenant.chat_id == str(chat_id):
+                return service
+        return None
+
+    def _built(self, name: str) -> bool:
+        return name in self.__dict__  # cached_property кладёт созданный объект в __dict__
+
+    async def close(self) -> None:
+        """Stop background jobs and close every connection the container has opened."""
+        if self._built("jobs"):
+            await self.jobs.close()
+        if self._built("sender"):
+            await self.sender.close()
+        if self._built("order_services"):
+            for order_service in self.order_services.values():
+                for client in order_service.clients.values():
+                    await client.close()
+        if self._built("sessions"):
+            await self.sessions.close()
+        if self._built("db"):
+            self.db.close()
@@ -1,61 +1,116 @@
 # src/bot/handlers.py
-from aiogram import Router, F
-from aiogram.types import CallbackQuery
+from aiogram import Bot, Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, Message
 from src.api.services import OrderService
-from src.api.yandex_client import YandexAPIClient
-from src.api.ozon_client import OzonAPIClient
-from src.db.redis_db import RedisDB
-from src.config.settings import settings
+from src.app import AppContainer
+from src.config.tenants import DEFAULT_TENANT_ID
 from src.utils.logging import logger
 
 router = Router()
 
-clients = {}
-if settings.YANDEX_ENABLED:
-    clients["yandex"] = YandexAPIClient(
-        settings.YANDEX_API_TOKEN, settings.YANDEX_API_URL,
-        settings.YANDEX_CAMPAIGN_ID, settings.YANDEX_BUSINESS_ID
-    )
-if settings.OZON_ENABLED:
-    clients["ozon"] = OzonAPIClient(
-        settings.OZON_API_KEY, settings.OZON_CLIENT_ID, settings.OZON_API_URL
+@router.callback_query(F.data.startswith("ready_"))
+async def process_ready(callback: CallbackQuery, container: AppContainer) -> None:
+    """Answer the button press at once and change the order status in a background job."""
+    # ready_{order_id}_{platform}[_{tenant_id}]; кнопки без магазина относятся к магазину по умолчанию
+    _, order_id, platform, *rest = callback.data.split("_")
+    order_service = container.order_services.get(rest[0] if rest else DEFAULT_TENANT_ID)
+    message = callback.message
+    # Кнопку принимаем только в чате её магазина: callback_data присылает клиент
+    if order_service is None or message is None or str(message.chat.id) != order_service.tenant.chat_id:
+        await callback.answer("❌ Магазин не найден")
+        return
+    queued = container.jobs.submit(
+        ("ready", order_service.tenant.id, platform, order_id),
+        lambda: _mark_ready(callback.bot, order_service, message, order_id, platform)
     )
+    await callback.answer("⏳ Обрабатываю заказ..." if queued else "⏳ Заказ уже обрабатывается")
 
-order_service = OrderService(
-    clients,
-    RedisDB(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB)
-)
-
-@router.callback_query(F.data.startswith("ready_"))
-async def process_ready(callback: CallbackQuery) -> None:
+async def _mark_ready(bot: Bot, order_service: OrderService, message: Message, order_id: str, platform: str) -> None:
+    """Set the order ready and edit the notification with the outcome."""
     try:
-        _, order_id, platform = callback.data.split("_")
-        chat_id = callback.message.chat.id
-        result = await order_service.set_order_status_ready(callback.bot, chat_id, order_id, platform)
-        
+        result = await order_service.set_order_status_ready(bot, message.chat.id, order_id, platform)
+
         if result["status"] == "SUCCESS":
             if platform == "yandex":
-                pvz_address = order_service.clients[platform].get_pickup_point_address(order_id)
+                pvz_address = await order_service.clients[platform].get_pickup_point_address(order_id)
                 text = (
                     f"📦 *{order_service._translate('order_ready')} #{order_id} ({platform})*\n\n"
                     f"📍 *{order_service._translate('bring_to_pvz')}*\n  {pvz_address}"
                 )
-            else:  # Ozon уже отправляет сообщение с этикеткой в set_order_status_ready
-                text = f"✅ Заказ #{order_id} готов к отгрузке!"
+            else:  # Акт отгрузки Ozon придёт одним сообщением на всю партию
+                text = f"✅ Заказ #{order_id} готов к отгрузке и добавлен в отгрузку!"
         else:
             error_message = result["errors"][0]["message"]
             text = f"❌ {order_service._translate('status_update_error')}:\n{error_message}"
-        
-        if callback.message.document:
-            await callback.message.edit_caption(caption=text, parse_mode="Markdown")
-        else:
-            await callback.message.edit_text(text=text, parse_mode="Markdown", reply_markup=None)
-        await callback.answer()
     except Exception as e:
-        logger.error(f"Error processing ready callback: {str(e)}")
+        logger.error("Error processing ready callback: %s", e)
         text = f"❌ {order_service._translate('internal_error')}: {str(e)}"
-        if callback.message.document:
-            await callback.message.edit_caption(caption=text, parse_mode="Markdown")
-        else:
-            await callback.message.edit_text(text=text, parse_mode="Markdown", reply_markup=None)
-        await callback.answer()
\ No newline at end of file
+
+    chat_id = message.chat.id
+    if message.document:
+        await order_service.sender.call(
+            chat_id, bot.edit_message_caption,
+            chat_id=chat_id, message_id=message.message_id, caption=text, parse_mode="Markdown"
+        )
+    else:
+        await order_service.sender.call(
+            chat_id, bot.edit_message_text,
+            text=text, chat_id=chat_id, message_id=message.message_id, parse_mode="Markdown", reply_markup=None
+        )
+
+@router.message(Command("close_shipment"))
+async def close_shipment(message: Message, container: AppContainer) -> None:
+    """Create Ozon carriages for every open batch right away instead of waiting for the window."""
+    order_service = container.service_for_chat(message.chat.id)
+    if order_service is None:
+        await message.answer("❌ Этот чат не привязан к магазину")
+        return
+    client = order_service.clients.get("ozon")
+    if client is None:
+        await message.answer("❌ Ozon не подключён")
+        return
+    try:
+        created = await order_service.carriages.flush(message.bot, message.chat.id, client)
+        if not created:
+            await message.answer("📭 Нет заказов, ожидающих отгрузки")
+    except Exception as e:
+        logger.error("Error closing shipment: %s", e)
+        await message.answer(f"❌ {order_service._translate('internal_error')}: {str(e)}")
+
+
+@router.message(Command("ready_all"))
+async def ready_all(message: Message, command: CommandObject, container: AppContainer) -> None:
+    """Mark every order awaiting packaging as ready, or only those listed: /ready_all [yandex|ozon] [ID ...]."""
+    order_service = container.service_for_chat(message.chat.id)
+    if order_service is None:
+        await message.answer("❌ Этот чат не привязан к магазину")
+        return
+    args = (command.args or "").split()
+    platforms = [arg for arg in args if arg in order_service.clients] or None
+    order_ids = [arg for arg in args if arg not in order_service.clients] or None
+    try:
+        results = await order_service.set_orders_ready(platforms, order_ids)
+    except Exception as e:
+        logger.error("Error processing ready_all command: %s", e)
+        await message.answer(f"❌ {order_service._translate('internal_error')}: {str(e)}")
+        return
+    lines = ["📦 *Массовая отметка готовности*"]
+    processed = set()
+    for platform, result in results.items():
+        processed.update(result.updated, result.failed)
+        if result.error:
+            lines.append(f"\n*{platform.capitalize()}*: ⚠️ {order_service._translate('fetch_orders_error')} {platform}: {result.error}")
+            continue
+        lines.append(f"\n*{platform.capitalize()}*: ✅ {len(result.updated)}, ❌ {len(result.failed)}")
+        for order_id, error in list(result.failed.items())[:10]:
+            lines.append(f"  • #{order_id}: {error}")
+        if len(result.failed) > 10:
+            lines.append(f"  • ... и ещё {len(result.failed) - 10}")
+    if order_ids and not any(result.error for result in results.values()):
+        skipped = [order_id for order_id in order_ids if order_id not in processed]
+        if skipped:
+            lines.append(f"\n⏭ Не ожидают сборки: {', '.join(skipped[:30])}")
+    if not processed and not order_ids:
+        lines.append("\n📭 Нет заказов, ожидающих сборки")
+    await message.answer("\n".join(lines), parse_mode="Markdown")
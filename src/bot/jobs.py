@@ -0,0 +1,67 @@
+# src/bot/jobs.py
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+from src.config.settings import settings
+from src.utils.logging import logger
+
+class JobQueue:
+    """Background queue for work started from Telegram updates.
+
+    Handlers submit a job and return at once, so callbacks are answered before the slow marketplace
+    calls run. Jobs are keyed: while a job with the same key is queued or running, resubmitting it is
+    a no-op, which makes repeated button presses for one order idempotent.
+    """
+
+    def __init__(self, workers: int = settings.JOB_WORKERS):
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._active: Dict[Hashable, asyncio.Future] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._active)
+
+    def submit(self, key: Hashable, job: Callable[[], Awaitable[None]]) -> bool:
+        """Queue ``job()`` unless a job with ``key`` is already queued or running.
+
+        Returns:
+            False if the job was a duplicate and was not queued.
+        """
+        if key in self._active:
+            return False
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._active[key] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((key, job))
+        return True
+
+    async def wait(self, key: Hashable) -> None:
+        """Wait until the job with ``key`` has finished (returns at once if there is none)."""
+        future = self._active.get(key)
+        if future is not None:
+            await asyncio.shield(future)
+
+    async def _worker(self) -> None:
+        while True:
+            key, job = await self._queue.get()
+            try:
+                await job()
+            except Exception as e:
+                logger.error("Background job %s failed: %s", key, e)
+            finally:
+                future = self._active.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_result(None)
+
+    async def close(self) -> None:
+        """Stop the workers; queued jobs that have not started are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        for future in self._active.values():
+            future.cancel()
+        self._active.clear()
@@ -0,0 +1,60 @@
+# src/bot/leader.py
+import asyncio
+import time
+from src.config.settings import settings
+from src.db.redis_db import RedisDB
+from src.utils.logging import logger
+
+class LeaderElector:
+    """Redis lease-based leader election for the periodic schedulers.
+
+    The lease is renewed every heartbeat; if the leader dies, the lease expires and another
+    replica takes over within ``LEADER_LEASE_SECONDS``. If Redis is unreachable, the current
+    leader keeps its role until its own lease would have expired.
+    """
+
+    def __init__(self, db: RedisDB, name: str = "scheduler", owner: str = settings.INSTANCE_ID,
+                 lease_seconds: float = settings.LEADER_LEASE_SECONDS,
+                 heartbeat_seconds: float = settings.LEADER_HEARTBEAT_SECONDS):
+        self.db = db
+        self.name = name
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self._lease_expires_at = 0.0
+        self._leader_event = asyncio.Event()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_event.is_set() and time.monotonic() < self._lease_expires_at
+
+    async def wait_until_leader(self) -> None:
+        """Block until this replica holds the leader lease."""
+        while not self.is_leader:
+            self._leader_event.clear()
+            await self._leader_event.wait()
+
+    def heartbeat(self) -> bool:
+        """Acquire or renew the lease once and update the local leadership state."""
+        started = time.monotonic()
+        acquired = self.db.acquire_lease(self.name, self.owner, self.lease_seconds)
+        was_leader = self.is_leader
+        if acquired:
+            self._lease_expires_at = started + self.lease_seconds
+            self._leader_event.set()
+        elif acquired is False or time.monotonic() >= self._lease_expires_at:
+            self._leader_event.clear()
+        if self.is_leader != was_leader:
+            logger.info("Instance %s %s the %s leader", self.owner, "became" if self.is_leader else "is no longer", self.name)
+        return self.is_leader
+
+    async def run(self) -> None:
+        """Keep the lease renewed until cancelled, then release it."""
+        try:
+            while True:
+                self.heartbeat()
+                await asyncio.sleep(self.heartbeat_seconds)
+        finally:
+            if self.is_leader:
+                self.db.release_lease(self.name, self.owner)
+            self._leader_event.clear()
@@ -0,0 +1,147 @@
+# src/bot/scheduler.py
+import random
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence, Set, Tuple
+import pytz
+from src.config.settings import settings
+from src.utils.metrics import POLL_NEXT_RUN_TIMESTAMP
+
+def parse_cutoffs(value: str) -> Tuple[Tuple[int, int], ...]:
+    """Parse a comma-separated list of ``HH:MM`` shipment cutoff times.
+
+    Raises:
+        ValueError: If a time is malformed or out of range.
+    """
+    cutoffs = []
+    for part in filter(None, (item.strip() for item in value.split(","))):
+        match = re.fullmatch(r"(\d{1,2}):(\d{2})", part)
+        if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+            raise ValueError(f"Invalid shipment cutoff {part!r}, expected HH:MM")
+        cutoffs.append((int(match.group(1)), int(match.group(2))))
+    return tuple(cutoffs)
+
+class RequestBudget:
+    """Hourly API request budget of one platform, shared by every job that polls it.
+
+    ``reserve`` is the fraction of ``quota_per_hour`` kept for requests made outside polling
+    (button callbacks, the daily plan, /ready_all, carriages); the rest is split evenly
+    between the schedules that joined the budget.
+    """
+
+    def __init__(self, quota_per_hour: float, reserve: float = settings.API_QUOTA_RESERVE):
+        self.quota_per_hour = quota_per_hour
+        self.reserve = reserve
+        self.members: Set[str] = set()
+
+    def join(self, name: str) -> None:
+        self.members.add(name)
+
+    def share(self) -> float:
+        """Requests per hour each member schedule may spend."""
+        return self.quota_per_hour * (1 - self.reserve) / max(len(self.members), 1)
+
+class AdaptiveSchedule:
+    """Decides when a polling job should run next.
+
+    The interval drops to ``min_interval`` after a run that found work and grows by ``backoff``
+    after every empty run, up to ``max_interval``. Inside the window before a shipment cutoff
+    the job is polled at ``min_interval``. The interval never goes below what the API quota
+    allows: the job's share of ``budget`` (or ``quota_per_hour`` of its own) spread over the
+    average request cost of a run.
+    """
+
+    def __init__(self, name: str, min_interval: float, max_interval: float,
+                 quota_per_hour: Optional[float] = None, backoff: float = settings.POLL_BACKOFF,
+                 jitter: float = settings.POLL_JITTER, cutoffs: Sequence[Tuple[int, int]] = (),
+                 cutoff_window: float = settings.CUTOFF_WINDOW_MINUTES * 60, tz: str = settings.TIMEZONE,
+                 budget: Optional[RequestBudget] = None):
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.quota_per_hour = quota_per_hour
+        self.budget = budget
+        if budget is not None:
+            budget.join(name)
+        self.backoff = backoff
+        self.jitter = jitter
+        self.cutoffs = tuple(cutoffs)
+        self.cutoff_window = cutoff_window
+        self.tz = pytz.timezone(tz)
+        self.interval = min_interval
+        self.requests_per_run = 1.0
+        self.next_run_at: Optional[datetime] = None
+
+    def record(self, found: int, requests: Optional[int] = None) -> None:
+        """Adapt the interval to the outcome of the last run."""
+        if found:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        if requests is not None:
+            # Экспоненциальное сглаживание стоимости одного прогона в запросах к API
+            self.requests_per_run = 0.7 * self.requests_per_run + 0.3 * max(requests, 1)
+
+    def seconds_to_cutoff(self, now: datetime) -> Optional[float]:
+        """Seconds until the nearest upcoming shipment cutoff, or None if no cutoffs are configured."""
+        local_now = now.astimezone(self.tz)
+        deltas = []
+        for hour, minute in self.cutoffs:
+            cutoff = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if cutoff <= local_now:
+                cutoff += timedelta(days=1)
+            deltas.append((cutoff - local_now).total_seconds())
+        return min(deltas) if deltas else None
+
+    def quota_floor(self) -> float:
+        """Shortest interval that keeps the job within its hourly request budget."""
+        quota = self.budget.share() if self.budget is not None and self.budget.quota_per_hour else self.quota_per_hour
+        if not quota:
+            return 0.0
+        return 3600.0 * self.requests_per_run / quota
+
+    def next_delay(self, now: Optional[datetime] = None) -> float:
+        """Return the delay before the next run and remember when that run is due."""
+        now = now or datetime.now(pytz.utc)
+        interval = self.interval
+        to_cutoff = self.seconds_to_cutoff(now)
+        if to_cutoff is not None and to_cutoff <= self.cutoff_window:
+            interval = self.min_interval
+        interval = max(interval, self.quota_floor())
+        if self.jitter:
+            interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.next_run_at = now + timedelta(seconds=interval)
+        return interval
+
+class PollScheduler:
+    """Registry of the adaptive schedules of all polling jobs.
+
+    When each job runs next is exported as the ``poll_next_run_timestamp`` gauge.
+    """
+
+    def __init__(self):
+        self.schedules: Dict[str, AdaptiveSchedule] = {}
+        self.budgets: Dict[str, RequestBudget] = {}
+
+    def budget(self, name: str, quota_per_hour: float) -> RequestBudget:
+        """Return the request budget called ``name``, creating it on first use."""
+        if name not in self.budgets:
+            self.budgets[name] = RequestBudget(quota_per_hour)
+        return self.budgets[name]
+
+    def get(self, name: str, **kwargs) -> AdaptiveSchedule:
+        """Return the schedule called ``name``, creating it with ``kwargs`` on first use."""
+        if name not in self.schedules:
+            self.schedules[name] = AdaptiveSchedule(name, **kwargs)
+            # Значение читается при каждом опросе Prometheus
+            POLL_NEXT_RUN_TIMESTAMP.labels(name).set_function(lambda: self.next_run_timestamp(name))
+        return self.schedules[name]
+
+    def next_runs(self) -> Dict[str, Optional[datetime]]:
+        """When each job is due to run next."""
+        return {name: schedule.next_run_at for name, schedule in self.schedules.items()}
+
+    def next_run_timestamp(self, name: str) -> float:
+        """UNIX time the job is due to run next, NaN if it is unknown; exported as ``poll_next_run_timestamp``."""
+        next_run = self.next_runs().get(name)
+        return next_run.timestamp() if next_run else float("nan")
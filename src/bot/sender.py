@@ -0,0 +1,140 @@
+# src/bot/sender.py
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+from aiogram.exceptions import TelegramRetryAfter
+from src.config.settings import settings
+from src.utils.logging import logger
+from src.utils.metrics import TELEGRAM_QUEUE_DEPTH, TELEGRAM_SEND_SECONDS
+
+T = TypeVar("T")
+
+class TokenBucket:
+    """Token bucket limiting how often an action may happen."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for ``seconds`` (e.g. after a flood-control error)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+class TelegramSender:
+    """Rate-limited outbound queue for Telegram Bot API calls.
+
+    Calls for one chat are executed strictly in submission order by a dedicated worker, while
+    different chats are served in parallel. Every call takes a token from its chat bucket and
+    from the global bucket; ``TelegramRetryAfter`` pauses the chat for ``retry_after`` seconds
+    and the call is retried, so flood control delays delivery instead of dropping it.
+    """
+
+    def __init__(self, global_rate: float = settings.TELEGRAM_GLOBAL_RATE,
+                 chat_rate: float = settings.TELEGRAM_CHAT_RATE, chat_burst: float = settings.TELEGRAM_CHAT_BURST,
+                 max_retries: int = settings.TELEGRAM_MAX_RETRIES, idle_timeout: float = 60.0):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.idle_timeout = idle_timeout
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    async def call(self, chat_id: Any, method: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """Queue ``method(*args, **kwargs)`` for ``chat_id`` and wait until it is delivered.
+
+        Raises:
+            Exception: Whatever the Bot API call finally raised, including ``TelegramRetryAfter``
+                once ``max_retries`` is exhausted.
+        """
+        key = str(chat_id)
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(key, asyncio.Queue())
+        queue.put_nowait((method, args, kwargs, future))
+        TELEGRAM_QUEUE_DEPTH.set(self.queue_depth)
+        worker = self._workers.get(key)
+        if worker is None or worker.done():
+            self._workers[key] = asyncio.create_task(self._worker(key, queue))
+        method_name = getattr(method, "__name__", "call")
+        started = time.perf_counter()
+        try:
+            result = await future
+        except Exception:
+            TELEGRAM_SEND_SECONDS.labels(method_name, "error").observe(time.perf_counter() - started)
+            raise
+        TELEGRAM_SEND_SECONDS.labels(method_name, "ok").observe(time.perf_counter() - started)
+        return result
+
+    async def _worker(self, key: str, queue: asyncio.Queue) -> None:
+        bucket = self._chat_buckets.setdefault(key, TokenBucket(self.chat_rate, self.chat_burst))
+        while True:
+            try:
+                method, args, kwargs, future = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                if queue.empty():
+                    self._workers.pop(key, None)
+                    self._queues.pop(key, None)
+                    return
+                continue
+            TELEGRAM_QUEUE_DEPTH.set(self.queue_depth)
+            if future.cancelled():
+                continue
+            for attempt in range(self.max_retries + 1):
+                await bucket.acquire()
+                await self.global_bucket.acquire()
+                try:
+                    result = await method(*args, **kwargs)
+                except TelegramRetryAfter as e:
+                    logger.warning("Telegram flood control for chat %s: retry after %ss", key, e.retry_after)
+                    bucket.pause(e.retry_after)
+                    if attempt == self.max_retries and not future.done():
+                        future.set_exception(e)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    break
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                    break
+
+    async def close(self) -> None:
+        """Stop all chat workers; undelivered calls are cancelled."""
+        for worker in self._workers.values():
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        for queue in self._queues.values():
+            while not queue.empty():
+                _, _, _, future = queue.get_nowait()
+                future.cancel()
+        self._queues.clear()
+        TELEGRAM_QUEUE_DEPTH.set(0)
@@ -1,59 +1,150 @@
 import asyncio
+import time
 from aiogram import Bot
+from typing import Awaitable, Callable, Optional
+from src.api.base_client import count_requests
 from src.api.services import OrderService
+from src.bot.leader import LeaderElector
+from src.bot.scheduler import AdaptiveSchedule, PollScheduler, RequestBudget, parse_cutoffs
 from src.utils.logging import logger
+from src.utils.metrics import CYCLE_SECONDS
 from src.config.settings import settings
 import pytz
 from datetime import datetime, timedelta
 
-async def periodic_check(bot: Bot, order_service: OrderService) -> None:
-    """Periodically check for new orders.
+async def periodic_check(bot: Bot, order_service: OrderService, elector: Optional[LeaderElector] = None,
+                         scheduler: Optional[PollScheduler] = None) -> None:
+    """Periodically check for new orders, polling each platform on its own adaptive schedule.
 
     Args:
         bot (Bot): Telegram bot instance.
         order_service (OrderService): Order service instance.
+        elector (LeaderElector): If given, checks run only while this replica is the leader.
+        scheduler (PollScheduler): Registry exposing when each platform is polled next.
     """
+    scheduler = scheduler or PollScheduler()
+    await asyncio.gather(*(
+        _poll_platform(
+            "new orders", order_service.check_new_orders, bot, order_service, platform, elector,
+            scheduler.get(
+                f"{order_service.tenant.namespace}new_orders_{platform}", min_interval=settings.POLL_MIN_INTERVAL,
+                max_interval=settings.POLL_MAX_INTERVAL, budget=_platform_budget(scheduler, order_service, platform),
+                cutoffs=parse_cutoffs(settings.SHIPMENT_CUTOFFS)
+            )
+        )
+        for platform in order_service.clients
+    ))
+
+async def periodic_overdue_check(bot: Bot, order_service: OrderService, elector: Optional[LeaderElector] = None,
+                                 scheduler: Optional[PollScheduler] = None) -> None:
+    """Periodically check for overdue orders, polling each platform on its own adaptive schedule.
+
+    Args:
+        bot (Bot): Telegram bot instance.
+        order_service (OrderService): Order service instance.
+        elector (LeaderElector): If given, checks run only while this replica is the leader.
+        scheduler (PollScheduler): Registry exposing when each platform is checked next.
+    """
+    scheduler = scheduler or PollScheduler()
+    await asyncio.gather(*(
+        _poll_platform(
+            "overdue orders", order_service.check_overdue_orders, bot, order_service, platform, elector,
+            scheduler.get(
+                f"{order_service.tenant.namespace}overdue_orders_{platform}", min_interval=settings.OVERDUE_MIN_INTERVAL,
+                max_interval=settings.OVERDUE_MAX_INTERVAL, budget=_platform_budget(scheduler, order_service, platform),
+                cutoffs=parse_cutoffs(settings.SHIPMENT_CUTOFFS)
+            )
+        )
+        for platform in order_service.clients
+    ))
+
+async def order_event_consumer(bot: Bot, order_service: OrderService) -> None:
+    """Notify about orders published to the order event stream; runs on every replica.
+
+    Args:
+        bot (Bot): Telegram bot instance.
+        order_service (OrderService): Order service instance.
+    """
+    while not order_service.db.ensure_order_consumer_group():
+        await asyncio.sleep(settings.ORDER_STREAM_POLL_INTERVAL)
     while True:
         try:
-            logger.info("Starting new orders check...")
-            await order_service.check_new_orders(bot, settings.CHAT_ID)
-            logger.info("New orders check completed successfully")
+            handled = await order_service.consume_order_events(bot, order_service.tenant.chat_id)
         except Exception as e:
-            logger.error(f"Error in periodic check: {str(e)}")
-        await asyncio.sleep(300)
+            logger.error("Error consuming order events: %s", e)
+            handled = 0
+        if not handled:
+            await asyncio.sleep(settings.ORDER_STREAM_POLL_INTERVAL)
 
-async def periodic_overdue_check(bot: Bot, order_service: OrderService) -> None:
-    """Periodically check for overdue orders.
+async def carriage_flush(bot: Bot, order_service: OrderService, elector: Optional[LeaderElector] = None) -> None:
+    """Turn Ozon carriage batches into carriages once they have been open for CARRIAGE_BATCH_WINDOW.
 
     Args:
         bot (Bot): Telegram bot instance.
         order_service (OrderService): Order service instance.
+        elector (LeaderElector): If given, batches are flushed only by the leader replica.
     """
+    client = order_service.clients.get("ozon")
+    if client is None or not order_service.carriages.window:
+        return
     while True:
+        if elector:
+            await elector.wait_until_leader()
         try:
-            logger.info("Starting overdue orders check...")
-            await order_service.check_overdue_orders(bot, settings.CHAT_ID)
-            logger.info("Overdue orders check completed successfully")
+            groups = order_service.carriages.due_groups()
+            if groups:
+                logger.info("[ozon] Flushing %s carriage batches", len(groups))
+                await order_service.carriages.flush(bot, order_service.tenant.chat_id, client, groups)
         except Exception as e:
-            logger.error(f"Error in overdue check: {str(e)}")
-        await asyncio.sleep(3600)
+            logger.error("[ozon] Error flushing carriage batches: %s", e)
+        await asyncio.sleep(min(60.0, order_service.carriages.window))
+
+def _platform_budget(scheduler: PollScheduler, order_service: OrderService, platform: str) -> RequestBudget:
+    """Request budget shared by the new-orders and overdue checks of one platform of a tenant."""
+    return scheduler.budget(f"{order_service.tenant.namespace}{platform}", order_service.tenant.requests_per_hour(platform))
 
-async def daily_plan(bot: Bot, order_service: OrderService) -> None:
+async def _poll_platform(job: str, check: Callable[..., Awaitable[int]], bot: Bot, order_service: OrderService,
+                         platform: str, elector: Optional[LeaderElector], schedule: AdaptiveSchedule) -> None:
+    """Run ``check`` for one platform forever, sleeping as long as its schedule says."""
+    while True:
+        if elector:
+            await elector.wait_until_leader()
+        found = 0
+        started = time.perf_counter()
+        with count_requests() as requests:
+            try:
+                logger.info("[%s] Starting %s check...", platform, job)
+                found = await check(bot, order_service.tenant.chat_id, platforms=[platform])
+                logger.info("[%s] %s check completed successfully", platform, job.capitalize())
+            except Exception as e:
+                logger.error("[%s] Error in %s check: %s", platform, job, e)
+        CYCLE_SECONDS.labels(job.replace(" ", "_"), platform).observe(time.perf_counter() - started)
+        schedule.record(found, requests[0])
+        delay = schedule.next_delay()
+        logger.debug("[%s] Next %s check in %.0fs at %s", platform, job, delay, schedule.next_run_at.isoformat())
+        await asyncio.sleep(delay)
+
+async def daily_plan(bot: Bot, order_service: OrderService, elector: Optional[LeaderElector] = None) -> None:
     """Send daily plan at 8 AM UTC+5.
 
     Args:
         bot (Bot): Telegram bot instance.
         order_service (OrderService): Order service instance.
+        elector (LeaderElector): If given, only the leader replica sends the plan.
     """
-    tz = pytz.timezone('Asia/Yekaterinburg')  # UTC+5 соответствует Екатеринбургу
+    tz = pytz.timezone(settings.TIMEZONE)  # По умолчанию UTC+5 (Екатеринбург)
     while True:
         try:
             now = datetime.now(tz)
             # Проверяем, 8 утра ли сейчас (с погрешностью в минуту для точности)
             target_time = now.replace(hour=8, minute=0, second=0, microsecond=0)
             if now.hour == 8 and now.minute == 0:
-                logger.info("Generating daily plan...")
-                await send_daily_plan(bot, order_service, settings.CHAT_ID)
+                if elector and not elector.is_leader:
+                    logger.info("Daily plan is sent by the leader replica, skipping")
+                else:
+                    logger.info("Generating daily plan...")
+                    with CYCLE_SECONDS.labels("daily_plan", "all").time():
+                        await send_daily_plan(bot, order_service, order_service.tenant.chat_id)
                 # Ждем сутки перед следующей проверкой
                 await asyncio.sleep(24 * 3600)
             else:
@@ -62,10 +153,10 @@ async def daily_plan(bot: Bot, order_service: OrderService) -> None:
                     next_day = now + timedelta(days=1)
                     target_time = next_day.replace(hour=8, minute=0, second=0, microsecond=0)
                 seconds_until_target = (target_time - now).total_seconds()
-                logger.debug(f"Waiting {seconds_until_target} seconds until 8 AM UTC+5")
+                logger.debug("Waiting %s seconds until 8 AM UTC+5", seconds_until_target)
                 await asyncio.sleep(seconds_until_target)
         except Exception as e:
-            logger.error(f"Error in daily plan task: {str(e)}")
+            logger.error("Error in daily plan task: %s", e)
             await asyncio.sleep(60)  # Ждем минуту перед повторной попыткой в случае ошибки
 
 async def send_daily_plan(bot: Bot, order_service: OrderService, chat_id: str) -> None:
@@ -77,33 +168,36 @@ async def send_daily_plan(bot: Bot, order_service: OrderService, chat_id: str) -
         try:
             status = "PROCESSING" if platform == "yandex" else "awaiting_deliver"
             substatus = "READY_TO_SHIP" if platform == "yandex" else None
-            orders = client.get_orders(status, substatus)
-            parser = order_service.get_parser(platform)
+            platform_lines = []
+
+            # Снимок проверки просрочек берём, только если он моложе ORDER_SNAPSHOT_TTL:
+            # иначе в план попадут уже отгруженные или отменённые заказы
+            orders = await order_service.snapshots.get(platform, client, status, substatus, summary=True)
+            for order in orders:
+                order_id = order.id
+
+                if platform == "yandex":
+                    pvz_address = await client.get_pickup_point_address(order_id)
+                    platform_lines.append(
+                        f"  • {order_service._translate('bring_to_pvz_order')} #{order_id} "
+                        f"{order_service._translate('to_address')}: {pvz_address}"
+                    )
+                elif platform == "ozon":
+                    platform_lines.append(
+                        f"  • {order_service._translate('give_to_courier')} #{order_id}"
+                    )
 
-            if orders:
+            if platform_lines:
                 has_tasks = True
                 message_lines.append(f"\n*{platform.capitalize()} {order_service._translate('orders')}:*")
-                for order_data in orders:
-                    order = parser.parse(order_data)
-                    order_id = order.id
-                    
-                    if platform == "yandex":
-                        pvz_address = client.get_pickup_point_address(order_id)
-                        message_lines.append(
-                            f"  • {order_service._translate('bring_to_pvz_order')} #{order_id} "
-                            f"{order_service._translate('to_address')}: {pvz_address}"
-                        )
-                    elif platform == "ozon":
-                        message_lines.append(
-                            f"  • {order_service._translate('give_to_courier')} #{order_id}"
-                        )
+                message_lines.extend(platform_lines)
         except Exception as e:
-            logger.error(f"[{platform}] Error fetching orders for daily plan: {str(e)}")
+            logger.error("[%s] Error fetching orders for daily plan: %s", platform, e)
             message_lines.append(f"\n⚠️ {order_service._translate('fetch_orders_error')} {platform}: {str(e)}")
 
     if not has_tasks:
         message_lines.append(f"\n📌 {order_service._translate('no_tasks_today')}")
 
     message = "\n".join(message_lines)
-    await bot.send_message(chat_id, message, parse_mode="Markdown", disable_notification=False)
+    await order_service.sender.call(chat_id, bot.send_message, chat_id, message, parse_mode="Markdown", disable_notification=False)
     logger.info("Daily plan sent successfully")
\ No newline at end of file
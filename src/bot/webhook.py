@@ -0,0 +1,50 @@
+# src/bot/webhook.py
+import asyncio
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from src.config.settings import settings
+from src.utils.logging import logger
+
+async def healthz(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, path: str = settings.WEBHOOK_PATH,
+                      secret: str = settings.WEBHOOK_SECRET) -> web.Application:
+    """aiohttp application feeding Telegram updates posted to ``path`` into the Dispatcher.
+
+    Requests without the ``X-Telegram-Bot-Api-Secret-Token`` header matching ``secret`` are
+    rejected with 401. Updates are acknowledged at once and handled in the background, so
+    replicas behind a load balancer never keep Telegram waiting. ``/healthz`` is for the balancer.
+    """
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret).register(app, path=path)
+    app.router.add_get("/healthz", healthz)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Register the webhook with Telegram and serve updates until cancelled.
+
+    Every replica sets the same URL and secret, which is idempotent; the webhook is not
+    deleted on shutdown because other replicas keep serving it.
+    """
+    url = f"{settings.WEBHOOK_URL.rstrip('/')}{settings.WEBHOOK_PATH}"
+    await bot.set_webhook(url, secret_token=settings.WEBHOOK_SECRET, allowed_updates=dp.resolve_used_update_types())
+    runner = web.AppRunner(build_webhook_app(dp, bot), access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT).start()
+        logger.info("Serving Telegram webhook on %s:%s%s", settings.WEBHOOK_HOST, settings.WEBHOOK_PORT, settings.WEBHOOK_PATH)
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+async def run_updates(dp: Dispatcher, bot: Bot) -> None:
+    """Receive Telegram updates the way BOT_MODE says."""
+    if settings.BOT_MODE == "webhook":
+        await run_webhook(dp, bot)
+    else:
+        # Long polling не работает, пока у бота зарегистрирован вебхук
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
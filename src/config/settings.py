@@ -1,6 +1,8 @@
 # src/config/settings.py
 from dotenv import load_dotenv
 import os
+import re
+import socket
 
 load_dotenv()
 
@@ -13,9 +15,94 @@ class Settings:
     REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
     PROMETHEUS_PORT: int = int(os.getenv("PROMETHEUS_PORT", 8000))
     LOCALE: str = os.getenv("LOCALE", "ru")
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "color").lower()  # color - цветной текст, json - JSON построчно
+    # JSON-реестр магазинов (арендаторов); если не задан, работает один магазин из переменных окружения
+    TENANTS_FILE: str = os.getenv("TENANTS_FILE", "")
 
     GIFT_THRESHOLD: float = float(os.getenv("GIFT_THRESHOLD", 300.0))  # Порог для подарка
 
+    # HTTP-клиенты маркетплейсов (общий пул keep-alive соединений на маркетплейс)
+    HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", 20))
+    HTTP_KEEPALIVE_TIMEOUT: float = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 30.0))
+    HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", 30.0))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10.0))
+    # Сколько запросов одного магазина к маркетплейсу выполняются одновременно в общем пуле
+    TENANT_HTTP_CONCURRENCY: int = int(os.getenv("TENANT_HTTP_CONCURRENCY", 8))
+    # Сколько заказов одной платформы подготавливаются (SKU, этикетки) одновременно
+    NOTIFY_CONCURRENCY: int = int(os.getenv("NOTIFY_CONCURRENCY", 8))
+    # Размер страницы при выгрузке списка заказов: Яндекс допускает не больше 50, Ozon - до 1000
+    YANDEX_ORDERS_PAGE_SIZE: int = int(os.getenv("YANDEX_ORDERS_PAGE_SIZE", os.getenv("ORDERS_PAGE_SIZE", 50)))
+    OZON_ORDERS_PAGE_SIZE: int = int(os.getenv("OZON_ORDERS_PAGE_SIZE", 100))
+    # Инкрементальная синхронизация: запрашиваем только заказы, изменившиеся после отметки
+    DELTA_SYNC_ENABLED: bool = os.getenv("DELTA_SYNC_ENABLED", "true").lower() == "true"
+    FULL_SYNC_INTERVAL: int = int(os.getenv("FULL_SYNC_INTERVAL", 3600))  # Полная сверка, секунды
+    SYNC_OVERLAP: int = int(os.getenv("SYNC_OVERLAP", 120))  # Запас на рассинхрон часов, секунды
+    # Сколько дней хранить ID уже отправленных уведомлений
+    DEDUP_RETENTION_DAYS: int = int(os.getenv("DEDUP_RETENTION_DAYS", 30))
+    # Идентификатор реплики и срок аренды заказа, захваченного для уведомления
+    INSTANCE_ID: str = os.getenv("INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+    CLAIM_LEASE_SECONDS: float = float(os.getenv("CLAIM_LEASE_SECONDS", 180.0))
+    # Кэш соответствий SKU магазина -> marketSku/modelId (локальный LRU + общий хэш в Redis)
+    SKU_CACHE_TTL: int = int(os.getenv("SKU_CACHE_TTL", 86400))
+    SKU_CACHE_MAXSIZE: int = int(os.getenv("SKU_CACHE_MAXSIZE", 10000))
+    OFFER_MAPPINGS_BATCH_SIZE: int = int(os.getenv("OFFER_MAPPINGS_BATCH_SIZE", 200))  # Лимит API Яндекса
+    # Ограничения исходящих запросов к Telegram (сообщений в секунду)
+    TELEGRAM_GLOBAL_RATE: float = float(os.getenv("TELEGRAM_GLOBAL_RATE", 25.0))
+    TELEGRAM_CHAT_RATE: float = float(os.getenv("TELEGRAM_CHAT_RATE", 1.0))
+    TELEGRAM_CHAT_BURST: float = float(os.getenv("TELEGRAM_CHAT_BURST", 5.0))
+    TELEGRAM_MAX_RETRIES: int = int(os.getenv("TELEGRAM_MAX_RETRIES", 5))
+    # Дисковый кэш PDF-этикеток заказов
+    LABEL_CACHE_DIR: str = os.getenv("LABEL_CACHE_DIR", "labels")
+    LABEL_CACHE_MAX_BYTES: int = int(os.getenv("LABEL_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+    # Индекс отгрузок первой мили Яндекса (orderId -> адрес ПВЗ)
+    SHIPMENTS_INDEX_TTL: int = int(os.getenv("SHIPMENTS_INDEX_TTL", 300))
+    SHIPMENTS_INDEX_MIN_REFRESH: int = int(os.getenv("SHIPMENTS_INDEX_MIN_REFRESH", 30))
+    # Сколько секунд снимок списка заказов по статусу отдаётся задачам без повторной загрузки
+    ORDER_SNAPSHOT_TTL: float = float(os.getenv("ORDER_SNAPSHOT_TTL", 120))
+    # Очередь событий о заказах в Redis Streams между поиском заказов и отправкой уведомлений
+    ORDER_STREAM_ENABLED: bool = os.getenv("ORDER_STREAM_ENABLED", "false").lower() == "true"
+    ORDER_STREAM_MAXLEN: int = int(os.getenv("ORDER_STREAM_MAXLEN", 100000))
+    ORDER_STREAM_BATCH: int = int(os.getenv("ORDER_STREAM_BATCH", 20))
+    ORDER_STREAM_CLAIM_IDLE: float = float(os.getenv("ORDER_STREAM_CLAIM_IDLE", 120))  # Секунды до перехвата события
+    ORDER_STREAM_MAX_DELIVERIES: int = int(os.getenv("ORDER_STREAM_MAX_DELIVERIES", 5))
+    ORDER_STREAM_POLL_INTERVAL: float = float(os.getenv("ORDER_STREAM_POLL_INTERVAL", 1.0))
+    # Фоновая обработка нажатий кнопок
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", 4))
+    # Отгрузки Ozon: заказы копятся и оформляются одной отгрузкой на способ доставки и день
+    CARRIAGE_BATCH_WINDOW: float = float(os.getenv("CARRIAGE_BATCH_WINDOW", 1800))  # 0 - только по /close_shipment
+    # Неудачная отгрузка повторяется через CARRIAGE_RETRY_DELAY, 2x, 4x... секунд, после
+    # CARRIAGE_MAX_ATTEMPTS попыток пачка откладывается для ручного разбора
+    CARRIAGE_RETRY_DELAY: float = float(os.getenv("CARRIAGE_RETRY_DELAY", 300))
+    CARRIAGE_MAX_ATTEMPTS: int = int(os.getenv("CARRIAGE_MAX_ATTEMPTS", 5))
+    # Адаптивный опрос: чаще при потоке заказов и перед отсечками отгрузки, реже в тишине
+    TIMEZONE: str = os.getenv("TIMEZONE", "Asia/Yekaterinburg")
+    POLL_MIN_INTERVAL: float = float(os.getenv("POLL_MIN_INTERVAL", 60))
+    POLL_MAX_INTERVAL: float = float(os.getenv("POLL_MAX_INTERVAL", 300))
+    OVERDUE_MIN_INTERVAL: float = float(os.getenv("OVERDUE_MIN_INTERVAL", 900))
+    OVERDUE_MAX_INTERVAL: float = float(os.getenv("OVERDUE_MAX_INTERVAL", 3600))
+    POLL_BACKOFF: float = float(os.getenv("POLL_BACKOFF", 1.5))
+    POLL_JITTER: float = float(os.getenv("POLL_JITTER", 0.1))
+    SHIPMENT_CUTOFFS: str = os.getenv("SHIPMENT_CUTOFFS", "")  # Например "10:00,14:00"
+    CUTOFF_WINDOW_MINUTES: float = float(os.getenv("CUTOFF_WINDOW_MINUTES", 60))
+    # Доля бюджета, оставляемая запросам вне опроса (кнопки, план на день, /ready_all, отгрузки)
+    API_QUOTA_RESERVE: float = float(os.getenv("API_QUOTA_RESERVE", 0.2))
+    # Бюджет запросов к API в час на платформу (0 - без ограничения)
+    YANDEX_REQUESTS_PER_HOUR: float = float(os.getenv("YANDEX_REQUESTS_PER_HOUR", 0))
+    OZON_REQUESTS_PER_HOUR: float = float(os.getenv("OZON_REQUESTS_PER_HOUR", 0))
+    # Выбор лидера: только лидер опрашивает маркетплейсы и шлёт ежедневный план
+    LEADER_LEASE_SECONDS: float = float(os.getenv("LEADER_LEASE_SECONDS", 15.0))
+    LEADER_HEARTBEAT_SECONDS: float = float(os.getenv("LEADER_HEARTBEAT_SECONDS", 5.0))
+    # Роль процесса: all - всё сразу, poller - опрос маркетплейсов и уведомления, bot - обработка апдейтов Telegram
+    ROLE: str = os.getenv("ROLE", "all").lower()
+    # Получение апдейтов Telegram: polling (long polling) или webhook
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling").lower()
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")  # Публичный адрес балансировщика, например https://bot.example.com
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")  # Telegram присылает его в X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", 8080))
+
 
     # Yandex Market settings
     YANDEX_API_TOKEN: str = os.getenv("YANDEX_API_TOKEN")
@@ -45,15 +132,78 @@ class Settings:
 
     def validate(self) -> None:
         """Validate that all required environment variables are set."""
-        required_general = {
-            "TELEGRAM_TOKEN": self.TELEGRAM_TOKEN,
-            "CHAT_ID": self.CHAT_ID
-        }
+        required_general = {"TELEGRAM_TOKEN": self.TELEGRAM_TOKEN}
+        if not self.TENANTS_FILE:
+            required_general["CHAT_ID"] = self.CHAT_ID
         for name, value in required_general.items():
             if not value:
                 raise ValueError(f"Environment variable {name} is not set!")
+        if self.LOG_FORMAT not in ("color", "json"):
+            raise ValueError("LOG_FORMAT must be color or json!")
+        if self.ROLE not in ("all", "poller", "bot"):
+            raise ValueError("ROLE must be one of: all, poller, bot!")
+        if self.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError("BOT_MODE must be polling or webhook!")
+        if self.BOT_MODE == "webhook" and self.ROLE != "poller":
+            if not self.WEBHOOK_URL:
+                raise ValueError("Environment variable WEBHOOK_URL is not set!")
+            if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", self.WEBHOOK_SECRET):
+                raise ValueError("WEBHOOK_SECRET must be 1-256 characters A-Z, a-z, 0-9, _ or -!")
+            if not self.WEBHOOK_PATH.startswith("/"):
+                raise ValueError("WEBHOOK_PATH must start with /!")
         if self.GIFT_THRESHOLD < 0:
             raise ValueError("GIFT_THRESHOLD must be non-negative!")
+        if self.HTTP_POOL_SIZE <= 0:
+            raise ValueError("HTTP_POOL_SIZE must be positive!")
+        if self.TENANT_HTTP_CONCURRENCY <= 0:
+            raise ValueError("TENANT_HTTP_CONCURRENCY must be positive!")
+        if self.HTTP_TIMEOUT <= 0 or self.HTTP_CONNECT_TIMEOUT <= 0:
+            raise ValueError("HTTP_TIMEOUT and HTTP_CONNECT_TIMEOUT must be positive!")
+        if self.NOTIFY_CONCURRENCY <= 0:
+            raise ValueError("NOTIFY_CONCURRENCY must be positive!")
+        if not 0 < self.YANDEX_ORDERS_PAGE_SIZE <= 50:
+            raise ValueError("YANDEX_ORDERS_PAGE_SIZE must be between 1 and 50!")
+        if not 0 < self.OZON_ORDERS_PAGE_SIZE <= 1000:
+            raise ValueError("OZON_ORDERS_PAGE_SIZE must be between 1 and 1000!")
+        if self.FULL_SYNC_INTERVAL <= 0 or self.SYNC_OVERLAP < 0:
+            raise ValueError("FULL_SYNC_INTERVAL must be positive and SYNC_OVERLAP non-negative!")
+        if self.DEDUP_RETENTION_DAYS <= 0:
+            raise ValueError("DEDUP_RETENTION_DAYS must be positive!")
+        if self.CLAIM_LEASE_SECONDS <= 0:
+            raise ValueError("CLAIM_LEASE_SECONDS must be positive!")
+        if self.SKU_CACHE_TTL <= 0 or self.SKU_CACHE_MAXSIZE <= 0 or self.OFFER_MAPPINGS_BATCH_SIZE <= 0:
+            raise ValueError("SKU_CACHE_TTL, SKU_CACHE_MAXSIZE and OFFER_MAPPINGS_BATCH_SIZE must be positive!")
+        if self.TELEGRAM_GLOBAL_RATE <= 0 or self.TELEGRAM_CHAT_RATE <= 0 or self.TELEGRAM_CHAT_BURST < 1:
+            raise ValueError("TELEGRAM_GLOBAL_RATE and TELEGRAM_CHAT_RATE must be positive, TELEGRAM_CHAT_BURST at least 1!")
+        if self.LABEL_CACHE_MAX_BYTES <= 0:
+            raise ValueError("LABEL_CACHE_MAX_BYTES must be positive!")
+        if self.SHIPMENTS_INDEX_MIN_REFRESH < 0 or self.SHIPMENTS_INDEX_TTL < self.SHIPMENTS_INDEX_MIN_REFRESH:
+            raise ValueError("SHIPMENTS_INDEX_TTL must not be shorter than SHIPMENTS_INDEX_MIN_REFRESH!")
+        if min(self.ORDER_STREAM_MAXLEN, self.ORDER_STREAM_BATCH, self.ORDER_STREAM_MAX_DELIVERIES) <= 0:
+            raise ValueError("ORDER_STREAM_MAXLEN, ORDER_STREAM_BATCH and ORDER_STREAM_MAX_DELIVERIES must be positive!")
+        if self.ORDER_STREAM_CLAIM_IDLE <= 0 or self.ORDER_STREAM_POLL_INTERVAL <= 0:
+            raise ValueError("ORDER_STREAM_CLAIM_IDLE and ORDER_STREAM_POLL_INTERVAL must be positive!")
+        if self.JOB_WORKERS <= 0:
+            raise ValueError("JOB_WORKERS must be positive!")
+        if self.CARRIAGE_BATCH_WINDOW < 0:
+            raise ValueError("CARRIAGE_BATCH_WINDOW must not be negative!")
+        if self.CARRIAGE_RETRY_DELAY <= 0 or self.CARRIAGE_MAX_ATTEMPTS <= 0:
+            raise ValueError("CARRIAGE_RETRY_DELAY and CARRIAGE_MAX_ATTEMPTS must be positive!")
+        if self.ORDER_SNAPSHOT_TTL < 0:
+            raise ValueError("ORDER_SNAPSHOT_TTL must not be negative!")
+        if not 0 < self.POLL_MIN_INTERVAL <= self.POLL_MAX_INTERVAL:
+            raise ValueError("POLL_MIN_INTERVAL must be positive and not greater than POLL_MAX_INTERVAL!")
+        if not 0 < self.OVERDUE_MIN_INTERVAL <= self.OVERDUE_MAX_INTERVAL:
+            raise ValueError("OVERDUE_MIN_INTERVAL must be positive and not greater than OVERDUE_MAX_INTERVAL!")
+        if not 0 <= self.API_QUOTA_RESERVE < 1:
+            raise ValueError("API_QUOTA_RESERVE must be in [0, 1)!")
+        for cutoff in filter(None, (item.strip() for item in self.SHIPMENT_CUTOFFS.split(","))):
+            if not re.fullmatch(r"([01]?\d|2[0-3]):[0-5]\d", cutoff):
+                raise ValueError("SHIPMENT_CUTOFFS must be a comma-separated list of HH:MM times!")
+        if self.POLL_BACKOFF < 1 or not 0 <= self.POLL_JITTER < 1:
+            raise ValueError("POLL_BACKOFF must be at least 1 and POLL_JITTER in [0, 1)!")
+        if not 0 < self.LEADER_HEARTBEAT_SECONDS < self.LEADER_LEASE_SECONDS:
+            raise ValueError("LEADER_HEARTBEAT_SECONDS must be positive and shorter than LEADER_LEASE_SECONDS!")
         if self.YANDEX_ENABLED:
             required_yandex = {
                 "YANDEX_API_TOKEN": self.YANDEX_API_TOKEN,
@@ -0,0 +1,83 @@
+# src/config/tenants.py
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from src.config.settings import settings
+
+DEFAULT_TENANT_ID = "default"
+_TENANT_ID_RE = re.compile(r"^[A-Za-z0-9-]{1,20}$")  # Попадает в callback_data, поэтому без "_" и коротко
+
+@dataclass
+class YandexAccount:
+    """Yandex Market campaign served for a tenant."""
+    api_token: str
+    campaign_id: str
+    business_id: str
+    requests_per_hour: float = settings.YANDEX_REQUESTS_PER_HOUR
+
+@dataclass
+class OzonAccount:
+    """Ozon seller account served for a tenant."""
+    api_key: str
+    client_id: str
+    requests_per_hour: float = settings.OZON_REQUESTS_PER_HOUR
+
+@dataclass
+class Tenant:
+    """One store: its marketplace accounts and the Telegram chat its notifications go to.
+
+    Redis keys of a tenant are prefixed with ``{id}:``; the default tenant built from the
+    environment keeps the unprefixed keys of single-store deployments.
+    """
+    id: str
+    chat_id: str
+    yandex: Optional[YandexAccount] = None
+    ozon: Optional[OzonAccount] = None
+    platforms: List[str] = field(init=False)
+
+    def __post_init__(self):
+        self.platforms = [name for name in ("yandex", "ozon") if getattr(self, name) is not None]
+
+    @property
+    def namespace(self) -> str:
+        return "" if self.id == DEFAULT_TENANT_ID else f"{self.id}:"
+
+    def requests_per_hour(self, platform: str) -> float:
+        account = getattr(self, platform, None)
+        return account.requests_per_hour if account is not None else 0.0
+
+def default_tenant() -> Tenant:
+    """The single store configured through environment variables."""
+    yandex = YandexAccount(
+        settings.YANDEX_API_TOKEN, settings.YANDEX_CAMPAIGN_ID, settings.YANDEX_BUSINESS_ID
+    ) if settings.YANDEX_ENABLED else None
+    ozon = OzonAccount(settings.OZON_API_KEY, settings.OZON_CLIENT_ID) if settings.OZON_ENABLED else None
+    return Tenant(DEFAULT_TENANT_ID, settings.CHAT_ID, yandex, ozon)
+
+def parse_tenants(data: List[Dict]) -> List[Tenant]:
+    """Build tenants from their JSON description, validating IDs and chats."""
+    tenants = []
+    for entry in data:
+        tenant_id = str(entry.get("id", ""))
+        if not _TENANT_ID_RE.match(tenant_id):
+            raise ValueError(f"Invalid tenant id {tenant_id!r}: use up to 20 letters, digits or '-'")
+        if tenant_id == DEFAULT_TENANT_ID:
+            # Магазин по умолчанию работает с ключами Redis без префикса и кнопками без магазина
+            raise ValueError(f"Tenant id {DEFAULT_TENANT_ID!r} is reserved!")
+        if not entry.get("chat_id"):
+            raise ValueError(f"Tenant {tenant_id} has no chat_id!")
+        yandex = YandexAccount(**entry["yandex"]) if entry.get("yandex") else None
+        ozon = OzonAccount(**entry["ozon"]) if entry.get("ozon") else None
+        tenants.append(Tenant(tenant_id, str(entry["chat_id"]), yandex, ozon))
+    ids = [tenant.id for tenant in tenants]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Tenant ids must be unique!")
+    return tenants
+
+def load_tenants(path: str = settings.TENANTS_FILE) -> List[Tenant]:
+    """Load the tenant registry from ``TENANTS_FILE``, or the default tenant if it is not set."""
+    if not path:
+        return [default_tenant()]
+    with open(path, encoding="utf-8") as file:
+        return parse_tenants(json.load(file))
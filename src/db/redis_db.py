@@ -1,41 +1,482 @@
 # src/db/redis_db.py
+import copy
+import json
+import time
 import redis
-from typing import List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from src.config.settings import settings
 from src.utils.logging import logger
 
+# Удаляет ключ, только если он всё ещё принадлежит владельцу (не перехвачен после истечения аренды)
+_RELEASE_IF_OWNER = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Продлевает ключ, только если он всё ещё принадлежит владельцу
+_RENEW_IF_OWNER = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Захватывает свободную аренду или продлевает собственную
+_ACQUIRE_OR_RENEW = """
+local current = redis.call('get', KEYS[1])
+if current == false then
+    redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+if current == ARGV[1] then
+    redis.call('pexpire', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+ORDER_EVENTS_STREAM = "order_events"
+ORDER_EVENTS_DEAD_STREAM = "order_events_dead"
+ORDER_CONSUMER_GROUP = "notifiers"
+
+StreamEntry = Tuple[str, Dict[str, str]]
+
 class RedisDB:
-    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0):
-        self.client = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+    """Redis storage for notification bookkeeping.
+
+    Notified order IDs are kept in sorted sets scored by the time they were saved, so every
+    lookup is a single batched round trip and entries older than the retention period are pruned.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, client: Optional[redis.Redis] = None,
+                 namespace: str = ""):
+        # Готовый клиент (например, fakeredis в бенчмарках) должен быть создан с decode_responses=True
+        self.client = client or redis.Redis(host=host, port=port, db=db, decode_responses=True)
+        self.namespace = namespace  # Префикс ключей магазина; аренды лидера общие для всех магазинов
+        self._migrated_keys: Set[str] = set()
+        self._release_if_owner = self.client.register_script(_RELEASE_IF_OWNER)
+        self._renew_if_owner = self.client.register_script(_RENEW_IF_OWNER)
+        self._acquire_or_renew = self.client.register_script(_ACQUIRE_OR_RENEW)
+
+    def for_tenant(self, namespace: str) -> "RedisDB":
+        """Return a view whose keys are prefixed with ``namespace``, sharing this connection pool."""
+        view = copy.copy(self)
+        view.namespace = namespace
+        view._migrated_keys = set()
+        return view
 
-    def load_sent_orders(self, platform: str) -> List[str]:
-        key = f"sent_orders_{platform}"
+    def _migrate_legacy_set(self, key: str) -> None:
+        """Convert a pre-retention plain set into a sorted set scored with the current time."""
+        if key in self._migrated_keys:
+            return
+        if self.client.type(key) == "set":
+            members = self.client.smembers(key)
+            now = time.time()
+            pipe = self.client.pipeline()
+            pipe.delete(key)
+            if members:
+                pipe.zadd(key, {member: now for member in members})
+            pipe.execute()
+            logger.info("Migrated %s entries of %s to a sorted set", len(members), key)
+        self._migrated_keys.add(key)
+
+    def _filter_unseen(self, key: str, ids: List[str]) -> List[str]:
+        """Return the IDs that are not in the sorted set, in a single ZMSCORE round trip."""
+        if not ids:
+            return []
+        self._migrate_legacy_set(key)
+        scores = self.client.zmscore(key, ids)
+        return [item_id for item_id, score in zip(ids, scores) if score is None]
+
+    def _mark_seen(self, key: str, ids: Iterable[str]) -> None:
+        """Add IDs to the sorted set and prune entries older than the retention period."""
+        ids = list(ids)
+        if not ids:
+            return
+        self._migrate_legacy_set(key)
+        now = time.time()
+        retention = settings.DEDUP_RETENTION_DAYS * 86400
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zadd(key, {item_id: now for item_id in ids})
+        pipe.zremrangebyscore(key, "-inf", now - retention)
+        pipe.expire(key, int(retention))
+        pipe.execute()
+
+    def filter_unsent_orders(self, order_ids: List[str], platform: str) -> List[str]:
+        """Return the order IDs that have not been notified yet (all of them if Redis fails)."""
+        key = f"{self.namespace}sent_orders_{platform}"
         try:
-            return list(self.client.smembers(key))
+            return self._filter_unseen(key, order_ids)
         except redis.RedisError as e:
-            logger.error(f"[{platform}] Error loading sent orders from Redis: {str(e)}")
-            return []
+            logger.error("[%s] Error checking sent orders in Redis: %s", platform, e)
+            return list(order_ids)
+
+    def save_sent_orders(self, order_ids: Iterable[str], platform: str) -> None:
+        key = f"{self.namespace}sent_orders_{platform}"
+        try:
+            self._mark_seen(key, order_ids)
+        except redis.RedisError as e:
+            logger.error("[%s] Error saving sent orders to Redis: %s", platform, e)
 
     def save_sent_order(self, order_id: str, platform: str) -> None:
-        key = f"sent_orders_{platform}"
+        self.save_sent_orders([order_id], platform)
+
+    def filter_overdue_unnotified(self, order_ids: List[str], platform: str) -> List[str]:
+        """Return the overdue order IDs that have not been reported yet (all of them if Redis fails)."""
+        key = f"{self.namespace}overdue_notified_{platform}"
+        try:
+            return self._filter_unseen(key, order_ids)
+        except redis.RedisError as e:
+            logger.error("[%s] Error checking overdue notified orders in Redis: %s", platform, e)
+            return list(order_ids)
+
+    def save_overdue_notified(self, order_id: str, platform: str) -> None:
+        key = f"{self.namespace}overdue_notified_{platform}"
+        try:
+            self._mark_seen(key, [order_id])
+        except redis.RedisError as e:
+            logger.error("[%s] Error saving overdue notified order %s to Redis: %s", platform, order_id, e)
+
+    def filter_unqueued_orders(self, order_ids: List[str], platform: str) -> List[str]:
+        """Return the order IDs that have not been published to the order event stream yet."""
+        key = f"{self.namespace}queued_orders_{platform}"
         try:
-            self.client.sadd(key, order_id)
+            return self._filter_unseen(key, order_ids)
         except redis.RedisError as e:
-            logger.error(f"[{platform}] Error saving sent order {order_id} to Redis: {str(e)}")
+            logger.error("[%s] Error checking queued orders in Redis: %s", platform, e)
+            return list(order_ids)
+
+    def publish_order_events(self, platform: str, orders: List[Tuple[str, str]]) -> bool:
+        """Append ``(order_id, payload)`` events to the order stream and remember them as queued.
+
+        Both happen in one MULTI/EXEC, so an order is never marked queued without its event.
 
-    def load_overdue_notified(self, platform: str) -> List[str]:
-        key = f"overdue_notified_{platform}"
+        Returns:
+            False if Redis failed and nothing was published.
+        """
+        if not orders:
+            return True
+        key = f"{self.namespace}queued_orders_{platform}"
+        now = time.time()
+        retention = settings.DEDUP_RETENTION_DAYS * 86400
         try:
-            return list(self.client.smembers(key))
+            self._migrate_legacy_set(key)
+            pipe = self.client.pipeline()
+            for order_id, payload in orders:
+                pipe.xadd(self.namespace + ORDER_EVENTS_STREAM, {"platform": platform, "order_id": order_id, "payload": payload},
+                          maxlen=settings.ORDER_STREAM_MAXLEN, approximate=True)
+            pipe.zadd(key, {order_id: now for order_id, _ in orders})
+            pipe.zremrangebyscore(key, "-inf", now - retention)
+            pipe.expire(key, int(retention))
+            pipe.execute()
+            return True
         except redis.RedisError as e:
-            logger.error(f"[{platform}] Error loading overdue notified orders from Redis: {str(e)}")
+            logger.error("[%s] Error publishing order events to Redis: %s", platform, e)
+            return False
+
+    def ensure_order_consumer_group(self, group: str = ORDER_CONSUMER_GROUP) -> bool:
+        """Create the consumer group (and the stream) unless it already exists.
+
+        Returns:
+            False if Redis failed and the group may not exist.
+        """
+        try:
+            self.client.xgroup_create(self.namespace + ORDER_EVENTS_STREAM, group, id="0", mkstream=True)
+            return True
+        except redis.RedisError as e:
+            if isinstance(e, redis.ResponseError) and "BUSYGROUP" in str(e):
+                return True
+            logger.error("Error creating order consumer group %s in Redis: %s", group, e)
+            return False
+
+    def read_order_events(self, group: str, consumer: str, count: int) -> List[StreamEntry]:
+        """Read up to ``count`` events never delivered to the group.
+
+        Returns at once when there are none (no ``BLOCK``); the caller decides how long to wait.
+        A group lost with the stream (e.g. after Redis was flushed) is recreated.
+        """
+        try:
+            response = self.client.xreadgroup(group, consumer, {self.namespace + ORDER_EVENTS_STREAM: ">"}, count=count)
+        except redis.RedisError as e:
+            logger.error("Error reading order events from Redis: %s", e)
+            if isinstance(e, redis.ResponseError) and "NOGROUP" in str(e):
+                self.ensure_order_consumer_group(group)
             return []
+        return [entry for _, entries in response or [] for entry in entries]
 
-    def save_overdue_notified(self, order_id: str, platform: str) -> None:
-        key = f"overdue_notified_{platform}"
+    def claim_stale_order_events(self, group: str, consumer: str, min_idle_seconds: float,
+                                 count: int) -> List[Tuple[str, Dict[str, str], int]]:
+        """Take over events left unacknowledged for ``min_idle_seconds`` (e.g. by a crashed worker).
+
+        Returns:
+            ``(entry_id, fields, times_delivered)`` for each claimed event.
+        """
+        try:
+            claimed = self.client.xautoclaim(self.namespace + ORDER_EVENTS_STREAM, group, consumer,
+                                             int(min_idle_seconds * 1000), start_id="0-0", count=count)[1]
+            if not claimed:
+                return []
+            pending = self.client.xpending_range(self.namespace + ORDER_EVENTS_STREAM, group, min=claimed[0][0],
+                                                 max=claimed[-1][0], count=len(claimed), consumername=consumer)
+        except redis.RedisError as e:
+            logger.error("Error claiming stale order events in Redis: %s", e)
+            return []
+        deliveries = {entry["message_id"]: entry["times_delivered"] for entry in pending}
+        return [(entry_id, fields, deliveries.get(entry_id, 1)) for entry_id, fields in claimed if fields]
+
+    def ack_order_events(self, group: str, entry_ids: List[str]) -> None:
+        """Acknowledge handled events; on a Redis error they stay pending and are claimed again later."""
+        if not entry_ids:
+            return
+        try:
+            self.client.xack(self.namespace + ORDER_EVENTS_STREAM, group, *entry_ids)
+        except redis.RedisError as e:
+            logger.error("Error acknowledging order events in Redis: %s", e)
+
+    def dead_letter_order_event(self, group: str, entry_id: str, fields: Dict[str, str], reason: str) -> None:
+        """Move an event that keeps failing to the dead-letter stream and acknowledge it."""
+        try:
+            pipe = self.client.pipeline()
+            pipe.xadd(self.namespace + ORDER_EVENTS_DEAD_STREAM, {**fields, "entry_id": entry_id, "reason": reason},
+                      maxlen=settings.ORDER_STREAM_MAXLEN, approximate=True)
+            pipe.xack(self.namespace + ORDER_EVENTS_STREAM, group, entry_id)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error("Error moving order event %s to dead letters in Redis: %s", entry_id, e)
+
+    def load_label_file_id(self, order_id: str, platform: str) -> Optional[str]:
+        """Return the Telegram ``file_id`` of an already uploaded order label."""
+        try:
+            return self.client.hget(f"{self.namespace}label_file_ids_{platform}", order_id)
+        except redis.RedisError as e:
+            logger.error("[%s] Error loading label file_id for order %s from Redis: %s", platform, order_id, e)
+            return None
+
+    def save_label_file_id(self, order_id: str, platform: str, file_id: str) -> None:
+        key = f"{self.namespace}label_file_ids_{platform}"
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hset(key, order_id, file_id)
+            pipe.expire(key, settings.DEDUP_RETENTION_DAYS * 86400)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error("[%s] Error saving label file_id for order %s to Redis: %s", platform, order_id, e)
+
+    def claim_orders(self, order_ids: List[str], platform: str, owner: str, lease_seconds: float) -> List[str]:
+        """Take a leased claim on each order before notifying about it.
+
+        Uses one pipelined ``SET NX PX`` per order, so concurrent replicas split the orders between
+        them. Claims of a crashed worker expire after ``lease_seconds`` and the orders are retried.
+
+        Returns:
+            IDs claimed by ``owner`` (all of them if Redis is unavailable).
+        """
+        if not order_ids:
+            return []
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for order_id in order_ids:
+                pipe.set(f"{self.namespace}order_claim_{platform}_{order_id}", owner, nx=True, px=int(lease_seconds * 1000))
+            results = pipe.execute()
+            return [order_id for order_id, claimed in zip(order_ids, results) if claimed]
+        except redis.RedisError as e:
+            logger.error("[%s] Error claiming orders in Redis: %s", platform, e)
+            return list(order_ids)
+
+    def renew_order_claims(self, order_ids: Iterable[str], platform: str, owner: str, lease_seconds: float) -> List[str]:
+        """Extend the claims ``owner`` still holds by ``lease_seconds``.
+
+        Returns:
+            IDs whose claims were renewed; claims that expired and were taken over are left alone.
+        """
+        order_ids = list(order_ids)
+        if not order_ids:
+            return []
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for order_id in order_ids:
+                self._renew_if_owner(keys=[f"{self.namespace}order_claim_{platform}_{order_id}"],
+                                     args=[owner, int(lease_seconds * 1000)], client=pipe)
+            results = pipe.execute()
+            return [order_id for order_id, renewed in zip(order_ids, results) if renewed]
+        except redis.RedisError as e:
+            logger.error("[%s] Error renewing order claims in Redis: %s", platform, e)
+            return []
+
+    def release_orders(self, order_ids: Iterable[str], platform: str, owner: str) -> None:
+        """Release claims still held by ``owner``; claims taken over by another worker are kept."""
+        order_ids = list(order_ids)
+        if not order_ids:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for order_id in order_ids:
+                self._release_if_owner(keys=[f"{self.namespace}order_claim_{platform}_{order_id}"], args=[owner], client=pipe)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error("[%s] Error releasing order claims in Redis: %s", platform, e)
+
+    def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> Optional[bool]:
+        """Acquire the named lease or renew it if ``owner`` already holds it.
+
+        Returns:
+            True if ``owner`` holds the lease, False if someone else does, None if Redis failed.
+        """
+        try:
+            return bool(self._acquire_or_renew(keys=[f"lease_{name}"], args=[owner, int(ttl_seconds * 1000)]))
+        except redis.RedisError as e:
+            logger.error("Error acquiring lease %s in Redis: %s", name, e)
+            return None
+
+    def release_lease(self, name: str, owner: str) -> None:
+        """Release the named lease if it is still held by ``owner``."""
+        try:
+            self._release_if_owner(keys=[f"lease_{name}"], args=[owner])
+        except redis.RedisError as e:
+            logger.error("Error releasing lease %s in Redis: %s", name, e)
+
+    def load_sku_mappings(self, platform: str, shop_skus: List[str]) -> Dict[str, Dict[str, str]]:
+        """Load cached SKU mappings with one MGET; expired entries are already gone.
+
+        Cached "no mapping" entries are returned as empty dicts.
+        """
+        if not shop_skus:
+            return {}
+        try:
+            values = self.client.mget([self._sku_mapping_key(platform, sku) for sku in shop_skus])
+        except redis.RedisError as e:
+            logger.error("[%s] Error loading SKU mappings from Redis: %s", platform, e)
+            return {}
+        return {sku: json.loads(value) for sku, value in zip(shop_skus, values) if value is not None}
+
+    def save_sku_mappings(self, platform: str, mappings: Dict[str, Dict[str, str]], ttl_seconds: float) -> None:
+        """Store each SKU mapping under its own key, so every entry expires ``ttl_seconds`` after it was saved."""
+        if not mappings:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for sku, mapping in mappings.items():
+                pipe.set(self._sku_mapping_key(platform, sku), json.dumps(mapping), ex=int(ttl_seconds))
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error("[%s] Error saving SKU mappings to Redis: %s", platform, e)
+
+    def _sku_mapping_key(self, platform: str, shop_sku: str) -> str:
+        return f"{self.namespace}sku_mapping_{platform}:{shop_sku}"
+
+    def load_sync_state(self, platform: str) -> Dict[str, float]:
+        """Load the delta-sync state: ``watermark`` and ``last_full_sync`` as UNIX timestamps."""
+        key = f"{self.namespace}sync_state_{platform}"
+        try:
+            return {field: float(value) for field, value in self.client.hgetall(key).items()}
+        except redis.RedisError as e:
+            logger.error("[%s] Error loading sync state from Redis: %s", platform, e)
+            return {}
+
+    def save_sync_state(self, platform: str, watermark: float, full_sync: bool = False) -> None:
+        """Advance the high-water mark and, after a full reconciliation, its timestamp."""
+        key = f"{self.namespace}sync_state_{platform}"
+        mapping = {"watermark": watermark}
+        if full_sync:
+            mapping["last_full_sync"] = watermark
+        try:
+            self.client.hset(key, mapping=mapping)
+        except redis.RedisError as e:
+            logger.error("[%s] Error saving sync state to Redis: %s", platform, e)
+
+    def add_to_carriage_batch(self, platform: str, group: str, order_id: str) -> bool:
+        """Add an order to the open carriage batch ``group``, opening the batch if needed.
+
+        Returns:
+            False if Redis failed and the order was not queued.
+        """
+        try:
+            pipe = self.client.pipeline()
+            pipe.sadd(f"{self.namespace}carriage_batch_{platform}_{group}", order_id)
+            pipe.zadd(f"{self.namespace}carriage_batches_{platform}", {group: time.time()}, nx=True)
+            pipe.execute()
+            return True
+        except redis.RedisError as e:
+            logger.error("[%s] Error adding order %s to carriage batch %s in Redis: %s", platform, order_id, group, e)
+            return False
+
+    def load_carriage_batches(self, platform: str) -> Dict[str, float]:
+        """Return open carriage batches mapped to the UNIX time they were opened."""
+        try:
+            return dict(self.client.zrange(f"{self.namespace}carriage_batches_{platform}", 0, -1, withscores=True))
+        except redis.RedisError as e:
+            logger.error("[%s] Error loading carriage batches from Redis: %s", platform, e)
+            return {}
+
+    def take_carriage_batch(self, platform: str, group: str) -> List[str]:
+        """Atomically close the batch ``group`` and return its orders.
+
+        Concurrent callers never receive the same orders, so a batch becomes one carriage.
+        """
+        key = f"{self.namespace}carriage_batch_{platform}_{group}"
+        try:
+            pipe = self.client.pipeline()
+            pipe.smembers(key)
+            pipe.delete(key)
+            pipe.zrem(f"{self.namespace}carriage_batches_{platform}", group)
+            members, _, _ = pipe.execute()
+            return sorted(members)
+        except redis.RedisError as e:
+            logger.error("[%s] Error taking carriage batch %s from Redis: %s", platform, group, e)
+            return []
+
+    def restore_carriage_batch(self, platform: str, group: str, order_ids: List[str], opened_at: float) -> None:
+        """Put orders of a batch that failed to become a carriage back for a later flush.
+
+        ``opened_at`` only moves the batch later, so a retry delay is kept even if new orders
+        reopened the batch meanwhile.
+        """
+        if not order_ids:
+            return
+        try:
+            pipe = self.client.pipeline()
+            pipe.sadd(f"{self.namespace}carriage_batch_{platform}_{group}", *order_ids)
+            pipe.zadd(f"{self.namespace}carriage_batches_{platform}", {group: opened_at}, gt=True)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error("[%s] Error restoring carriage batch %s in Redis: %s", platform, group, e)
+
+    def load_carriage_state(self, platform: str, group: str) -> Dict[str, str]:
+        """Progress of a batch's carriage: ``attempts``, ``carriage_id`` and ``approved``."""
+        try:
+            return self.client.hgetall(f"{self.namespace}carriage_state_{platform}_{group}")
+        except redis.RedisError as e:
+            logger.error("[%s] Error loading carriage state %s from Redis: %s", platform, group, e)
+            return {}
+
+    def save_carriage_state(self, platform: str, group: str, **fields) -> None:
+        key = f"{self.namespace}carriage_state_{platform}_{group}"
+        try:
+            pipe = self.client.pipeline()
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, 7 * 24 * 3600)  # Брошенное состояние не копится вечно
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error("[%s] Error saving carriage state %s to Redis: %s", platform, group, e)
+
+    def clear_carriage_state(self, platform: str, group: str) -> None:
+        try:
+            self.client.delete(f"{self.namespace}carriage_state_{platform}_{group}")
+        except redis.RedisError as e:
+            logger.error("[%s] Error clearing carriage state %s in Redis: %s", platform, group, e)
+
+    def dead_letter_carriage_batch(self, platform: str, group: str, order_ids: List[str], reason: str) -> None:
+        """Park a batch that keeps failing in ``carriage_dead_{platform}`` for manual handling."""
+        entry = json.dumps({"order_ids": order_ids, "reason": reason, "failed_at": time.time()}, ensure_ascii=False)
         try:
-            self.client.sadd(key, order_id)
+            pipe = self.client.pipeline()
+            pipe.hset(f"{self.namespace}carriage_dead_{platform}", group, entry)
+            pipe.delete(f"{self.namespace}carriage_state_{platform}_{group}")
+            pipe.execute()
         except redis.RedisError as e:
-            logger.error(f"[{platform}] Error saving overdue notified order {order_id} to Redis: {str(e)}")
+            logger.error("[%s] Error dead-lettering carriage batch %s in Redis: %s", platform, group, e)
 
     def close(self) -> None:
-        self.client.close()
\ No newline at end of file
+        self.client.close()
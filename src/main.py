@@ -1,67 +1,69 @@
 # src/main.py
 import asyncio
 from aiogram import Bot, Dispatcher
+from src.app import AppContainer
 from src.bot.handlers import router
-from src.bot.tasks import periodic_check, periodic_overdue_check, daily_plan  # Добавляем daily_plan
-from src.api.yandex_client import YandexAPIClient
-from src.api.ozon_client import OzonAPIClient
+from src.bot.tasks import (
+    periodic_check, periodic_overdue_check, daily_plan, carriage_flush, order_event_consumer  # Добавляем daily_plan
+)
+from src.bot.webhook import run_updates
 from src.api.services import OrderService
-from src.db.redis_db import RedisDB
 from src.config.settings import settings
 from src.utils.logging import logger
+from src.utils.metrics import start_metrics_server
 from babel.support import Translations
 
+async def send_start_message(bot: Bot, order_service: OrderService, translations: Translations) -> None:
+    """Tell the tenant's chat that the bot is up and which marketplaces it serves."""
+    # Формируем стартовое сообщение с галочками и крестиками
+    services_status = [
+        f"{'✅' if platform in order_service.clients else '❌'} {platform.capitalize()}"
+        for platform in ("yandex", "ozon")
+    ]
+    services_text = "\n".join(services_status)
+    start_message = (
+        f"🤖 *{translations.gettext('bot_started')}*\n\n"
+        f"Статус сервисов:\n{services_text}"
+    )
+    await order_service.sender.call(
+        order_service.tenant.chat_id, bot.send_message,
+        order_service.tenant.chat_id,
+        start_message,
+        parse_mode="Markdown"
+    )
+
 async def main() -> None:
     settings.validate()
+    start_metrics_server(settings.PROMETHEUS_PORT)
     bot = Bot(token=settings.TELEGRAM_TOKEN)
-    dp = Dispatcher()
+    container = AppContainer()
+    dp = Dispatcher(container=container)  # Хендлеры получают контейнер аргументом container
     dp.include_router(router)
 
-    clients = {}
-    if settings.YANDEX_ENABLED:
-        clients["yandex"] = YandexAPIClient(
-            settings.YANDEX_API_TOKEN, settings.YANDEX_API_URL,
-            settings.YANDEX_CAMPAIGN_ID, settings.YANDEX_BUSINESS_ID
-        )
-    if settings.OZON_ENABLED:
-        clients["ozon"] = OzonAPIClient(
-            settings.OZON_API_KEY, settings.OZON_CLIENT_ID, settings.OZON_API_URL
-        )
-
-    db = RedisDB(settings.REDIS_HOST, settings.REDIS_PORT, settings.REDIS_DB)
-    order_service = OrderService(clients, db)
-
     try:
-        logger.info("Starting bot...")
-        translations = Translations.load('locale', [settings.LOCALE])
-
-        # Формируем стартовое сообщение с галочками и крестиками
-        services_status = [
-            f"{'✅' if settings.YANDEX_ENABLED else '❌'} Yandex",
-            f"{'✅' if settings.OZON_ENABLED else '❌'} Ozon"
-        ]
-        services_text = "\n".join(services_status)
-        start_message = (
-            f"🤖 *{translations.gettext('bot_started')}*\n\n"
-            f"Статус сервисов:\n{services_text}"
-        )
-
-        await bot.send_message(
-            settings.CHAT_ID,
-            start_message,
-            parse_mode="Markdown"
-        )
-        await asyncio.gather(
-            periodic_check(bot, order_service),
-            periodic_overdue_check(bot, order_service),
-            daily_plan(bot, order_service),  # Добавляем задачу ежедневного плана
-            dp.start_polling(bot)
-        )
+        logger.info("Starting bot (role: %s, updates: %s)...", settings.ROLE, settings.BOT_MODE)
+        tasks = []
+        if settings.ROLE in ("all", "bot"):
+            tasks.append(run_updates(dp, bot))
+        if settings.ROLE in ("all", "poller"):
+            elector, scheduler = container.elector, container.scheduler
+            tasks.append(elector.run())
+            for order_service in container.order_services.values():
+                await send_start_message(bot, order_service, container.translations)
+                if settings.ORDER_STREAM_ENABLED:
+                    tasks.append(order_event_consumer(bot, order_service))
+                tasks += [
+                    periodic_check(bot, order_service, elector, scheduler),
+                    periodic_overdue_check(bot, order_service, elector, scheduler),
+                    daily_plan(bot, order_service, elector),  # Добавляем задачу ежедневного плана
+                    carriage_flush(bot, order_service, elector),
+                ]
+        await asyncio.gather(*tasks)
     except Exception as e:
-        logger.error(f"Error in main: {str(e)}")
+        logger.error("Error in main: %s", e)
     finally:
-        db.close()
+        await container.close()
         await bot.session.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
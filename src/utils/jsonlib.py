@@ -0,0 +1,22 @@
+# src/utils/jsonlib.py
+import json
+from typing import Any, Union
+
+try:  # orjson - необязательная зависимость: poetry install -E fast-json
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON with orjson when it is installed, otherwise with the standard library."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj: Any) -> str:
+    """Encode ``obj`` as compact UTF-8 JSON text (non-ASCII characters are not escaped)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
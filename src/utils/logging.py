@@ -1,50 +1,110 @@
 # src/utils/logging.py
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
 import colorlog
+from colorlog.escape_codes import escape_codes
+from src.config.settings import settings
+from src.utils import jsonlib
+
+PLATFORMS = ("yandex", "ozon")
+PLATFORM_COLORS = {"yandex": "yellow", "ozon": "cyan"}  # Желтый для [yandex], голубой для [ozon]
+LEVEL_COLORS = {  # Базовые цвета для уровней логирования (если платформа не указана)
+    'DEBUG': 'cyan',
+    'INFO': 'green',
+    'WARNING': 'yellow',
+    'ERROR': 'red',
+    'CRITICAL': 'bold_red',
+}
+
+def log_extra(platform: str, order_id: Optional[Any] = None) -> Dict[str, Any]:
+    """``extra`` for a record about one order; the JSON format emits it as separate fields."""
+    return {"platform": platform, "order_id": order_id}
+
+def record_platform(record: logging.LogRecord) -> Optional[str]:
+    """Platform of a record: its ``platform`` extra or the ``[platform]`` prefix of the message."""
+    platform = getattr(record, "platform", None)
+    if platform:
+        return platform
+    message = record.getMessage()  # msg может быть не строкой, getMessage приводит его к str
+    if message.startswith("["):
+        prefix, found, _ = message[1:].partition("]")
+        if found and prefix in PLATFORMS:
+            return prefix
+    return None
 
 class PlatformColorFilter(logging.Filter):
-    """Custom filter to apply colors based on platform prefix in the message."""
+    """Colors a record by its platform, or by its level when it has none."""
     def filter(self, record):
-        if "[yandex]" in record.msg:
-            record.log_color = "yellow"  # Желтый для [yandex]
-        elif "[ozon]" in record.msg:
-            record.log_color = "cyan"    # Голубой (синий) для [ozon]
-        else:
-            # Используем стандартные цвета для уровня логирования, если нет платформы
-            level_colors = {
-                'DEBUG': 'cyan',
-                'INFO': 'green',
-                'WARNING': 'yellow',
-                'ERROR': 'red',
-                'CRITICAL': 'bold_red',
-            }
-            record.log_color = level_colors.get(record.levelname, 'white')
+        color = PLATFORM_COLORS.get(record_platform(record)) or LEVEL_COLORS.get(record.levelname, 'white')
+        record.platform_color = escape_codes[color]
         return True
 
-def setup_logging() -> logging.Logger:
-    """Configure colored logging for the application.
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with ``platform`` and ``order_id`` fields when they are known."""
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        platform = record_platform(record)
+        if platform:
+            entry["platform"] = platform
+        order_id = getattr(record, "order_id", None)
+        if order_id is not None:
+            entry["order_id"] = str(order_id)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return jsonlib.dumps(entry)
+
+class DeferredQueueHandler(QueueHandler):
+    """Puts records on the queue as they are, leaving all formatting to the listener thread.
 
-    Returns:
-        logging.Logger: Configured logger instance.
+    ``QueueHandler.prepare`` renders the message and traceback on the calling thread and drops
+    ``exc_info`` so the record can be pickled; records here never leave the process, so the
+    listener formats them instead and still sees the exception.
     """
+    def prepare(self, record):
+        return record
+
+def _output_handler(log_format: str) -> logging.Handler:
+    if log_format == "json":
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        return handler
     handler = colorlog.StreamHandler()
     handler.setFormatter(colorlog.ColoredFormatter(
-        '%(log_color)s%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        log_colors={  # Базовые цвета для уровней логирования (если платформа не указана)
-            'DEBUG': 'cyan',
-            'INFO': 'green',
-            'WARNING': 'yellow',
-            'ERROR': 'red',
-            'CRITICAL': 'bold_red',
-        }
+        '%(platform_color)s%(asctime)s - %(name)s - %(levelname)s - %(message)s%(reset)s'
     ))
-    
     # Добавляем фильтр для динамической раскраски
     handler.addFilter(PlatformColorFilter())
-    
+    return handler
+
+def setup_logging(level: str = settings.LOG_LEVEL, log_format: str = settings.LOG_FORMAT) -> logging.Logger:
+    """Configure application logging.
+
+    The calling coroutine only puts records on a queue, unformatted; a ``QueueListener`` thread
+    renders the message and any traceback (colored text or JSON lines with ``LOG_FORMAT=json``)
+    and writes them out, so neither formatting nor log I/O runs on the event loop. Messages use
+    lazy %-formatting and are not rendered at all when their level is disabled. Arguments are
+    formatted when the listener gets to the record, so pass values rather than objects that
+    change right after the call.
+
+    Returns:
+        logging.Logger: Configured logger instance.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, _output_handler(log_format), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Дописываем оставшиеся в очереди записи при выходе
+
     logger = logging.getLogger(__name__)
-    logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.addHandler(DeferredQueueHandler(log_queue))
     return logger
 
-logger = setup_logging()
\ No newline at end of file
+logger = setup_logging()
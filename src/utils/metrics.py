@@ -0,0 +1,39 @@
+# src/utils/metrics.py
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from tenacity import RetryCallState
+from src.config.settings import settings
+from src.utils.logging import logger
+
+# Prometheus metrics
+API_REQUEST_SECONDS = Histogram(
+    'marketplace_request_seconds', 'Marketplace API request latency',
+    ['platform', 'endpoint', 'status']
+)
+API_RETRIES_TOTAL = Counter(
+    'marketplace_retries_total', 'Marketplace API calls retried after a failure',
+    ['platform', 'operation']
+)
+TELEGRAM_SEND_SECONDS = Histogram(
+    'telegram_send_seconds', 'Telegram Bot API call latency including rate limiting and retries',
+    ['method', 'result']
+)
+TELEGRAM_QUEUE_DEPTH = Gauge('telegram_queue_depth', 'Telegram calls waiting in the outbound queue')
+CYCLE_SECONDS = Histogram(
+    'poll_cycle_seconds', 'Duration of one polling job run',
+    ['job', 'platform'],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+POLL_NEXT_RUN_TIMESTAMP = Gauge(
+    'poll_next_run_timestamp', 'UNIX time the polling job is due to run next (NaN until it has run once)', ['job']
+)
+CACHE_REQUESTS_TOTAL = Counter('cache_requests_total', 'Cache lookups by outcome', ['cache', 'result'])
+
+def count_retry(retry_state: RetryCallState) -> None:
+    """tenacity ``before_sleep`` hook counting retries of marketplace client methods."""
+    client = retry_state.args[0] if retry_state.args else None
+    API_RETRIES_TOTAL.labels(getattr(client, "platform", ""), retry_state.fn.__name__).inc()
+
+def start_metrics_server(port: int = settings.PROMETHEUS_PORT) -> None:
+    """Expose the metrics on ``port`` for Prometheus to scrape."""
+    start_http_server(port)
+    logger.info("Prometheus metrics exposed on port %s", port)
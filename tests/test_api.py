@@ -1,11 +1,34 @@
 # tests/test_api.py
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
 import pytest
+import redis
 from src.api.yandex_client import YandexAPIClient
 from src.api.ozon_client import OzonAPIClient
 from src.api.parsers import YandexOrderParser, OzonOrderParser
 from src.api.services import OrderService
+from src.api.cache import SkuMappingCache
+from src.api.carriages import CarriageBatcher
+from src.api.labels import LabelStore
+from src.api.snapshots import OrderSnapshotStore
+from src.api.tenants import build_order_services
+from src.bot.tasks import send_daily_plan
+from src.config.tenants import parse_tenants
+from src.db.redis_db import RedisDB
+from src.config.settings import settings
+from src.utils import jsonlib
+from src.api.base_client import APIResponse, MarketplaceAPIError, SessionPool
+from prometheus_client import REGISTRY
+from tenacity import wait_none
 from unittest.mock import patch, Mock, AsyncMock
 
+async def _pages(*pages):
+    for page in pages:
+        yield page
+
 # Фикстуры для клиентов
 @pytest.fixture
 def yandex_client():
@@ -16,39 +39,87 @@ def ozon_client():
     return OzonAPIClient("test_key", "test_client", "http://test-api")
 
 # Тесты для YandexAPIClient
-def test_yandex_get_orders_success(yandex_client):
-    with patch('requests.get') as mock_get:
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"orders": [{"id": "1"}]}
-        mock_get.return_value = mock_response
-        orders = yandex_client.get_orders("PROCESSING", "STARTED")
+@pytest.mark.asyncio
+async def test_yandex_get_orders_success(yandex_client):
+    response = APIResponse(200, b'{"orders": [{"id": "1"}]}')
+    with patch.object(yandex_client, '_request', AsyncMock(return_value=response)) as mock_request:
+        orders = [order async for order in yandex_client.get_orders("PROCESSING", "STARTED")]
         assert len(orders) == 1
         assert orders[0]["id"] == "1"
+        mock_request.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_yandex_get_orders_walks_all_pages(yandex_client):
+    responses = [
+        APIResponse(200, b'{"orders": [{"id": "1"}, {"id": "2"}], "paging": {"nextPageToken": "abc"}}'),
+        APIResponse(200, b'{"orders": [{"id": "3"}], "paging": {}}'),
+    ]
+    with patch.object(yandex_client, '_request', AsyncMock(side_effect=responses)) as mock_request:
+        orders = [order async for order in yandex_client.get_orders("PROCESSING", "STARTED")]
+        assert [order["id"] for order in orders] == ["1", "2", "3"]
+        assert mock_request.await_args_list[1].kwargs["params"]["page_token"] == "abc"
+
+@pytest.mark.asyncio
+async def test_yandex_delta_listing_sends_updated_at_from(yandex_client):
+    response = APIResponse(200, b'{"orders": [], "paging": {}}')
+    since = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    with patch.object(yandex_client, '_request', AsyncMock(return_value=response)) as mock_request:
+        [order async for order in yandex_client.get_orders("PROCESSING", "STARTED", updated_since=since)]
+        params = mock_request.await_args.kwargs["params"]
+        assert params["updatedAtFrom"] == "2024-05-01T12:30:00+00:00"
+        assert "updateFrom" not in params
 
-def test_yandex_get_orders_failure(yandex_client):
-    with patch('requests.get') as mock_get:
-        mock_response = Mock()
-        mock_response.status_code = 500
-        mock_response.raise_for_status.side_effect = Exception("Server error")
-        mock_get.return_value = mock_response
-        with pytest.raises(Exception, match="Server error"):
-            yandex_client.get_orders("PROCESSING", "STARTED")
+@pytest.mark.asyncio
+async def test_yandex_get_orders_failure(yandex_client):
+    response = APIResponse(500, b"Server error")
+    get_orders_page = YandexAPIClient._get_orders_page.retry_with(wait=wait_none())
+    with patch.object(yandex_client, '_request', AsyncMock(return_value=response)) as mock_request:
+        with pytest.raises(MarketplaceAPIError, match="HTTP 500"):
+            await get_orders_page(yandex_client, "PROCESSING", "STARTED")
+        assert mock_request.await_count == 3
+
+@pytest.mark.asyncio
+async def test_yandex_shipments_page_retries_transient_errors(yandex_client):
+    responses = [APIResponse(503, b"Unavailable"), APIResponse(200, b'{"result": {"shipments": [{"id": 1}]}}')]
+    get_shipments_page = YandexAPIClient._get_shipments_page.retry_with(wait=wait_none())
+    with patch.object(yandex_client, '_request', AsyncMock(side_effect=responses)) as mock_request:
+        assert await get_shipments_page(yandex_client, {}) == ([{"id": 1}], None)
+        assert mock_request.await_count == 2
+
+@pytest.mark.asyncio
+async def test_client_reuses_session(yandex_client):
+    session = yandex_client.session
+    assert yandex_client.session is session
+    await yandex_client.close()
+    assert session.closed
 
 # Тесты для OzonAPIClient
-def test_ozon_get_orders_success(ozon_client):
-    with patch('requestsKwargs'({'requests.post': Mock(return_value=Mock(status_code=200, json=lambda: {"result": {"postings": [{"posting_number": "123"}] }))}))
-    orders = ozon_client.get_orders("awaiting_packaging")
-    assert len(orders) == 1
-    assert orders[0]["posting_number"] == "123"
-
-def test_ozon_get_label_failure(ozon_client):
-    with patch('requests.post') as mock_post:
-        mock_response = Mock()
-        mock_response.status_code = 400
-        mock_response.text = "Bad request"
-        mock_post.return_value = mock_response
-        label = ozon_client.get_label("123")
+@pytest.mark.asyncio
+async def test_ozon_get_orders_success(ozon_client):
+    response = APIResponse(200, b'{"result": {"postings": [{"posting_number": "123"}]}}')
+    with patch.object(ozon_client, '_request', AsyncMock(return_value=response)):
+        orders = [order async for order in ozon_client.get_orders("awaiting_packaging")]
+        assert len(orders) == 1
+        assert orders[0]["posting_number"] == "123"
+
+@pytest.mark.asyncio
+async def test_ozon_get_orders_walks_all_pages(ozon_client):
+    responses = [
+        APIResponse(200, b'{"result": {"postings": [{"posting_number": "1"}, {"posting_number": "2"}], "has_next": true}}'),
+        APIResponse(200, b'{"result": {"postings": [{"posting_number": "3"}], "has_next": false}}'),
+    ]
+    with patch.object(ozon_client, '_request', AsyncMock(side_effect=responses)) as mock_request:
+        orders = [order async for order in ozon_client.get_orders("awaiting_packaging")]
+        assert [order["posting_number"] for order in orders] == ["1", "2", "3"]
+        assert mock_request.await_args_list[1].kwargs["json"]["offset"] == 2
+        assert mock_request.await_args.kwargs["json"]["limit"] == settings.OZON_ORDERS_PAGE_SIZE == 100
+        assert mock_request.await_args.kwargs["json"]["with"] == {"translit": True}
+
+@pytest.mark.asyncio
+async def test_ozon_get_label_failure(ozon_client):
+    response = APIResponse(400, b"Bad request")
+    with patch.object(ozon_client, '_request', AsyncMock(return_value=response)):
+        label = await ozon_client.get_label("123")
         assert label is None
 
 # Тесты для парсеров
@@ -80,12 +151,472 @@ def test_ozon_parser():
     assert order.items[0].offer_name == "Item2"
     assert order.items_total == 300.0
 
+def test_parse_summary_matches_full_parse():
+    yandex = {"id": 5, "status": "PROCESSING", "substatus": "READY_TO_SHIP", "items": [{"shopSku": "s"}],
+              "delivery": {"shipments": [{"shipmentDate": "01-01-2024"}]}}
+    ozon = {"posting_number": "6-1", "status": "awaiting_deliver", "shipment_date": "2024-01-01T10:00:00Z"}
+    for parser, order_data in ((YandexOrderParser(), yandex), (OzonOrderParser(), ozon)):
+        summary = parser.parse_summary(order_data)
+        assert not hasattr(summary, "__dict__")
+        order = parser.parse({**order_data, "items": [], "products": []})
+        assert (summary.id, summary.shipment_date, summary.status) == (order.id, order.shipment_date, order.status)
+
+@pytest.mark.asyncio
+async def test_snapshot_store_serves_summaries_from_full_snapshot(yandex_client):
+    page = [{"id": "1", "delivery": {"shipments": [{"shipmentDate": "01-01-2024"}]}}]
+    store = OrderSnapshotStore(ttl=60)
+    with patch.object(yandex_client, 'iter_order_pages', side_effect=lambda *args: _pages(page)) as mock_pages:
+        summaries = await store.get("yandex", yandex_client, "PROCESSING", "READY_TO_SHIP", summary=True)
+        assert [(order.id, order.shipment_date) for order in summaries] == [("1", "01-01-2024")]
+        full = YandexOrderParser().parse({**page[0], "items": []})
+        store.put("yandex", "PROCESSING", "READY_TO_SHIP", [full])
+        assert await store.get("yandex", yandex_client, "PROCESSING", "READY_TO_SHIP", summary=True) == [full]
+        mock_pages.assert_called_once()
+
 # Тесты для OrderService
 @pytest.mark.asyncio
 async def test_check_new_orders(yandex_client):
-    with patch.object(yandex_client, 'get_orders', return_value=[{"id": "1", "items": [], "delivery": {"address": {}, "shipments": [{}]}}]):
+    async def pages(status, substatus, updated_since=None):
+        yield [{"id": "1", "items": [], "delivery": {"address": {}, "shipments": [{}]}}]
+    with patch.object(yandex_client, 'iter_order_pages', side_effect=pages), \
+            patch.object(yandex_client, 'get_market_sku', AsyncMock(return_value={})), \
+            patch.object(yandex_client, 'download_label', AsyncMock(return_value=False)):
         bot = AsyncMock()
-        db = Mock(load_sent_orders=Mock(return_value=[]), save_sent_order=Mock())
+        db = Mock(filter_unsent_orders=Mock(side_effect=lambda ids, platform: ids), load_sync_state=Mock(return_value={}),
+                  claim_orders=Mock(side_effect=lambda ids, *args: ids), load_label_file_id=Mock(return_value="file-id"))
         service = OrderService({"yandex": yandex_client}, db)
         await service.check_new_orders(bot, "chat_id")
-        bot.send_document.assert_awaited()  # Проверяем, что уведомление отправлено
\ No newline at end of file
+        bot.send_document.assert_awaited()  # Проверяем, что уведомление отправлено
+        assert bot.send_document.await_args.kwargs["document"] == "file-id"
+        db.save_sync_state.assert_called_once()
+        assert db.save_sync_state.call_args.kwargs["full_sync"] is True
+
+@pytest.mark.asyncio
+async def test_check_new_orders_uses_watermark_between_full_syncs(yandex_client):
+    now = time.time()
+    db = Mock(filter_unsent_orders=Mock(side_effect=lambda ids, platform: ids),
+              claim_orders=Mock(side_effect=lambda ids, *args: ids),
+              load_sync_state=Mock(return_value={"watermark": now - 300, "last_full_sync": now - 600}))
+    with patch.object(yandex_client, 'iter_order_pages', side_effect=lambda *args: _pages()) as mock_pages:
+        service = OrderService({"yandex": yandex_client}, db)
+        await service.check_new_orders(AsyncMock(), "chat_id")
+        updated_since = mock_pages.call_args.args[2]
+        assert updated_since.timestamp() == pytest.approx(now - 300 - settings.SYNC_OVERLAP)
+        assert db.save_sync_state.call_args.kwargs["full_sync"] is False
+@pytest.mark.asyncio
+async def test_notify_orders_sends_in_order_id_order(yandex_client):
+    async def slow_label(order_id, dest):
+        await asyncio.sleep(0.03 if order_id == "1" else 0)
+        return False
+    orders = [
+        YandexOrderParser().parse({"id": order_id, "items": [], "delivery": {"address": {}, "shipments": [{}]}})
+        for order_id in ("10", "2", "1")
+    ]
+    with patch.object(yandex_client, 'get_market_sku', AsyncMock(return_value={})), \
+            patch.object(yandex_client, 'download_label', side_effect=slow_label):
+        bot = AsyncMock()
+        db = Mock(load_label_file_id=Mock(return_value=None))
+        service = OrderService({"yandex": yandex_client}, db)
+        await service.notify_orders(bot, "chat_id", orders, "yandex", yandex_client)
+        sent_ids = [call.args[1].split("#")[1].split(" ")[0] for call in bot.send_message.await_args_list]
+        assert sent_ids == ["1", "2", "10"]
+        assert [call.args for call in db.save_sent_order.call_args_list] == [("1", "yandex"), ("2", "yandex"), ("10", "yandex")]
+
+@pytest.mark.asyncio
+async def test_check_new_orders_skips_orders_claimed_by_another_replica(yandex_client):
+    page = [{"id": order_id, "items": [], "delivery": {"address": {}, "shipments": [{}]}} for order_id in ("1", "2")]
+    db = Mock(filter_unsent_orders=Mock(side_effect=lambda ids, platform: ids),
+              claim_orders=Mock(return_value=["2"]), load_sync_state=Mock(return_value={}),
+              load_label_file_id=Mock(return_value=None))
+    with patch.object(yandex_client, 'iter_order_pages', side_effect=lambda *args: _pages(page)), \
+            patch.object(yandex_client, 'get_market_sku', AsyncMock(return_value={})), \
+            patch.object(yandex_client, 'download_label', AsyncMock(return_value=False)):
+        bot = AsyncMock()
+        service = OrderService({"yandex": yandex_client}, db)
+        await service.check_new_orders(bot, "chat_id")
+        assert bot.send_message.await_count == 1
+        assert "#2 " in bot.send_message.await_args.args[1]
+        db.release_orders.assert_called_once_with(["2"], "yandex", settings.INSTANCE_ID)
+
+@pytest.mark.asyncio
+async def test_check_new_orders_renews_claims_while_sending(yandex_client):
+    page = [{"id": "1", "items": [], "delivery": {"address": {}, "shipments": [{}]}}]
+    sent = set()
+    db = Mock(filter_unsent_orders=Mock(side_effect=lambda ids, platform: [i for i in ids if i not in sent]),
+              claim_orders=Mock(side_effect=lambda ids, *args: ids), load_sync_state=Mock(return_value={}),
+              renew_order_claims=Mock(side_effect=lambda ids, *args: ids),
+              save_sent_order=Mock(side_effect=lambda order_id, platform: sent.add(order_id)),
+              load_label_file_id=Mock(return_value=None))
+
+    async def slow_send(*args, **kwargs):
+        await asyncio.sleep(0.05)  # Отправка дольше аренды захвата
+        return Mock()
+    with patch.object(settings, 'CLAIM_LEASE_SECONDS', 0.03), \
+            patch.object(yandex_client, 'iter_order_pages', side_effect=lambda *args: _pages(page)), \
+            patch.object(yandex_client, 'get_market_sku', AsyncMock(return_value={})), \
+            patch.object(yandex_client, 'download_label', AsyncMock(return_value=False)):
+        bot = AsyncMock(send_message=AsyncMock(side_effect=slow_send))
+        await OrderService({"yandex": yandex_client}, db).check_new_orders(bot, "chat_id")
+    assert db.renew_order_claims.call_args_list[0].args[:3] == (["1"], "yandex", settings.INSTANCE_ID)
+    assert sent == {"1"}
+
+@pytest.mark.asyncio
+async def test_check_new_orders_publishes_to_stream_when_enabled(yandex_client):
+    page = [{"id": order_id, "items": [], "delivery": {"address": {}, "shipments": [{}]}} for order_id in ("1", "2")]
+    db = Mock(filter_unsent_orders=Mock(side_effect=lambda ids, platform: ids), load_sync_state=Mock(return_value={}),
+              filter_unqueued_orders=Mock(return_value=["2"]), publish_order_events=Mock(return_value=True))
+    with patch.object(settings, 'ORDER_STREAM_ENABLED', True), \
+            patch.object(yandex_client, 'iter_order_pages', side_effect=lambda *args: _pages(page)):
+        bot = AsyncMock()
+        service = OrderService({"yandex": yandex_client}, db)
+        await service.check_new_orders(bot, "chat_id")
+        events = db.publish_order_events.call_args.args[1]
+        assert [order_id for order_id, _ in events] == ["2"]
+        bot.send_message.assert_not_awaited()
+        db.save_sync_state.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_consume_order_events_acks_sent_and_dead_letters_exhausted(yandex_client):
+    def event(order_id):
+        order = {"id": order_id, "items": [], "delivery": {"address": {}, "shipments": [{}]}}
+        return {"platform": "yandex", "order_id": order_id, "payload": json.dumps(order)}
+    sent = set()
+    db = Mock(claim_stale_order_events=Mock(return_value=[("1-0", event("1"), settings.ORDER_STREAM_MAX_DELIVERIES)]),
+              read_order_events=Mock(return_value=[("2-0", event("2"))]),
+              filter_unsent_orders=Mock(side_effect=lambda ids, platform: [i for i in ids if i not in sent]),
+              save_sent_order=Mock(side_effect=lambda order_id, platform: sent.add(order_id)),
+              load_label_file_id=Mock(return_value=None))
+    service = OrderService({"yandex": yandex_client}, db)
+    with patch.object(yandex_client, 'get_market_sku', AsyncMock(return_value={})), \
+            patch.object(yandex_client, 'download_label', AsyncMock(return_value=False)), \
+            patch.object(service, 'send_notification', AsyncMock(side_effect=lambda bot, chat, n, p: n.order_id == "2")):
+        assert await service.consume_order_events(AsyncMock(), "chat_id") == 2
+        db.ack_order_events.assert_called_once_with("notifiers", ["2-0"])
+        assert db.dead_letter_order_event.call_args.args[1] == "1-0"
+
+# Тесты для кэша SKU
+@pytest.mark.asyncio
+async def test_sku_cache_batches_misses_and_caches_locally(yandex_client):
+    db = Mock(load_sku_mappings=Mock(return_value={"a": {"marketSku": "1", "marketModelId": "10"}}))
+    cache = SkuMappingCache(db)
+    fetched = {"b": {"marketSku": "2", "marketModelId": "20"}}
+    with patch.object(yandex_client, 'get_market_sku', AsyncMock(return_value=fetched)) as mock_fetch:
+        mappings = await cache.get_mappings("yandex", yandex_client, ["a", "b", "c", "b"])
+        assert set(mappings) == {"a", "b"}
+        mock_fetch.assert_awaited_once_with(["b", "c"])
+        db.save_sku_mappings.assert_called_once_with("yandex", {"b": fetched["b"], "c": {}}, cache.ttl)
+        # Повторный запрос (включая SKU без соответствия) обслуживается локальным кэшем
+        assert await cache.get_mappings("yandex", yandex_client, ["a", "b", "c"]) == mappings
+        mock_fetch.assert_awaited_once()
+        db.load_sku_mappings.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_yandex_get_market_sku_chunks_to_api_limit(yandex_client):
+    with patch.object(settings, 'OFFER_MAPPINGS_BATCH_SIZE', 2), \
+            patch.object(yandex_client, '_get_market_sku_chunk', AsyncMock(return_value={})) as mock_chunk:
+        await yandex_client.get_market_sku(["a", "b", "c"])
+        assert [call.args[0] for call in mock_chunk.await_args_list] == [["a", "b"], ["c"]]
+
+@pytest.mark.asyncio
+async def test_yandex_pickup_point_address_uses_shipments_index(yandex_client):
+    response = APIResponse(200, b'{"result": {"shipments": [{"orderIds": [1, 2], "warehouseTo": {"address": "PVZ 1"}}]}}')
+    with patch.object(yandex_client, '_request', AsyncMock(return_value=response)) as mock_request:
+        assert await yandex_client.get_pickup_point_address("1") == "PVZ 1"
+        assert await yandex_client.get_pickup_point_address("2") == "PVZ 1"
+        # Отсутствующий заказ не вызывает повторной выгрузки чаще SHIPMENTS_INDEX_MIN_REFRESH
+        assert await yandex_client.get_pickup_point_address("3") == "Pickup point address not found"
+        mock_request.assert_awaited_once()
+
+# Тесты для массовой отметки готовности
+@pytest.mark.asyncio
+async def test_yandex_set_orders_status_uses_batch_endpoint(yandex_client):
+    def respond(method, path, **kwargs):
+        orders = [
+            {"id": order["id"], "updateStatus": "ERROR" if order["id"] == 2 else "OK", "errorDetails": "bad status"}
+            for order in kwargs["json"]["orders"]
+        ]
+        return APIResponse(200, json.dumps({"result": {"orders": orders}}).encode())
+    order_ids = [str(order_id) for order_id in range(1, 36)]
+    with patch.object(yandex_client, '_request', AsyncMock(side_effect=respond)) as mock_request:
+        results = await yandex_client.set_orders_status(order_ids, "PROCESSING", "READY_TO_SHIP")
+        assert mock_request.await_count == 2  # 30 + 5 заказов
+        assert results["2"] == "bad status"
+        assert [order_id for order_id, error in results.items() if error is None] == [i for i in order_ids if i != "2"]
+
+@pytest.mark.asyncio
+async def test_set_orders_ready_updates_eligible_orders_and_queues_carriages(ozon_client):
+    postings = [
+        {"posting_number": number, "products": [], "delivery_method": {"id": 7}} for number in ("1-1", "2-1")
+    ]
+    db = Mock(add_to_carriage_batch=Mock(return_value=True))
+    service = OrderService({"ozon": ozon_client}, db)
+    with patch.object(ozon_client, 'iter_order_pages', side_effect=lambda *args: _pages(postings)), \
+            patch.object(ozon_client, 'set_order_status', AsyncMock()) as mock_status:
+        results = await service.set_orders_ready(order_ids=["2-1", "9-9"])
+        assert results["ozon"].updated == ["2-1"]
+        mock_status.assert_awaited_once_with("2-1", "awaiting_deliver", None, [])
+        assert db.add_to_carriage_batch.call_args.args[0] == "ozon"
+        assert db.add_to_carriage_batch.call_args.args[2] == "2-1"
+
+# Тесты для пакетных отгрузок Ozon
+@pytest.mark.asyncio
+async def test_carriage_batcher_creates_one_carriage_per_batch(ozon_client):
+    db = Mock(load_carriage_batches=Mock(return_value={"7:2024-01-01": 0.0}),
+              take_carriage_batch=Mock(return_value=["1-1", "2-1"]), load_carriage_state=Mock(return_value={}))
+    sender = Mock(call=AsyncMock())
+    batcher = CarriageBatcher(db, sender, window=60)
+    assert batcher.due_groups(now=100.0) == ["7:2024-01-01"]
+    with patch.object(ozon_client, 'create_carriage', AsyncMock(return_value=55)) as mock_create, \
+            patch.object(ozon_client, 'approve_carriage', AsyncMock()), \
+            patch.object(ozon_client, 'get_carriage_label', AsyncMock(return_value=b"%PDF")):
+        assert await batcher.flush(AsyncMock(), "chat_id", ozon_client) == 1
+        assert mock_create.await_args.kwargs["delivery_method_id"] == 7
+        assert "1-1, 2-1" in sender.call.await_args.kwargs["caption"]
+
+@pytest.mark.asyncio
+async def test_carriage_batch_from_previous_day_departs_now(ozon_client):
+    db = Mock(load_carriage_batches=Mock(return_value={"7:2024-01-01": 0.0}),
+              take_carriage_batch=Mock(return_value=["1-1"]), load_carriage_state=Mock(return_value={"attempts": "2"}))
+    batcher = CarriageBatcher(db, Mock(call=AsyncMock()), window=60)
+    with patch.object(ozon_client, 'create_carriage', AsyncMock(return_value=55)) as mock_create, \
+            patch.object(ozon_client, 'approve_carriage', AsyncMock()), \
+            patch.object(ozon_client, 'get_carriage_label', AsyncMock(return_value=b"%PDF")):
+        assert await batcher.flush(AsyncMock(), "chat_id", ozon_client) == 1
+    # Дата отправки - текущее время UTC, а не начало давно прошедшего дня пачки
+    departure = datetime.strptime(mock_create.await_args.kwargs["departure_date"], "%Y-%m-%dT%H:%M:%SZ")
+    assert departure.replace(tzinfo=timezone.utc).timestamp() == pytest.approx(time.time(), abs=5)
+
+@pytest.mark.asyncio
+async def test_carriage_batcher_backs_off_and_resumes_created_carriage(ozon_client):
+    db = Mock(load_carriage_batches=Mock(return_value={"7:2024-01-01": 10.0}),
+              take_carriage_batch=Mock(return_value=["1-1"]), load_carriage_state=Mock(return_value={}))
+    sender = Mock(call=AsyncMock())
+    batcher = CarriageBatcher(db, sender, window=60)
+    with patch.object(ozon_client, 'create_carriage', AsyncMock(return_value=55)), \
+            patch.object(ozon_client, 'approve_carriage', AsyncMock(side_effect=MarketplaceAPIError("HTTP 500"))):
+        assert await batcher.flush(AsyncMock(), "chat_id", ozon_client) == 0
+    db.save_carriage_state.assert_any_call("ozon", "7:2024-01-01", carriage_id=55)
+    db.save_carriage_state.assert_any_call("ozon", "7:2024-01-01", attempts=1)
+    opened_at = db.restore_carriage_batch.call_args.args[3]
+    assert opened_at + 60 == pytest.approx(time.time() + settings.CARRIAGE_RETRY_DELAY, abs=5)
+    # Повтор продолжает с подтверждения уже созданной отгрузки и не пишет в чат повторно об ошибке
+    db.load_carriage_state.return_value = {"attempts": "1", "carriage_id": "55"}
+    sender.call.reset_mock()
+    with patch.object(ozon_client, 'create_carriage', AsyncMock()) as mock_create, \
+            patch.object(ozon_client, 'approve_carriage', AsyncMock(side_effect=MarketplaceAPIError("HTTP 500"))) as mock_approve:
+        await batcher.flush(AsyncMock(), "chat_id", ozon_client)
+        mock_create.assert_not_awaited()
+        mock_approve.assert_awaited_once_with(55, containers_count=1)
+        sender.call.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_carriage_batcher_dead_letters_after_max_attempts(ozon_client):
+    attempts = str(settings.CARRIAGE_MAX_ATTEMPTS - 1)
+    db = Mock(load_carriage_batches=Mock(return_value={"7:2024-01-01": 10.0}),
+              take_carriage_batch=Mock(return_value=["1-1"]), load_carriage_state=Mock(return_value={"attempts": attempts}))
+    batcher = CarriageBatcher(db, Mock(call=AsyncMock()), window=60)
+    with patch.object(ozon_client, 'create_carriage', AsyncMock(side_effect=MarketplaceAPIError("HTTP 400"))):
+        await batcher.flush(AsyncMock(), "chat_id", ozon_client)
+    db.dead_letter_carriage_batch.assert_called_once_with("ozon", "7:2024-01-01", ["1-1"], "HTTP 400")
+    db.restore_carriage_batch.assert_not_called()
+
+# Тесты для снимков заказов
+@pytest.mark.asyncio
+async def test_snapshot_store_fetches_once_for_concurrent_jobs(yandex_client):
+    page = [{"id": "1", "items": [], "delivery": {"address": {}, "shipments": [{}]}}]
+    store = OrderSnapshotStore(ttl=60)
+    with patch.object(yandex_client, 'iter_order_pages', side_effect=lambda *args: _pages(page)) as mock_pages:
+        first, second = await asyncio.gather(
+            store.get("yandex", yandex_client, "PROCESSING", "READY_TO_SHIP"),
+            store.get("yandex", yandex_client, "PROCESSING", "READY_TO_SHIP")
+        )
+        assert [order.id for order in first] == ["1"]
+        assert second is first
+        mock_pages.assert_called_once()
+        # После смены статуса заказа снимок платформы загружается заново
+        store.invalidate("yandex")
+        await store.get("yandex", yandex_client, "PROCESSING", "READY_TO_SHIP")
+        assert mock_pages.call_count == 2
+
+@pytest.mark.asyncio
+async def test_check_overdue_orders_reads_shared_snapshot(yandex_client):
+    order = YandexOrderParser().parse(
+        {"id": "1", "items": [], "delivery": {"address": {}, "shipments": [{"shipmentDate": "01-01-2024"}]}}
+    )
+    db = Mock(filter_overdue_unnotified=Mock(side_effect=lambda ids, platform: ids))
+    service = OrderService({"yandex": yandex_client}, db)
+    service.snapshots.put("yandex", "PROCESSING", "READY_TO_SHIP", [order])
+    with patch.object(yandex_client, 'iter_order_pages') as mock_pages:
+        bot = AsyncMock()
+        assert await service.check_overdue_orders(bot, "chat_id") == 1
+        mock_pages.assert_not_called()
+        db.save_overdue_notified.assert_called_once_with("1", "yandex")
+
+@pytest.mark.asyncio
+async def test_daily_plan_reuses_only_fresh_overdue_listing(yandex_client):
+    order = YandexOrderParser().parse_summary({"id": "1", "delivery": {"shipments": [{"shipmentDate": "01-01-2024"}]}})
+    service = OrderService({"yandex": yandex_client}, Mock())
+    service.snapshots.put("yandex", "PROCESSING", "READY_TO_SHIP", [order])
+    with patch.object(yandex_client, 'iter_order_pages') as mock_pages, \
+            patch.object(yandex_client, 'get_pickup_point_address', AsyncMock(return_value="ПВЗ")):
+        bot = AsyncMock()
+        await send_daily_plan(bot, service, "chat_id")
+        mock_pages.assert_not_called()
+        assert "#1" in bot.send_message.await_args.args[1]
+    # Снимок старше ORDER_SNAPSHOT_TTL: заказ 1 уже отгружен, план строится по свежей выгрузке
+    service.snapshots.put("yandex", "PROCESSING", "READY_TO_SHIP", [order], time.monotonic() - settings.ORDER_SNAPSHOT_TTL - 1)
+    with patch.object(yandex_client, 'iter_order_pages', side_effect=lambda *args, **kwargs: _pages([])) as mock_pages:
+        bot = AsyncMock()
+        await send_daily_plan(bot, service, "chat_id")
+        mock_pages.assert_called_once()
+        assert "#1" not in "".join(str(call.args) for call in bot.send_message.await_args_list)
+
+# Тесты для хранилища этикеток
+@pytest.mark.asyncio
+async def test_label_store_downloads_once_and_evicts_oldest(yandex_client, tmp_path):
+    async def download(order_id, dest):
+        with open(dest, "wb") as file:
+            file.write(b"%PDF" + b"0" * 96)
+        return True
+    db = Mock(load_label_file_id=Mock(return_value=None))
+    store = LabelStore(db, directory=str(tmp_path), max_bytes=250)
+    with patch.object(yandex_client, 'download_label', side_effect=download) as mock_download:
+        first = await store.get_document("yandex", yandex_client, "1")
+        second = await store.get_document("yandex", yandex_client, "2")
+        again = await store.get_document("yandex", yandex_client, "1")
+        assert first.path == again.path
+        assert mock_download.await_count == 2
+        for document in (first, second, again):
+            store.release(document)
+        # Заказ 2 использовался давнее всех и вытесняется, каталог при этом не сканируется
+        with patch.object(store, "_scan") as scan:
+            await store.get_document("yandex", yandex_client, "3")
+        scan.assert_not_called()
+        assert not store.path_for("yandex", "2").exists()
+        assert store.path_for("yandex", "1").exists() and store.path_for("yandex", "3").exists()
+
+@pytest.mark.asyncio
+async def test_label_store_never_evicts_files_being_sent(yandex_client, tmp_path):
+    (tmp_path / "yandex").mkdir()
+    (tmp_path / "yandex" / "label_old.pdf").write_bytes(b"0" * 100)
+    async def download(order_id, dest):
+        with open(dest, "wb") as file:
+            file.write(b"0" * 100)
+        return True
+    store = LabelStore(Mock(load_label_file_id=Mock(return_value=None)), directory=str(tmp_path), max_bytes=50)
+    with patch.object(yandex_client, 'download_label', side_effect=download):
+        first = await store.get_document("yandex", yandex_client, "1")
+        second = await store.get_document("yandex", yandex_client, "2")
+    assert not (tmp_path / "yandex" / "label_old.pdf").exists()
+    assert os.path.exists(first.path) and os.path.exists(second.path)
+    store.release(first)
+    store.release(second)
+    store.evict()
+    assert not os.path.exists(first.path) and not os.path.exists(second.path)
+
+@pytest.mark.asyncio
+async def test_client_download_streams_to_file(yandex_client, tmp_path):
+    dest = tmp_path / "label.pdf"
+    response = Mock(status=200, content=Mock(iter_chunked=Mock(return_value=_async_iter([b"%PDF", b"-1"]))))
+    session = Mock(closed=False, request=Mock(return_value=_AsyncContext(response)))
+    yandex_client._session = session
+    assert await yandex_client.download_label("1", str(dest)) is True
+    assert dest.read_bytes() == b"%PDF-1"
+    assert not os.path.exists(f"{dest}.part")
+
+async def _async_iter(items):
+    for item in items:
+        yield item
+
+class _AsyncContext:
+    def __init__(self, value):
+        self.value = value
+
+    async def __aenter__(self):
+        return self.value
+
+    async def __aexit__(self, *args):
+        return False
+
+# Тесты для метрик
+@pytest.mark.asyncio
+async def test_client_records_request_latency_and_retries(yandex_client):
+    labels = {"platform": "yandex", "endpoint": "get_orders", "status": "500"}
+    observed = REGISTRY.get_sample_value("marketplace_request_seconds_count", labels) or 0
+    retries = REGISTRY.get_sample_value("marketplace_retries_total", {"platform": "yandex", "operation": "_get_orders_page"}) or 0
+    response = Mock(status=500, read=AsyncMock(return_value=b"Server error"))
+    yandex_client._session = Mock(closed=False, request=Mock(return_value=_AsyncContext(response)))
+    get_orders_page = YandexAPIClient._get_orders_page.retry_with(wait=wait_none())
+    with pytest.raises(MarketplaceAPIError):
+        await get_orders_page(yandex_client, "PROCESSING", "STARTED")
+    assert REGISTRY.get_sample_value("marketplace_request_seconds_count", labels) == observed + 3
+    assert REGISTRY.get_sample_value(
+        "marketplace_retries_total", {"platform": "yandex", "operation": "_get_orders_page"}
+    ) == retries + 2
+
+def test_parse_tenants_validates_ids():
+    tenants = parse_tenants([
+        {"id": "shop-1", "chat_id": -100, "ozon": {"api_key": "key", "client_id": "1", "requests_per_hour": 600}},
+        {"id": "shop-2", "chat_id": "-200", "yandex": {"api_token": "t", "campaign_id": "1", "business_id": "2"}},
+    ])
+    assert [(tenant.id, tenant.chat_id, tenant.platforms) for tenant in tenants] == [
+        ("shop-1", "-100", ["ozon"]), ("shop-2", "-200", ["yandex"])
+    ]
+    assert tenants[0].namespace == "shop-1:" and tenants[0].requests_per_hour("ozon") == 600
+    with pytest.raises(ValueError, match="Invalid tenant id"):
+        parse_tenants([{"id": "shop_1", "chat_id": "1"}])
+    with pytest.raises(ValueError, match="reserved"):
+        parse_tenants([{"id": "default", "chat_id": "1"}])
+    with pytest.raises(ValueError, match="unique"):
+        parse_tenants([{"id": "a", "chat_id": "1"}, {"id": "a", "chat_id": "2"}])
+
+def test_build_order_services_isolates_tenants():
+    tenants = parse_tenants([
+        {"id": "shop-1", "chat_id": "1", "ozon": {"api_key": "key", "client_id": "1"}},
+        {"id": "shop-2", "chat_id": "2", "ozon": {"api_key": "key", "client_id": "2"}},
+    ])
+    db = RedisDB(client=Mock())
+    services = build_order_services(tenants, db, pool=SessionPool())
+    first, second = services["shop-1"], services["shop-2"]
+    assert (first.db.namespace, second.db.namespace) == ("shop-1:", "shop-2:")
+    assert first.sender is second.sender
+    assert first.clients["ozon"]._slots._value == settings.TENANT_HTTP_CONCURRENCY
+    assert second.ready_callback_data("5-1", "ozon") == "ready_5-1_ozon_shop-2"
+    assert OrderService({}, db).ready_callback_data("5-1", "ozon") == "ready_5-1_ozon"
+
+def test_sku_mappings_expire_per_entry():
+    client = Mock(mget=Mock(return_value=['{"marketSku": "1"}', None]))
+    db = RedisDB(client=client).for_tenant("shop-1:")
+    assert db.load_sku_mappings("yandex", ["a", "b"]) == {"a": {"marketSku": "1"}}
+    client.mget.assert_called_once_with(["shop-1:sku_mapping_yandex:a", "shop-1:sku_mapping_yandex:b"])
+    db.save_sku_mappings("yandex", {"c": {}}, 86400)
+    # У каждой записи свой TTL, поэтому новые сохранения не продлевают жизнь старым
+    client.pipeline.return_value.set.assert_called_once_with("shop-1:sku_mapping_yandex:c", "{}", ex=86400)
+
+def test_order_stream_survives_redis_errors():
+    client = Mock(xreadgroup=Mock(side_effect=redis.ResponseError("NOGROUP No such consumer group")),
+                  xautoclaim=Mock(side_effect=redis.ConnectionError("down")),
+                  xack=Mock(side_effect=redis.ConnectionError("down")),
+                  xgroup_create=Mock(side_effect=redis.ResponseError("BUSYGROUP Consumer Group name already exists")))
+    db = RedisDB(client=client)
+    assert db.ensure_order_consumer_group() is True
+    # Пропавшую вместе с потоком группу создаём заново при следующем чтении
+    assert db.read_order_events("notifiers", "replica-1", 10) == []
+    assert client.xgroup_create.call_count == 2
+    assert db.claim_stale_order_events("notifiers", "replica-1", 60, 10) == []
+    db.ack_order_events("notifiers", ["1-0"])
+    client.xgroup_create.side_effect = redis.ConnectionError("down")
+    assert db.ensure_order_consumer_group() is False
+
+@pytest.mark.asyncio
+async def test_ozon_orders_page_decodes_once_and_requests_needed_blocks(ozon_client):
+    response = APIResponse(200, b'{"result": {"postings": [{"posting_number": "1"}], "has_next": false}}')
+    with patch.object(ozon_client, '_request', AsyncMock(return_value=response)) as mock_request, \
+            patch("src.utils.jsonlib.loads", wraps=jsonlib.loads) as loads:
+        pages = [page async for page in ozon_client.iter_order_pages("awaiting_deliver", summary=True)]
+        assert pages == [[{"posting_number": "1"}]]
+        assert response.json() is response.json()
+        loads.assert_called_once()
+        assert mock_request.await_args.kwargs["json"]["with"] == {}
+        await ozon_client._get_orders_page({}, 0)
+        assert "barcodes" not in mock_request.await_args.kwargs["json"]["with"]
@@ -0,0 +1,199 @@
+# tests/test_bot.py
+import asyncio
+import json
+import logging
+import math
+import pytest
+import queue
+from datetime import datetime
+import pytz
+from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramRetryAfter
+from aiohttp.test_utils import TestClient, TestServer
+from src.app import AppContainer
+from src.bot.jobs import JobQueue
+from src.bot.leader import LeaderElector
+from src.api.base_client import count_requests
+from src.api.yandex_client import YandexAPIClient
+from src.bot.scheduler import AdaptiveSchedule, PollScheduler, RequestBudget, parse_cutoffs
+from src.bot.sender import TelegramSender
+from src.bot.webhook import build_webhook_app
+from src.utils.logging import DeferredQueueHandler, JsonFormatter, PlatformColorFilter, log_extra, record_platform
+from prometheus_client import REGISTRY
+from unittest.mock import AsyncMock, Mock, patch
+
+def test_leader_elector_follows_lease():
+    db = Mock(acquire_lease=Mock(side_effect=[True, False]))
+    elector = LeaderElector(db, owner="replica-1", lease_seconds=10, heartbeat_seconds=1)
+    assert elector.heartbeat() is True
+    db.acquire_lease.assert_called_with("scheduler", "replica-1", 10)
+    assert elector.heartbeat() is False
+
+def test_leader_keeps_role_while_redis_is_unreachable():
+    db = Mock(acquire_lease=Mock(side_effect=[True, None]))
+    elector = LeaderElector(db, owner="replica-1", lease_seconds=10, heartbeat_seconds=1)
+    elector.heartbeat()
+    assert elector.heartbeat() is True
+
+@pytest.mark.asyncio
+async def test_sender_retries_after_flood_control_and_keeps_order():
+    sender = TelegramSender(global_rate=100, chat_rate=100, chat_burst=10)
+    delivered = []
+    flood = TelegramRetryAfter(method=Mock(), message="Too Many Requests", retry_after=0)
+    attempts = {"first": 0}
+
+    async def send(text):
+        if text == "first" and attempts["first"] == 0:
+            attempts["first"] += 1
+            raise flood
+        delivered.append(text)
+        return text
+
+    results = await asyncio.gather(sender.call(1, send, "first"), sender.call(1, send, "second"))
+    assert results == ["first", "second"]
+    assert delivered == ["first", "second"]
+    await sender.close()
+
+@pytest.mark.asyncio
+async def test_sender_propagates_delivery_errors():
+    sender = TelegramSender(global_rate=100, chat_rate=100, chat_burst=10)
+    with pytest.raises(ValueError):
+        await sender.call(1, AsyncMock(side_effect=ValueError("bad request")))
+    await sender.close()
+
+def test_schedule_backs_off_when_idle_and_resets_on_work():
+    schedule = AdaptiveSchedule("test", min_interval=60, max_interval=200, backoff=2, jitter=0)
+    schedule.record(0)
+    schedule.record(0)
+    assert schedule.next_delay() == 200
+    schedule.record(3)
+    assert schedule.next_delay() == 60
+
+def test_schedule_polls_fast_before_cutoff_within_quota():
+    schedule = AdaptiveSchedule("test", min_interval=60, max_interval=600, quota_per_hour=30, jitter=0,
+                                cutoffs=parse_cutoffs("14:00"), cutoff_window=1800, tz="UTC")
+    schedule.interval = 600
+    assert schedule.next_delay(datetime(2024, 1, 1, 10, 0, tzinfo=pytz.utc)) == 600
+    # За 15 минут до отгрузки опрашиваем чаще, но не чаще, чем позволяет квота (30 запросов/час)
+    assert schedule.next_delay(datetime(2024, 1, 1, 13, 45, tzinfo=pytz.utc)) == 120
+
+def test_schedules_of_a_platform_share_one_budget():
+    budget = RequestBudget(quota_per_hour=100, reserve=0.4)
+    new_orders = AdaptiveSchedule("new", min_interval=10, max_interval=600, jitter=0, budget=budget)
+    overdue = AdaptiveSchedule("overdue", min_interval=10, max_interval=600, jitter=0, budget=budget)
+    # 60 запросов/час после резерва делятся поровну: каждой задаче по 30, то есть прогон раз в 120 с
+    assert budget.share() == 30
+    assert new_orders.next_delay() == overdue.next_delay() == 120
+
+def test_poll_scheduler_exports_next_runs():
+    scheduler = PollScheduler()
+    schedule = scheduler.get("new_orders_test", min_interval=60, max_interval=600, jitter=0)
+    sample = lambda: REGISTRY.get_sample_value("poll_next_run_timestamp", {"job": "new_orders_test"})
+    assert math.isnan(sample())
+    schedule.next_delay(datetime(2024, 1, 1, 10, 0, tzinfo=pytz.utc))
+    assert scheduler.next_runs() == {"new_orders_test": datetime(2024, 1, 1, 10, 1, tzinfo=pytz.utc)}
+    assert sample() == datetime(2024, 1, 1, 10, 1, tzinfo=pytz.utc).timestamp()
+
+def test_parse_cutoffs_rejects_malformed_times():
+    assert parse_cutoffs(" 9:30, 14:00 ") == ((9, 30), (14, 0))
+    for value in ("10-00", "25:00", "10:60"):
+        with pytest.raises(ValueError):
+            parse_cutoffs(value)
+
+@pytest.mark.asyncio
+async def test_count_requests_is_per_job():
+    client = YandexAPIClient("token", "http://test", "1", "2")
+
+    async def job(requests: int) -> int:
+        with count_requests() as counter:
+            for _ in range(requests):
+                client._count_request()
+                await asyncio.sleep(0)
+        return counter[0]
+
+    assert await asyncio.gather(job(2), job(3)) == [2, 3]
+
+@pytest.mark.asyncio
+async def test_job_queue_ignores_duplicates_while_running():
+    jobs = JobQueue(workers=2)
+    release = asyncio.Event()
+    runs = []
+
+    async def job():
+        runs.append("ready")
+        await release.wait()
+
+    assert jobs.submit(("ready", "yandex", "1"), job) is True
+    assert jobs.submit(("ready", "yandex", "1"), job) is False
+    await asyncio.sleep(0)
+    release.set()
+    await jobs.wait(("ready", "yandex", "1"))
+    assert runs == ["ready"]
+    # После завершения тот же заказ можно отправить снова
+    assert jobs.submit(("ready", "yandex", "1"), job) is True
+    await jobs.wait(("ready", "yandex", "1"))
+    await jobs.close()
+
+@pytest.mark.asyncio
+async def test_webhook_app_checks_secret_and_feeds_dispatcher():
+    dp = Dispatcher()
+    received = asyncio.Event()
+
+    @dp.message()
+    async def on_message(message):
+        received.set()
+
+    app = build_webhook_app(dp, Bot(token="123456:TEST"), path="/hook", secret="s3cret")
+    update = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "hi"}}
+    async with TestClient(TestServer(app)) as client:
+        response = await client.post("/hook", json=update, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+        assert response.status == 401
+        response = await client.post("/hook", json=update, headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})
+        assert response.status == 200
+        await asyncio.wait_for(received.wait(), 1)
+        assert (await client.get("/healthz")).status == 200
+
+@pytest.mark.asyncio
+async def test_app_container_builds_lazily_and_shares_objects():
+    container = AppContainer()
+    assert container.__dict__ == {}
+    with patch("src.app.RedisDB") as redis_db:
+        services = container.order_services
+        assert container.order_services is services
+        assert all(service.sender is container.sender for service in services.values())
+        redis_db.assert_called_once()
+        await container.close()
+        redis_db.return_value.close.assert_called_once()
+
+def test_single_store_answers_only_in_its_chat():
+    container = AppContainer()
+    service = Mock(tenant=Mock(chat_id="-100"))
+    container.__dict__["order_services"] = {"default": service}
+    assert container.service_for_chat(-100) is service
+    assert container.service_for_chat(42) is None
+
+def test_queue_handler_leaves_formatting_to_listener():
+    log_queue = queue.SimpleQueue()
+    test_logger = logging.getLogger("test_deferred")
+    test_logger.addHandler(DeferredQueueHandler(log_queue))
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        test_logger.exception("[%s] Order #%s failed", "ozon", 7)
+    finally:
+        test_logger.handlers.clear()
+    record = log_queue.get_nowait()
+    # Сообщение и трассировка ещё не отрендерены — это сделает поток QueueListener
+    assert record.msg == "[%s] Order #%s failed" and record.args == ("ozon", 7)
+    assert record.exc_info[0] is ValueError
+    assert "ValueError: boom" in JsonFormatter().format(record)
+
+def test_log_formatting_handles_extras_and_non_string_messages():
+    record = logging.LogRecord("bot", logging.ERROR, __file__, 1, "[%s] Order #%s failed", ("ozon", 7), None)
+    record.__dict__.update(log_extra("ozon", 7))
+    entry = json.loads(JsonFormatter().format(record))
+    assert (entry["message"], entry["platform"], entry["order_id"]) == ("[ozon] Order #7 failed", "ozon", "7")
+    plain = logging.LogRecord("bot", logging.INFO, __file__, 1, {"not": "a string"}, None, None)
+    assert PlatformColorFilter().filter(plain) and "platform" not in json.loads(JsonFormatter().format(plain))
+    prefixed = logging.LogRecord("bot", logging.INFO, __file__, 1, "[yandex] Found %s orders", (3,), None)
+    assert record_platform(prefixed) == "yandex"
@@ -0,0 +1,61 @@
+# tests/test_db.py
+import pytest
+from src.db.redis_db import RedisDB
+from unittest.mock import Mock
+
+@pytest.fixture
+def db():
+    db = RedisDB()
+    db.client = Mock(type=Mock(return_value="zset"))
+    return db
+
+def test_filter_unsent_orders_single_round_trip(db):
+    db.client.zmscore.return_value = [1700000000.0, None, None]
+    assert db.filter_unsent_orders(["1", "2", "3"], "yandex") == ["2", "3"]
+    db.client.zmscore.assert_called_once_with("sent_orders_yandex", ["1", "2", "3"])
+
+def test_filter_unsent_orders_skips_empty_batch(db):
+    assert db.filter_unsent_orders([], "yandex") == []
+    db.client.zmscore.assert_not_called()
+
+def test_save_sent_orders_prunes_expired_entries(db):
+    pipe = db.client.pipeline.return_value
+    db.save_sent_orders(["1", "2"], "ozon")
+    assert set(pipe.zadd.call_args.args[1]) == {"1", "2"}
+    pipe.zremrangebyscore.assert_called_once()
+    pipe.expire.assert_called_once()
+    pipe.execute.assert_called_once()
+
+def test_legacy_set_is_migrated_once(db):
+    db.client.type.return_value = "set"
+    db.client.smembers.return_value = {"1"}
+    db.client.zmscore.return_value = [1700000000.0]
+    db.filter_unsent_orders(["1"], "yandex")
+    db.filter_unsent_orders(["1"], "yandex")
+    db.client.smembers.assert_called_once_with("sent_orders_yandex")
+
+def test_claim_orders_returns_only_won_claims(db):
+    pipe = db.client.pipeline.return_value
+    pipe.execute.return_value = [True, None]
+    assert db.claim_orders(["1", "2"], "yandex", "worker-1", 60) == ["1"]
+    pipe.set.assert_any_call("order_claim_yandex_1", "worker-1", nx=True, px=60000)
+
+def test_renew_order_claims_keeps_only_own_claims(db):
+    db.client.pipeline.return_value.execute.return_value = [1, 0]
+    assert db.renew_order_claims(["1", "2"], "yandex", "worker-1", 60) == ["1"]
+    assert db.renew_order_claims([], "yandex", "worker-1", 60) == []
+
+def test_take_carriage_batch_closes_batch_atomically(db):
+    pipe = db.client.pipeline.return_value
+    pipe.execute.return_value = [{"2", "1"}, 1, 1]
+    assert db.take_carriage_batch("ozon", "7:2024-01-01") == ["1", "2"]
+    pipe.delete.assert_called_once_with("carriage_batch_ozon_7:2024-01-01")
+    pipe.zrem.assert_called_once_with("carriage_batches_ozon", "7:2024-01-01")
+
+def test_tenant_view_prefixes_keys_and_shares_client(db):
+    tenant_db = db.for_tenant("shop-2:")
+    db.client.zmscore.return_value = [None]
+    tenant_db.filter_unsent_orders(["1"], "yandex")
+    assert tenant_db.client is db.client
+    db.client.zmscore.assert_called_once_with("shop-2:sent_orders_yandex", ["1"])
+    assert db.namespace == ""